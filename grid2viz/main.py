@@ -5,6 +5,7 @@
 import argparse
 import configparser
 import os
+import sys
 
 ## A bug can appear with MacOSX if matplotlib is not set to a non-interactive mode
 # issue: https://github.com/matplotlib/matplotlib/issues/14304/
@@ -19,6 +20,10 @@ CONFIG_FILE_CONTENT = """
 agents_dir={agents_dir}
 env_dir={env_dir}
 n_cores={n_cores}
+cache_format={cache_format}
+ram_cache_size={ram_cache_size}
+cache_build_retries={cache_build_retries}
+storage_policy={storage_policy}
 # This file will be re generated to each call of "python -m grid2viz.main"
 """
 
@@ -36,6 +41,27 @@ ARG_N_CORES_DESC = "The number of cores to use for the first loading of the best
 
 ARG_CACHE_DESC = "Enable the building of  all the cache data for all agents at once before relaunching grid2viz."
 
+ARG_CACHE_FORMAT_DESC = (
+    "The format of the cache files: columnar (one file per table, default) "
+    "or pickle (one gzip pickle per episode)."
+)
+
+ARG_RAM_CACHE_SIZE_DESC = (
+    "The memory budget of the episodes kept in RAM, in bytes or with a unit "
+    "such as 4GB. The least recently used are evicted past it. (default to 4GB, 0 for no limit)"
+)
+
+ARG_CACHE_BUILD_RETRIES_DESC = "The number of times the building of the cache of an episode is tried again if it fails. (default to 1)"
+
+ARG_STORAGE_POLICY_DESC = (
+    "The storage of the rho, load, production and flows tables of the episodes, "
+    "as float32, float16 or an integer dtype with a scale, "
+    "e.g. rho:uint16:1e-4,load:float32,production:float32,flows:float16. "
+    "(default to float16 for all)"
+)
+
+ARG_MIGRATE_CACHE_DESC = "Convert the pickled episodes of the existing cache to the columnar format."
+
 ARG_WARM_START_DESC = "Enable the application to warm start to a given section based on the parameters defined in the WARMSTART section of the config.ini file."
 
 ARG_CONFIG_PATH_DESC = "Path to the configuration file config.ini."
@@ -62,6 +88,27 @@ def main():
 
     parser_main.add_argument("--n_cores", default=2, type=int, help=ARG_N_CORES_DESC)
     parser_main.add_argument("--cache", action="store_true", help=ARG_CACHE_DESC)
+    parser_main.add_argument(
+        "--cache_format",
+        default="columnar",
+        choices=["columnar", "pickle"],
+        help=ARG_CACHE_FORMAT_DESC,
+    )
+    parser_main.add_argument(
+        "--ram_cache_size", default="4GB", type=str, help=ARG_RAM_CACHE_SIZE_DESC
+    )
+    parser_main.add_argument(
+        "--cache_build_retries", default=1, type=int, help=ARG_CACHE_BUILD_RETRIES_DESC
+    )
+    parser_main.add_argument(
+        "--storage_policy",
+        default="rho:float16,load:float16,production:float16,flows:float16",
+        type=str,
+        help=ARG_STORAGE_POLICY_DESC,
+    )
+    parser_main.add_argument(
+        "--migrate-cache", action="store_true", help=ARG_MIGRATE_CACHE_DESC
+    )
     parser_main.add_argument(
         "--warm-start", action="store_true", help=ARG_WARM_START_DESC
     )
@@ -119,7 +166,13 @@ def main():
     with open(config_path, "w") as f:
         f.write(
             CONFIG_FILE_CONTENT.format(
-                agents_dir=agents_dir, env_dir=env_dir, n_cores=n_cores
+                agents_dir=agents_dir,
+                env_dir=env_dir,
+                n_cores=n_cores,
+                cache_format=args.cache_format,
+                ram_cache_size=args.ram_cache_size,
+                cache_build_retries=args.cache_build_retries,
+                storage_policy=args.storage_policy,
             )
         )
 
@@ -127,7 +180,11 @@ def main():
     activate_beta = args.activate_beta
 
     # Inline import to load app only now
-    if is_makeCache_only:
+    if args.migrate_cache:
+        from grid2viz.src.manager import cache_dir, migrate_fs_cache
+
+        migrate_fs_cache(cache_dir)
+    elif is_makeCache_only:
         from grid2viz.src.manager import (
             scenarios,
             agents,
@@ -135,7 +192,9 @@ def main():
             cache_dir,
             make_cache
         )
-        make_cache(scenarios,agents,n_cores,cache_dir)
+        failures = make_cache(scenarios,agents,n_cores,cache_dir)
+        if failures:
+            sys.exit(1)
     else:
         from grid2viz.app import app_run, define_layout_and_callbacks
 
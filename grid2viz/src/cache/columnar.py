@@ -0,0 +1,441 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Columnar filesystem cache of EpisodeAnalytics.
+
+Each cached episode is a directory holding one file per attribute and a small
+manifest.json describing them:
+    - numpy arrays are saved as .npy files and can be memory-mapped
+    - dataframes are saved column by column, numeric, boolean and datetime
+      columns as .npy files and the other ones pickled
+    - any other attribute is pickled on its own
+(pickles being gzipped as in the pickle cache format)
+so that a single table can be read without unpickling the whole episode.
+
+Classes inheriting from LazyAttributes can be loaded lazily from an entry, each
+attribute being read on first access and droppable afterwards.
+
+Attributes which do not depend on the agent, such as the load of a scenario,
+can be saved once per scenario in a shared directory, identified by a hash of
+their content: agents with the same table point to the same files and the
+episodes loaded lazily share the same object in memory.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import threading
+import uuid
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from . import locking
+
+CACHE_FORMAT = "columnar"
+CACHE_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+FRAME_SCHEMA_FILE = "_schema.pkl.gz"
+# directory of the shared attributes in each scenario directory of the cache
+SHARED_DIR = "_shared"
+SHARED_ENTRY_FILE = "entry.json"
+# instance attribute of LazyAttributes pointing to its cache entry
+CACHE_ENTRY_ATTRIBUTE = "_cache_entry"
+
+# numpy dtype kinds that can be stored in .npy files without pickling
+NPY_KINDS = "biufcmM"
+
+
+def is_columnar_entry(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        return json.load(fp=f)
+
+
+def _is_npy_storable(value):
+    return (
+        type(value) in (np.ndarray, np.memmap) and value.dtype.kind in NPY_KINDS
+    )
+
+
+def _pickle(value, path):
+    with gzip.open(path, "wb") as f:
+        pickle.dump(value, f, protocol=4)
+
+
+def _unpickle(path):
+    with gzip.open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def _save_frame(frame, path):
+    os.makedirs(path)
+    _pickle(
+        {"index": frame.index, "columns": frame.columns},
+        os.path.join(path, FRAME_SCHEMA_FILE),
+    )
+    files = []
+    for i in range(frame.shape[1]):
+        values = frame.iloc[:, i].values
+        if _is_npy_storable(values):
+            file_name = f"{i}.npy"
+            np.save(os.path.join(path, file_name), values, allow_pickle=False)
+        else:
+            file_name = f"{i}.pkl.gz"
+            _pickle(values, os.path.join(path, file_name))
+        files.append(file_name)
+    return files
+
+
+def _load_frame(path, files, mmap_mode=None):
+    schema = _unpickle(os.path.join(path, FRAME_SCHEMA_FILE))
+    columns = {}
+    for i, file_name in enumerate(files):
+        file_path = os.path.join(path, file_name)
+        if file_name.endswith(".npy"):
+            columns[i] = np.load(file_path, mmap_mode=mmap_mode, allow_pickle=False)
+        else:
+            values = _unpickle(file_path)
+            if isinstance(values, np.ndarray):
+                # prevent pandas from inferring another dtype for object columns
+                values = pd.Series(values, index=schema["index"], dtype=values.dtype)
+            columns[i] = values
+    frame = pd.DataFrame(columns, index=schema["index"])
+    frame.columns = schema["columns"]
+    return frame
+
+
+def save_attribute(path, name, value):
+    """
+    Save one attribute in the entry directory and return its manifest entry.
+    """
+    if isinstance(value, pd.DataFrame):
+        files = _save_frame(value, os.path.join(path, name))
+        return {"kind": "frame", "files": files}
+    elif _is_npy_storable(value):
+        file_name = name + ".npy"
+        np.save(os.path.join(path, file_name), value, allow_pickle=False)
+        return {"kind": "array", "file": file_name}
+    else:
+        file_name = name + ".pkl.gz"
+        _pickle(value, os.path.join(path, file_name))
+        return {"kind": "pickle", "file": file_name}
+
+
+def content_hash(value):
+    """Hash of the content of a dataframe (with its columns and dtypes) or of any picklable value"""
+    sha1 = hashlib.sha1()
+    if isinstance(value, pd.DataFrame):
+        sha1.update(
+            pickle.dumps(
+                (list(value.columns), [str(dtype) for dtype in value.dtypes]),
+                protocol=4,
+            )
+        )
+        try:
+            sha1.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+            return sha1.hexdigest()
+        except TypeError:
+            # unhashable cells such as lists
+            pass
+    sha1.update(pickle.dumps(value, protocol=4))
+    return sha1.hexdigest()
+
+
+def save_shared_attribute(entry_path, shared_dir, name, value):
+    """
+    Save an attribute in shared_dir unless the same content is already there,
+    and return the manifest entry pointing to it from entry_path.
+    """
+    value_hash = content_hash(value)
+    shared_path = os.path.join(shared_dir, f"{name}-{value_hash[:16]}")
+    with locking.entry_lock(shared_path + locking.LOCK_SUFFIX):
+        if not os.path.isfile(os.path.join(shared_path, SHARED_ENTRY_FILE)):
+            with locking.atomic_directory(shared_path) as tmp_path:
+                entry = save_attribute(tmp_path, name, value)
+                with open(os.path.join(tmp_path, SHARED_ENTRY_FILE), "w") as f:
+                    json.dump(entry, f)
+    return {
+        "kind": "shared",
+        "path": os.path.relpath(shared_path, entry_path),
+        "hash": value_hash,
+    }
+
+
+def load_attribute(path, name, manifest=None, mmap_mode=None):
+    """
+    Load a single attribute of a cached episode.
+
+    :param mmap_mode: passed to np.load for the attributes stored as .npy files
+    """
+    if manifest is None:
+        manifest = read_manifest(path)
+    entry = manifest["attributes"][name]
+    if entry["kind"] == "shared":
+        shared_path = os.path.normpath(os.path.join(path, entry["path"]))
+        with open(os.path.join(shared_path, SHARED_ENTRY_FILE)) as f:
+            shared_entry = json.load(fp=f)
+        return load_attribute(
+            shared_path, name, {"attributes": {name: shared_entry}}, mmap_mode
+        )
+    if entry["kind"] == "frame":
+        return _load_frame(os.path.join(path, name), entry["files"], mmap_mode)
+    elif entry["kind"] == "array":
+        return np.load(
+            os.path.join(path, entry["file"]), mmap_mode=mmap_mode, allow_pickle=False
+        )
+    return _unpickle(os.path.join(path, entry["file"]))
+
+
+def save_episode(path, episode, shared_dir=None, shared_attributes=()):
+    """
+    Save all the attributes of an episode in the directory path, replacing
+    what may already be there.
+
+    The entry is written in a temporary directory then swapped with path,
+    see locking.atomic_directory.
+
+    :param shared_dir: directory where the shared_attributes are saved, see
+    save_shared_attribute
+    """
+    if isinstance(episode, LazyAttributes):
+        # read the attributes not loaded yet before path is possibly removed
+        state = episode.__getstate__()
+    else:
+        state = vars(episode)
+    with locking.atomic_directory(path) as tmp_path:
+        attributes = {
+            name: save_shared_attribute(path, shared_dir, name, value)
+            if shared_dir is not None and name in shared_attributes
+            else save_attribute(tmp_path, name, value)
+            for name, value in state.items()
+        }
+        manifest = {
+            "format": CACHE_FORMAT,
+            "version": CACHE_FORMAT_VERSION,
+            "class": type(episode).__name__,
+            # identifies this write of the entry for the lazy loaded episodes
+            "entry_id": uuid.uuid4().hex,
+            "attributes": attributes,
+        }
+        with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=1)
+
+
+def load_episode(path, episode_class, mmap_mode=None, lazy=False, lock_path=None):
+    """
+    Rebuild an instance of episode_class from the attributes of the entry.
+
+    :param lazy: if True, episode_class must inherit from LazyAttributes and
+    no attribute is read until it is accessed
+    :param lock_path: lock of the entry taken shared by the lazy loads
+    """
+    manifest = read_manifest(path)
+    episode = episode_class.__new__(episode_class)
+    if lazy:
+        episode.attach_cache_entry(
+            path, manifest, mmap_mode=mmap_mode, lock_path=lock_path
+        )
+        return episode
+    for name in manifest["attributes"]:
+        setattr(
+            episode, name, load_attribute(path, name, manifest, mmap_mode=mmap_mode)
+        )
+    return episode
+
+
+class StaleEntryError(RuntimeError):
+    """
+    The cache entry of a lazily loaded episode was rewritten or removed since
+    the episode was loaded: the episode has to be loaded again, as its
+    attributes would otherwise come from several builds of the entry.
+    """
+
+
+class SharedList(list):
+    """list which can be weakly referenced, pickled as a plain list"""
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+class SharedDict(dict):
+    """dict which can be weakly referenced, pickled as a plain dict"""
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+# containers of the builtins which cannot be weakly referenced
+WEAKREFABLE_TYPES = {list: SharedList, dict: SharedDict}
+
+
+class SharedValues:
+    """
+    Values of the shared attributes already in memory, by attribute name and
+    content hash. They are weakly referenced so that they are freed with the
+    last episode using them.
+    """
+
+    def __init__(self):
+        self._values = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._values.get(key)
+
+    def put(self, key, value):
+        """
+        :return: the value to keep, lists and dicts being copied in a
+        SharedList or a SharedDict, the other values which cannot be weakly
+        referenced being not shared
+        """
+        weakrefable_type = WEAKREFABLE_TYPES.get(type(value))
+        if weakrefable_type is not None:
+            value = weakrefable_type(value)
+        with self._lock:
+            try:
+                self._values[key] = value
+            except TypeError:
+                pass
+        return value
+
+
+shared_values = SharedValues()
+
+
+class LazyAttributes:
+    """
+    Mixin reading the attributes of an instance from a columnar cache entry
+    the first time they are accessed.
+
+    Attributes read from the entry can be released to free memory, they are
+    then read again on their next access. Pickling an instance reads all its
+    attributes first so that it does not depend on the entry anymore.
+    """
+
+    def attach_cache_entry(self, path, manifest=None, mmap_mode=None, lock_path=None):
+        if manifest is None:
+            manifest = read_manifest(path)
+        self.__dict__[CACHE_ENTRY_ATTRIBUTE] = {
+            "path": path,
+            "manifest": manifest,
+            "mmap_mode": mmap_mode,
+            "lock_path": lock_path,
+            "on_load": None,
+        }
+
+    def set_attribute_load_hook(self, on_load):
+        """
+        on_load(name, value) is applied to each attribute read from the cache
+        entry from now on and returns the value to keep.
+        """
+        entry = self.__dict__.get(CACHE_ENTRY_ATTRIBUTE)
+        if entry is not None:
+            entry["on_load"] = on_load
+
+    def lazy_attributes(self):
+        """Names of the attributes that can be read from the cache entry"""
+        entry = self.__dict__.get(CACHE_ENTRY_ATTRIBUTE)
+        if entry is None:
+            return []
+        return list(entry["manifest"]["attributes"])
+
+    def loaded_attributes(self):
+        """Names of the attributes of the cache entry already in memory"""
+        return [name for name in self.lazy_attributes() if name in self.__dict__]
+
+    def is_stale_entry(self):
+        """
+        Whether the cache entry was rewritten or removed since the episode was
+        loaded, see StaleEntryError
+        """
+        entry = self.__dict__.get(CACHE_ENTRY_ATTRIBUTE)
+        if entry is None:
+            return False
+        with locking.entry_lock(entry["lock_path"], shared=True):
+            try:
+                manifest = read_manifest(entry["path"])
+            except FileNotFoundError:
+                return True
+        return manifest.get("entry_id") != entry["manifest"].get("entry_id")
+
+    def load_attributes(self, names=None):
+        """Read the given attributes (all by default) from the cache entry"""
+        for name in self.lazy_attributes() if names is None else names:
+            getattr(self, name)
+
+    def release_attributes(self, names=None):
+        """
+        Drop from memory the given attributes (all by default) that can be read
+        again from the cache entry.
+
+        :return: names of the released attributes
+        """
+        lazy_attributes = self.lazy_attributes()
+        if names is None:
+            names = lazy_attributes
+        released = []
+        for name in names:
+            if name in lazy_attributes and name in self.__dict__:
+                del self.__dict__[name]
+                released.append(name)
+        return released
+
+    def __getattr__(self, name):
+        # only called when the attribute is not found the usual way
+        entry = self.__dict__.get(CACHE_ENTRY_ATTRIBUTE)
+        if (
+            entry is None
+            or name.startswith("__")
+            or name not in entry["manifest"]["attributes"]
+        ):
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        with locking.entry_lock(entry["lock_path"], shared=True):
+            try:
+                manifest = read_manifest(entry["path"])
+            except FileNotFoundError:
+                raise StaleEntryError(
+                    f"Cache entry {entry['path']} was removed since it was loaded"
+                )
+            if manifest.get("entry_id") != entry["manifest"].get("entry_id"):
+                raise StaleEntryError(
+                    f"Cache entry {entry['path']} was rewritten since it was loaded"
+                )
+            attribute_entry = entry["manifest"]["attributes"][name]
+            shared_key = None
+            if attribute_entry["kind"] == "shared":
+                shared_key = (name, attribute_entry["hash"], entry["on_load"] is not None)
+                value = shared_values.get(shared_key)
+                if value is not None:
+                    self.__dict__[name] = value
+                    return value
+            value = load_attribute(
+                entry["path"], name, entry["manifest"], mmap_mode=entry["mmap_mode"]
+            )
+        if entry["on_load"] is not None:
+            value = entry["on_load"](name, value)
+        if shared_key is not None:
+            value = shared_values.put(shared_key, value)
+        self.__dict__[name] = value
+        return value
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(self.lazy_attributes()))
+
+    def __getstate__(self):
+        self.load_attributes()
+        state = dict(self.__dict__)
+        state.pop(CACHE_ENTRY_ATTRIBUTE, None)
+        return state
@@ -0,0 +1,92 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Atomic writes and advisory locks for the filesystem cache, so that several
+server processes and make_cache runs can share one _cache directory.
+
+Entries are written under a temporary name and renamed in place, so that a
+reader never sees a partially written file, and each (scenario, agent) entry
+has a lock file taken exclusively by writers and shared by readers.
+"""
+
+import os
+import shutil
+import uuid
+import warnings
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except (ImportError, ModuleNotFoundError):
+    fcntl = None
+    warnings.warn(
+        "fcntl is not available on this platform: the filesystem cache is not "
+        "protected against concurrent writes of several processes."
+    )
+
+LOCK_SUFFIX = ".lock"
+TMP_INFIX = ".tmp-"
+
+
+def temporary_path(path):
+    """Unique path next to path to write it before renaming"""
+    return f"{path}{TMP_INFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+@contextmanager
+def entry_lock(lock_path, shared=False):
+    """
+    Hold an advisory lock on lock_path, exclusive unless shared is True.
+    The lock file is created if needed and kept afterwards. Nothing is locked
+    if lock_path is None.
+    """
+    if fcntl is None or lock_path is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def atomic_file(path):
+    """
+    Yield a temporary path to write and rename it to path once the block
+    completes, the temporary file being removed if it raises.
+    """
+    tmp_path = temporary_path(path)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@contextmanager
+def atomic_directory(path):
+    """
+    Yield a temporary directory to fill and swap it with path once the block
+    completes. Directories cannot be replaced in one rename: the previous
+    one is first moved aside, so concurrent readers should hold the entry lock.
+    """
+    tmp_path = temporary_path(path)
+    os.makedirs(tmp_path)
+    try:
+        yield tmp_path
+        old_path = None
+        if os.path.isdir(path):
+            old_path = temporary_path(path)
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        if old_path is not None:
+            shutil.rmtree(old_path, ignore_errors=True)
+    finally:
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
@@ -0,0 +1,139 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Manifests of the filesystem cache entries.
+
+Next to each cached episode, <cache_dir>/<scenario>/<agent>.manifest.json
+records the version of the cache schema and the size, modification time and
+hash of the files of the agent logs it was computed from. It is written once
+the entry is completely saved, so that an entry without manifest is either
+being written or was interrupted, and an entry whose sources changed since
+(e.g. an agent run again) is detected as stale.
+"""
+
+import hashlib
+import json
+import os
+
+from . import locking
+
+# version of the content of the cache entries, to increase whenever
+# EpisodeAnalytics computes or stores its attributes differently
+CACHE_SCHEMA_VERSION = 15
+# first version whose entries are saved with the memory-optimized dtypes
+COMPACT_DTYPES_SCHEMA_VERSION = 2
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+SOURCE_EXTENSIONS = (".npz", ".json")
+
+HASH_CHUNK_SIZE = 1024 ** 2
+
+
+def source_files(agent_path, episode_name):
+    """
+    Paths, relative to agent_path, of the files an episode is computed from:
+    the files of the episode directory and the spaces of the agent.
+    """
+    files = [
+        file
+        for file in os.listdir(agent_path)
+        if file.startswith("dict_") and file.endswith(".json")
+    ]
+    episode_path = os.path.join(agent_path, episode_name)
+    files += [
+        os.path.join(episode_name, file)
+        for file in os.listdir(episode_path)
+        if file.endswith(SOURCE_EXTENSIONS)
+    ]
+    return sorted(files)
+
+
+def hash_file(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha1": hash_file(path)}
+
+
+def make_manifest(agent_path, episode_name, cache_format, storage_policy=None):
+    """
+    :param storage_policy: text of the storage policy of the tables of the entry
+    """
+    return {
+        "schema_version": CACHE_SCHEMA_VERSION,
+        "cache_format": cache_format,
+        "storage_policy": storage_policy,
+        "sources": {
+            file: file_fingerprint(os.path.join(agent_path, file))
+            for file in source_files(agent_path, episode_name)
+        },
+    }
+
+
+def write_manifest(path, manifest):
+    with locking.atomic_file(path) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=1)
+
+
+def read_manifest(path):
+    """Manifest saved at path, None if there is none"""
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(fp=f)
+
+
+def remove_manifest(path):
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def is_fresh(
+    path, agent_path, episode_name, require_manifest=True, storage_policy=None
+):
+    """
+    Whether the entry of the manifest at path is up to date with the agent logs.
+
+    Files are only hashed when their modification time changed, and the
+    manifest is then updated if their content is still the same.
+
+    :param require_manifest: value returned when the entry has no manifest, as
+    for entries written by older grid2viz versions
+    :param storage_policy: text of the storage policy the tables of the entry
+    must be stored with, any if None
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        return not require_manifest
+    if manifest.get("schema_version") != CACHE_SCHEMA_VERSION:
+        return False
+    if storage_policy is not None and manifest.get("storage_policy") != storage_policy:
+        return False
+    sources = manifest["sources"]
+    if sorted(sources) != source_files(agent_path, episode_name):
+        return False
+
+    touched = False
+    for file, fingerprint in sources.items():
+        stat = os.stat(os.path.join(agent_path, file))
+        if stat.st_size != fingerprint["size"]:
+            return False
+        if stat.st_mtime_ns == fingerprint["mtime"]:
+            continue
+        if hash_file(os.path.join(agent_path, file)) != fingerprint["sha1"]:
+            return False
+        fingerprint["mtime"] = stat.st_mtime_ns
+        touched = True
+    if touched:
+        write_manifest(path, manifest)
+    return True
@@ -0,0 +1,163 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+In memory cache of the episodes served by the app, bounded in bytes.
+
+Least recently used episodes are evicted once the estimated size of all the
+entries goes over the budget. The manager then reads them again from the
+filesystem cache when they are requested.
+"""
+
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_SIZE = "4GB"
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+# nesting depth up to which the attributes of objects are visited, enough to
+# reach the arrays of the observations listed in an episode
+MAX_ESTIMATION_DEPTH = 5
+
+
+def parse_size(size):
+    """
+    Number of bytes of a size such as 1073741824, "512MB", "4G" or "4 GB".
+    0 or a negative size means no limit.
+    """
+    match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", str(size).upper())
+    if match is None:
+        raise ValueError(f"Cannot read {size} as a size in bytes")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def estimate_size(value, depth=0):
+    """
+    Approximate number of bytes used by value.
+
+    Dataframes and arrays are measured from their buffers. Only the first
+    element of lists is measured and the others are assumed to be the same
+    size, which is right for lists of observations and actions and keeps the
+    estimation cheap.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(index=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    size = sys.getsizeof(value)
+    if depth >= MAX_ESTIMATION_DEPTH:
+        return size
+    if isinstance(value, (list, tuple)) and value:
+        return size + len(value) * estimate_size(value[0], depth + 1)
+    if isinstance(value, dict):
+        return size + sum(estimate_size(v, depth + 1) for v in value.values())
+    if hasattr(value, "__dict__") and not isinstance(value, type):
+        return size + estimate_size(value.__dict__, depth + 1)
+    return size
+
+
+class LRUCache:
+    """
+    Mapping from keys to episodes evicting the least recently used ones when
+    max_bytes is exceeded (no limit if max_bytes <= 0).
+
+    Sizes are estimated when an entry is added and again when it is read, as
+    lazily loaded episodes grow while they are used.
+    """
+
+    def __init__(self, max_bytes=0, size_of=estimate_size):
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._entries[key]
+            del self._sizes[key]
+
+    @property
+    def size(self):
+        """Estimated number of bytes of all the entries"""
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            value = self._entries[key]
+            self._sizes[key] = self.size_of(value)
+            self._evict(keep=key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = self.size_of(value)
+            self._evict(keep=key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+    def _evict(self, keep):
+        """Remove the least recently used entries other than keep until under budget"""
+        if self.max_bytes <= 0:
+            return
+        total = sum(self._sizes.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._sizes.pop(key)
+            del self._entries[key]
+            self.evictions += 1
+            print(f"Evicting {key} from the RAM cache")
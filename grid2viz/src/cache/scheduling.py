@@ -0,0 +1,115 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Scheduling of the episodes built by make_cache on the process pool.
+
+Episodes are built longest first so that a long one does not end up alone on
+a core at the end, the number of workers is reduced if the largest episodes
+would not fit in memory together, and progress is reported as they complete.
+"""
+
+import datetime as dt
+import json
+import os
+import time
+import zipfile
+
+# memory of a worker process once grid2viz is imported
+WORKER_BASE_MEMORY = 300 * 1024 ** 2
+# peak memory of a build relative to the uncompressed size of the episode
+# arrays, measured around 40 on the example agents
+BUILD_MEMORY_FACTOR = 50
+
+
+def episode_nb_timesteps(agent_path, episode_name):
+    """Number of timesteps played in an episode, 0 if unknown"""
+    try:
+        with open(os.path.join(agent_path, episode_name, "episode_meta.json")) as f:
+            return int(json.load(fp=f).get("nb_timestep_played", 0))
+    except (OSError, ValueError):
+        return 0
+
+
+def episode_arrays_size(agent_path, episode_name):
+    """Uncompressed size in bytes of the npz arrays of an episode"""
+    episode_path = os.path.join(agent_path, episode_name)
+    size = 0
+    for file in os.listdir(episode_path):
+        if file.endswith(".npz"):
+            with zipfile.ZipFile(os.path.join(episode_path, file)) as archive:
+                size += sum(info.file_size for info in archive.infolist())
+    return size
+
+
+def estimate_build_memory(agent_path, episode_name):
+    """Approximate peak memory in bytes of a worker building an episode"""
+    return WORKER_BASE_MEMORY + BUILD_MEMORY_FACTOR * episode_arrays_size(
+        agent_path, episode_name
+    )
+
+
+def available_memory():
+    """Memory available for new processes in bytes, None if unknown"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def max_workers(n_cores, memory_estimates, memory=None):
+    """
+    Number of workers, at most n_cores, such that the largest builds can run
+    at the same time within memory (at least one).
+    """
+    if memory is None:
+        return max(1, n_cores)
+    n_workers = 0
+    total = 0
+    for estimate in sorted(memory_estimates, reverse=True)[:n_cores]:
+        total += estimate
+        if total > memory:
+            break
+        n_workers += 1
+    return max(1, n_workers)
+
+
+class ProgressReporter:
+    """
+    Print a line per built episode with the aggregate throughput in timesteps
+    per second and the estimated time left.
+    """
+
+    def __init__(self, nb_timesteps):
+        """:param nb_timesteps: dict (agent, episode_name) -> timesteps to build"""
+        self.nb_timesteps = nb_timesteps
+        self.total_timesteps = sum(nb_timesteps.values())
+        self.done_timesteps = 0
+        self.done = 0
+        self.start = time.time()
+
+    def update(self, agent, episode_name, duration, failed=False):
+        self.done += 1
+        nb_timesteps = self.nb_timesteps.get((agent, episode_name), 0)
+        self.done_timesteps += nb_timesteps
+        elapsed = time.time() - self.start
+        throughput = self.done_timesteps / elapsed if elapsed > 0 else 0
+        if throughput > 0:
+            left = (self.total_timesteps - self.done_timesteps) / throughput
+            eta = str(dt.timedelta(seconds=round(left)))
+        else:
+            eta = "unknown"
+        status = "FAILED after" if failed else "built in"
+        print(
+            f"[{self.done}/{len(self.nb_timesteps)}] agent {agent} on scenario "
+            f"{episode_name}: {nb_timesteps} timesteps {status} {duration:.1f} s | "
+            f"{throughput:.1f} timesteps/s | ETA {eta}"
+        )
@@ -0,0 +1,61 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Process-wide registry of the grid2op observation and action spaces read from
+the json files of the agents.
+
+Spaces are identified by the hash of their json file, so that all the episodes
+of an agent, and the agents with the same spaces, use the same instance
+instead of building it again each time an episode is loaded.
+"""
+
+import hashlib
+import os
+import threading
+
+from grid2op.Action import ActionSpace
+from grid2op.Observation import ObservationSpace
+
+
+class SpaceRegistry:
+    def __init__(self):
+        # path -> (size, mtime, hash), to only hash files again when they change
+        self._hashes = {}
+        # (space class, hash) -> space
+        self._spaces = {}
+        self._lock = threading.Lock()
+
+    def _file_hash(self, path):
+        stat = os.stat(path)
+        known = self._hashes.get(path)
+        if known is not None and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            return known[2]
+        with open(path, "rb") as f:
+            file_hash = hashlib.sha1(f.read()).hexdigest()
+        self._hashes[path] = (stat.st_size, stat.st_mtime_ns, file_hash)
+        return file_hash
+
+    def get(self, space_class, path):
+        """Space of class space_class (ObservationSpace or ActionSpace) saved in the json file path"""
+        path = os.path.abspath(path)
+        with self._lock:
+            key = (space_class, self._file_hash(path))
+            if key not in self._spaces:
+                self._spaces[key] = space_class.from_dict(path)
+            return self._spaces[key]
+
+    def observation_space(self, path):
+        return self.get(ObservationSpace, path)
+
+    def action_space(self, path):
+        return self.get(ActionSpace, path)
+
+    def clear(self):
+        with self._lock:
+            self._hashes.clear()
+            self._spaces.clear()
+
+
+space_registry = SpaceRegistry()
@@ -10,14 +10,20 @@ import pandas as pd
 from grid2op.Episode import EpisodeData
 from tqdm import tqdm
 
-from . import EpisodeTrace, maintenances, consumption_profiles
+from . import EpisodeTrace, maintenances, consumption_profiles, observation_model
+from . import quantization
+from ..cache.columnar import LazyAttributes
+from ..cache.spaces import space_registry
 from .env_actions import env_actions
+from .action_store import ActionStore
+from .line_events import LineEvents
+from .line_flows import LineFlows, QUANTITIES, SIDES
+from .observation_store import ObservationStore
+from .ragged import RaggedArray
 
 import os
 import json
 from grid2op.Exceptions import Grid2OpException, EnvError, IncorrectNumberOfElements, NonFiniteElement
-from grid2op.Action import ActionSpace
-from grid2op.Observation import ObservationSpace
 
 
 # TODO: configure the reward key you want to visualize in agent overview.
@@ -25,6 +31,120 @@ from grid2op.Observation import ObservationSpace
 # The reward dataframe should get bigger with all keys available anyway
 other_reward_key = "grid_operation_cost"
 
+# "columnar" stacks the observations into 2D arrays and builds each dataframe
+# with a single constructor call, "loop" is the historical row by row filling
+# kept to benchmark both on the same episode.
+INGESTION_ENGINES = ("columnar", "loop")
+
+# "observed" computes the topological distance from the topo_vect and
+# line_status of the observations, the lines disconnected by the environment
+# being left out, "replay" replays the actions on the reference topology,
+# kept to check the former.
+DISTANCE_MODES = ("observed", "replay")
+
+COLS_ACTION_DATA_TABLE = [
+    "action_id",
+    "action_line",
+    "action_subs",
+    "action_redisp",
+    "action_curtail",
+    "action_storage",
+    "redisp_impact",
+    "curtail_impact",
+    "storage_impact",
+    "line_name",
+    "sub_name",
+    "gen_name",
+    "ren_name",
+    "storage_name",
+    "distance",
+    "lines_modified",
+    "subs_modified",
+    "is_alarm",
+    "alarm_zone",
+    "gens_modified",
+    "rens_modified",
+    "storages_modified",
+]
+
+# columns of action_data_table holding a list per timestep, stored apart as
+# RaggedArray of codes into the names of the elements
+ACTION_LIST_COLUMNS = [
+    "lines_modified",
+    "subs_modified",
+    "alarm_zone",
+    "gens_modified",
+    "rens_modified",
+    "storages_modified",
+]
+
+# attributes computed from the chronics of the scenario only, which are the
+# same for all the agents having played the same number of timesteps. They are
+# stored once per scenario in the filesystem cache.
+SCENARIO_SHARED_ATTRIBUTES = (
+    "load_matrix",
+    # long format load of the entries cached before the matrices were kept
+    "load",
+    "load_pyramid",
+    "hazard_events",
+    "maintenance_events",
+    "profile_traces",
+)
+
+# dtypes of the columns of the dataframes kept in memory by the app
+_EQUIPMENT_DTYPES = {
+    "equipment_name": "category",
+    "value": "float16",
+    "timestamp": "category",
+    "timestep": "category",
+    "equipement_id": "category",
+}
+# long format dataframes of the entries cached before the matrices were kept
+MEMORY_FOOTPRINT_DTYPES = {
+    "production": _EQUIPMENT_DTYPES,
+    "load": _EQUIPMENT_DTYPES,
+    "rho": {
+        "value": "float16",
+        "equipment": "category",
+        "time": "category",
+        "timestamp": "category",
+    },
+}
+
+# attribute of each table stored as set by the storage policy, see quantization
+STORED_TABLES = {
+    "rho_matrix": "rho",
+    "load_matrix": "load",
+    "production_matrix": "production",
+    "line_flows": "flows",
+}
+
+# dataframes built from the stored tables on their first access, see
+# _derived_attribute, which are neither cached nor pickled
+DERIVED_FRAMES_ATTRIBUTE = "_derived_frames"
+
+# observation attributes stacked by the columnar engine
+OBS_ATTRIBUTES_STACKED = [
+    "year",
+    "month",
+    "day",
+    "hour_of_day",
+    "minute_of_hour",
+    "load_p",
+    "prod_p",
+    "rho",
+    "p_or",
+    "q_or",
+    "a_or",
+    "v_or",
+    "p_ex",
+    "q_ex",
+    "a_ex",
+    "v_ex",
+    "target_dispatch",
+    "actual_dispatch",
+]
+
 
 def compute_losses(obs):
     return (obs.prod_p.sum() - obs.load_p.sum()) / obs.load_p.sum()
@@ -65,8 +185,10 @@ class ActionImpacts:
         self.action_id = action_id
 
 
-class EpisodeAnalytics:
-    def __init__(self, episode_data, episode_name, agent):
+class EpisodeAnalytics(LazyAttributes):
+    def __init__(
+        self, episode_data, episode_name, agent, engine="columnar", distance="observed"
+    ):
         self.episode_name = episode_name
         self.agent = agent
 
@@ -77,25 +199,38 @@ class EpisodeAnalytics:
         beg = time.time()
         print("Environment")
         (
-            self.load,
-            self.production,
-            self.rho,
-            self.action_data_table,
+            self.load_matrix,
+            self.production_matrix,
+            self.rho_matrix,
+            action_data_table,
             self.computed_reward,
-            self.flow_and_voltage_line,
+            self.line_flows,
             self.target_redispatch,
             self.actual_redispatch,
             self.attacks_data_table,
-        ) = self._make_df_from_data(episode_data)
+        ) = self._make_df_from_data(episode_data, engine, distance)
+        self.action_table, self.action_lists = self.split_action_lists(
+            action_data_table
+        )
         print("Hazards-Maintenances")
-        self.hazards, self.maintenances = self._env_actions_as_df(episode_data)
+        self.hazard_events, self.maintenance_events = self._env_events(episode_data)
         print("Computing computation intensive indicators...")
+        self.overflow_counts, self.overflow_line_ids = EpisodeTrace.get_overflows(
+            self, episode_data
+        )
         self.total_overflow_trace = EpisodeTrace.get_total_overflow_trace(
             self, episode_data
         )
+        print("Time series pyramids")
+        (
+            self.usage_rate_pyramid,
+            self.rewards_pyramid,
+            self.load_pyramid,
+            self.production_pyramid,
+            self.action_pyramid,
+        ) = self._make_time_series_pyramids(episode_data)
         self.usage_rate_trace = EpisodeTrace.get_usage_rate_trace(self)
         self.reward_trace = EpisodeTrace.get_df_rewards_trace(self)
-        self.total_overflow_ts = EpisodeTrace.get_total_overflow_ts(self, episode_data)
         self.profile_traces = consumption_profiles.profiles_traces(self)
         self.total_maintenance_duration = maintenances.total_duration_maintenance(self)
         self.nb_hazards = env_actions(self, which="hazards", kind="nb", aggr=True)
@@ -109,98 +244,80 @@ class EpisodeAnalytics:
 
 
 
+    def _make_time_series_pyramids(self, episode_data):
+        """
+        Pyramids of the min, mean and max per hour and per day of the series
+        plotted over the whole episode, see time_pyramid.
+        """
+        gen_type = getattr(episode_data.observation_space, "gen_type", None)
+        prod_types = (
+            {} if gen_type is None else dict(zip(episode_data.prod_names, gen_type))
+        )
+        return (
+            EpisodeTrace.make_usage_rate_pyramid(self),
+            EpisodeTrace.make_rewards_pyramid(self),
+            EpisodeTrace.make_load_pyramid(self),
+            EpisodeTrace.make_production_pyramid(self, prod_types),
+            EpisodeTrace.make_action_pyramid(self),
+        )
+
     @staticmethod
     def timestamp(obs):
         return dt.datetime(
             obs.year, obs.month, obs.day, obs.hour_of_day, obs.minute_of_hour
         )
 
-    # @jit(forceobj=True)
-    def _make_df_from_data(self, episode_data):
+    def _make_df_from_data(self, episode_data, engine="columnar", distance="observed"):
         """
         Convert all episode's data into comprehensible dataframes usable by
         the application.
 
         The generated dataframes are:
-            - loads
-            - production
-            - rho
+            - loads, production and rho, with a row per timestamp and a
+              column per equipment
             - action data table
             - instant and cumulated rewards
-            - flow and voltage by line
+            - flows and voltages at both sides of the lines
             - target and actual redispatch
             - attacks
             - alarms
 
+        Parameters
+        ----------
+        engine: ``str``
+            "columnar" to stack the observations into arrays and build each
+            dataframe at once, "loop" to fill them timestep by timestep.
+        distance: ``str``
+            "observed" to compute the topological distance from the observed
+            topologies, "replay" to replay the actions on the reference one,
+            see DISTANCE_MODES.
+
         Returns
         -------
         res: :class:`tuple`
          generated dataframes
         """
-        size = len(episode_data.actions)
-        timesteps = list(range(size))
-        load_size = size * len(episode_data.observations[0].load_p)
-        prod_size = size * len(episode_data.observations[0].prod_p)
-        n_rho = len(episode_data.observations[0].rho)
-        rho_size = size * n_rho
-
-        load_data = pd.DataFrame(index=range(load_size), columns=["timestamp", "value"])
-        load_data.loc[:, "value"] = load_data.loc[:, "value"].astype(float)
-
-        production = pd.DataFrame(index=range(prod_size), columns=["value"])
-
-        rho = pd.DataFrame(index=range(rho_size), columns=["value"])
-
-        cols_loop_action_data_table =[
-                "action_id",
-                "action_line",
-                "action_subs",
-                "action_redisp",
-                "action_curtail",
-                "action_storage",
-                "redisp_impact",
-                "curtail_impact",
-                "storage_impact",
-                "line_name",
-                "sub_name",
-                "gen_name",
-                "ren_name",
-                "storage_name",
-                "distance",
-                "lines_modified",
-                "subs_modified",
-                "is_alarm",
-                "alarm_zone",
-                "gens_modified",
-                "rens_modified",
-                "storages_modified"
-            ]
-        action_data_table = pd.DataFrame(
-            index=range(size),
-            columns=["timestep","timestamp","timestep_reward"] + cols_loop_action_data_table
- ,
-        )
-
-        computed_rewards = pd.DataFrame(
-            index=range(size), columns=["timestep", "rewards", "cum_rewards"]
-        )
-        flow_voltage_cols = pd.MultiIndex.from_product(
-            [
-                ["or", "ex"],
-                ["active", "reactive", "current", "voltage"],
-                episode_data.line_names,
-            ]
-        )
-        flow_voltage_line_table = pd.DataFrame(
-            index=range(size), columns=flow_voltage_cols
+        if distance not in DISTANCE_MODES:
+            raise ValueError(
+                f"distance argument can only be one of {DISTANCE_MODES}. {distance} passed"
+            )
+        if engine == "columnar":
+            return self._make_df_from_data_columnar(episode_data, distance)
+        elif engine == "loop":
+            return self._make_df_from_data_loop(episode_data, distance)
+        raise ValueError(
+            f"engine argument can only be one of {INGESTION_ENGINES}. {engine} passed"
         )
 
-        target_redispatch = pd.DataFrame(
-            index=range(size), columns=episode_data.prod_names
-        )
-        actual_redispatch = pd.DataFrame(
-            index=range(size), columns=episode_data.prod_names
-        )
+    def _iter_action_rows(self, episode_data, distance_mode="observed"):
+        """
+        Go through the played timesteps and yield the timestep, its observation
+        and the values of the COLS_ACTION_DATA_TABLE columns for that timestep,
+        for the loop engine, see _make_action_rows for the columnar one.
+        """
+        size = len(episode_data.actions)
+        if distance_mode == "observed":
+            distances = self.get_topology_distances(episode_data, size)
 
         topo_vect = episode_data.observations[0].topo_vect
         if topo_vect.sum() != len(topo_vect):
@@ -210,7 +327,8 @@ class EpisodeAnalytics:
 
         # True == connected, False == disconnect
         # So that len(line_statuses) - line_statuses.sum() is the distance for lines
-        line_statuses = episode_data.observations[0].line_status
+        # (copied as it is updated in place, and the episode may be ingested again)
+        line_statuses = episode_data.observations[0].line_status.copy()
 
         # True == sub has something on bus 2, False == everything on bus 1
         # So that subs_on_bus2.sum() is the distance for subs
@@ -229,15 +347,15 @@ class EpisodeAnalytics:
         gens_modified_ids = []
         actual_redispatch_previous_ts = obs_0.actual_dispatch
 
-        list_actions = []
+        # distinct actions and their ids, shared with the actions attribute
+        action_store = ActionStore.from_episode_data(episode_data)
+        self.actions = action_store
         for (time_step, (obs, act)) in tqdm(
             enumerate(zip(episode_data.observations[:-1], episode_data.actions)),
             total=size,
         ):
-            time_stamp = self.timestamp(obs)
             (
                 action_impacts,
-                list_actions,
                 lines_modified,
                 subs_modified,
                 gens_modified_names,
@@ -248,7 +366,11 @@ class EpisodeAnalytics:
                 storage_modified_ids
 
             ) = self.compute_action_impacts(
-                act, list_actions, obs, gens_modified_ids, actual_redispatch_previous_ts
+                act,
+                action_store.action_id(time_step),
+                obs,
+                gens_modified_ids,
+                actual_redispatch_previous_ts,
             )
 
             alarm_zone = []
@@ -261,32 +383,19 @@ class EpisodeAnalytics:
 
             actual_redispatch_previous_ts = obs.actual_dispatch
 
-            # Building load DF
-            begin = time_step * episode_data.n_loads
-            end = (time_step + 1) * episode_data.n_loads - 1
-            load_data.loc[begin:end, "value"] = obs.load_p.astype(float)
-            load_data.loc[begin:end, "timestamp"] = time_stamp
-            # Building prod DF
-            begin = time_step * episode_data.n_prods
-            end = (time_step + 1) * episode_data.n_prods - 1
-            production.loc[begin:end, "value"] = obs.prod_p.astype(float)
-            # Building RHO DF
-            begin = time_step * n_rho
-            end = (time_step + 1) * n_rho - 1
-            rho.loc[begin:end, "value"] = obs.rho.astype(float)
-
-            pos = time_step
-
-            (
-                distance,
-                line_statuses,
-                subs_on_bus_2,
-                objs_on_bus_2,
-            ) = self.get_distance_from_obs(
-                act, line_statuses, subs_on_bus_2, objs_on_bus_2, obs_0
-            )
-
-            action_data_table.loc[pos, cols_loop_action_data_table] = [
+            if distance_mode == "observed":
+                distance = distances[time_step]
+            else:
+                (
+                    distance,
+                    line_statuses,
+                    subs_on_bus_2,
+                    objs_on_bus_2,
+                ) = self.get_distance_from_obs(
+                    act, line_statuses, subs_on_bus_2, objs_on_bus_2, obs_0
+                )
+
+            yield time_step, obs, [
                 action_impacts.action_id,
                 action_impacts.action_line,
                 action_impacts.action_subs,
@@ -311,47 +420,310 @@ class EpisodeAnalytics:
                 storage_modified_names
             ]
 
+    def _make_action_rows(self, episode_data, distance_mode="observed"):
+        """
+        Values of the COLS_ACTION_DATA_TABLE columns for each played timestep.
+
+        The modified elements are computed once per distinct action and the
+        volumes and alarms are read from the arrays of the observations, so
+        that only the distinct actions are built as grid2op objects.
+        """
+        size = len(episode_data.actions)
+        obs_0 = episode_data.observations[0]
+        if obs_0.topo_vect.sum() != len(obs_0.topo_vect):
+            raise ValueError("Not all things are on bus 1")
+
+        # distinct actions and their ids, shared with the actions attribute
+        action_store = ActionStore.from_episode_data(episode_data)
+        self.actions = action_store
+        modifications = self._map_distinct(
+            episode_data.actions, action_store.ids, self.get_action_modifications
+        )
+
+        observed = self._observation_arrays(
+            episode_data,
+            [
+                "actual_dispatch",
+                "curtailment_mw",
+                "storage_power",
+                "time_since_last_alarm",
+                "last_alarm",
+            ],
+            size,
+        )
+        volumes = [
+            np.zeros(size, dtype=np.float32)
+            if observed[attribute] is None
+            else observed[attribute].sum(axis=1)
+            for attribute in ["actual_dispatch", "curtailment_mw", "storage_power"]
+        ]
+        volumes[0] = np.round(volumes[0], 2)
 
-            flow_voltage_line_table.loc[time_step, :] = np.array(
+        last_alarm = observed["last_alarm"]
+        if last_alarm is None or observed["time_since_last_alarm"] is None:
+            is_alarms = np.repeat(False, size)
+        else:
+            is_alarms = (observed["time_since_last_alarm"][:, 0] == 0) & (
+                last_alarm.shape[1] != 0
+            )
+
+        if distance_mode == "observed":
+            distances = self.get_topology_distances(episode_data, size)
+        else:
+            # the impacts only depend on the action
+            impacts_on_objs = self._map_distinct(
+                episode_data.actions,
+                action_store.ids,
+                lambda action: action.impact_on_objects(),
+            )
+            line_statuses = obs_0.line_status.copy()
+            subs_on_bus_2 = np.repeat(False, obs_0.n_sub)
+            objs_on_bus_2 = {id: [] for id in range(obs_0.n_sub)}
+
+        rows = []
+        for time_step in tqdm(range(size), total=size):
+            (
+                action_impacts,
+                lines_modified,
+                subs_modified,
+                gens_modified_names,
+                _,
+                ren_modified_names,
+                _,
+                storage_modified_names,
+                _,
+            ) = self.make_action_impacts(
+                modifications[time_step],
+                action_store.action_id(time_step),
+                volumes[0][time_step],
+                volumes[1][time_step],
+                volumes[2][time_step],
+            )
+
+            is_alarm = is_alarms[time_step]
+            alarm_zone = []
+            if is_alarm:
+                alarm_zone = [
+                    obs_0.alarms_area_names[zone_id]
+                    for zone_id, zone_value in enumerate(last_alarm[time_step])
+                    if int(zone_value) == time_step
+                ]
+
+            if distance_mode == "observed":
+                distance = distances[time_step]
+            else:
+                (
+                    distance,
+                    line_statuses,
+                    subs_on_bus_2,
+                    objs_on_bus_2,
+                ) = self.get_distance_from_obs(
+                    None,
+                    line_statuses,
+                    subs_on_bus_2,
+                    objs_on_bus_2,
+                    obs_0,
+                    impacts_on_objs[time_step],
+                )
+
+            rows.append(
                 [
-                    obs.p_ex,
-                    obs.q_ex,
-                    obs.a_ex,
-                    obs.v_ex,
-                    obs.p_or,
-                    obs.q_or,
-                    obs.a_or,
-                    obs.v_or,
+                    action_impacts.action_id,
+                    action_impacts.action_line,
+                    action_impacts.action_subs,
+                    action_impacts.action_redisp,
+                    action_impacts.action_curtail,
+                    action_impacts.action_storage,
+                    action_impacts.redisp_impact,
+                    action_impacts.curtail_impact,
+                    action_impacts.storage_impact,
+                    action_impacts.line_name,
+                    action_impacts.sub_name,
+                    action_impacts.gen_name,
+                    action_impacts.ren_name,
+                    action_impacts.storage_name,
+                    distance,
+                    lines_modified,
+                    subs_modified,
+                    is_alarm,
+                    alarm_zone,
+                    gens_modified_names,
+                    ren_modified_names,
+                    storage_modified_names,
                 ]
-            ).flatten().astype('float16')
+            )
+        return rows
 
-            target_redispatch.loc[time_step, :] = obs.target_dispatch.astype('float32')
-            actual_redispatch.loc[time_step, :] = obs.actual_dispatch.astype('float32')
+    @staticmethod
+    def _map_distinct(objects, ids, function):
+        """
+        function applied to the object of each timestep, computed once per
+        distinct id on the first object having it.
 
-        load_data["timestep"] = np.repeat(timesteps, episode_data.n_loads)
-        load_data["equipment_name"] = np.tile(episode_data.load_names, size).astype(str)
-        load_data["equipement_id"] = np.tile(range(episode_data.n_loads), size)
+        :param ids: id of the object of each timestep, equal for equal objects
+        """
+        ids = np.asarray(ids)
+        distinct_ids, first_time_steps = np.unique(ids, return_index=True)
+        values = {
+            object_id: function(objects[int(time_step)])
+            for object_id, time_step in zip(distinct_ids, first_time_steps)
+        }
+        return [values[object_id] for object_id in ids]
 
-        self.timestamps = sorted(load_data.timestamp.dropna().unique())
-        self.timesteps = sorted(load_data.timestep.unique())
+    def _observation_arrays(self, episode_data, attributes, size):
+        """
+        (size, attribute size) array of each of the given attributes of the
+        size first observations, None for the attributes they do not have.
+        """
+        if hasattr(episode_data, "observation_matrix"):
+            # EpisodeReader: slice the raw arrays instead of going through objects
+            arrays = {}
+            for attribute in attributes:
+                try:
+                    arrays[attribute] = np.asarray(
+                        episode_data.observation_matrix(attribute)[:size]
+                    )
+                except KeyError:
+                    arrays[attribute] = None
+            return arrays
+        obs_0 = episode_data.observations[0]
+        stacked = self.stack_observations(
+            episode_data.observations[:size],
+            [attribute for attribute in attributes if hasattr(obs_0, attribute)],
+        )
+        return {attribute: stacked.get(attribute) for attribute in attributes}
 
-        production["timestep"] = np.repeat(timesteps, episode_data.n_prods)
-        production["timestamp"] = np.repeat(self.timestamps, episode_data.n_prods)
-        production.loc[:, "equipment_name"] = np.tile(episode_data.prod_names, size)
-        production.loc[:, "equipement_id"] = np.tile(range(episode_data.n_prods), size)
+    @staticmethod
+    def stack_observations(observations, attributes):
+        """
+        Stack the given attributes of all observations in one pass.
 
-        rho["time"] = np.repeat(timesteps, n_rho).astype('int16')
-        rho["timestamp"] = np.repeat(self.timestamps, n_rho)
-        rho["equipment"] = np.tile(range(n_rho), size)
+        Returns
+        -------
+        res: ``dict``
+            a (len(observations), attribute size) array for each attribute
+        """
+        size = len(observations)
+        stacked = {}
+        for time_step, obs in enumerate(observations):
+            for attribute in attributes:
+                value = np.atleast_1d(getattr(obs, attribute))
+                if time_step == 0:
+                    stacked[attribute] = np.empty(
+                        (size, value.shape[0]), dtype=value.dtype
+                    )
+                stacked[attribute][time_step] = value
+        return stacked
 
-        action_data_table["timestep"] = self.timesteps
-        action_data_table["timestamp"] = self.timestamps
-        action_data_table["timestep_reward"] = episode_data.rewards[:size]
+    def _make_df_from_data_columnar(self, episode_data, distance="observed"):
+        size = len(episode_data.actions)
+        timesteps = list(range(size))
+
+        action_rows = self._make_action_rows(episode_data, distance)
+
+        if hasattr(episode_data, "observation_matrix"):
+            # EpisodeReader: slice the raw arrays instead of going through objects
+            stacked = {
+                attribute: episode_data.observation_matrix(attribute)[:size]
+                for attribute in OBS_ATTRIBUTES_STACKED
+            }
+        else:
+            stacked = self.stack_observations(
+                episode_data.observations[:size], OBS_ATTRIBUTES_STACKED
+            )
+        time_stamps = pd.to_datetime(
+            pd.DataFrame(
+                {
+                    "year": stacked["year"][:, 0].astype(int),
+                    "month": stacked["month"][:, 0].astype(int),
+                    "day": stacked["day"][:, 0].astype(int),
+                    "hour": stacked["hour_of_day"][:, 0].astype(int),
+                    "minute": stacked["minute_of_hour"][:, 0].astype(int),
+                }
+            )
+        )
+        self.timestamps = sorted(time_stamps.drop_duplicates().dt.to_pydatetime())
+        self.timesteps = timesteps
+        time_stamps = time_stamps.values
+
+        index = pd.DatetimeIndex(time_stamps, name="timestamp")
+        load_data = pd.DataFrame(
+            stacked["load_p"].astype("float32"),
+            index=index,
+            columns=pd.Index(
+                np.asarray(episode_data.load_names).astype(str), name="equipment_name"
+            ),
+        )
+
+        production = pd.DataFrame(
+            stacked["prod_p"].astype("float32"),
+            index=index,
+            columns=pd.Index(
+                np.asarray(episode_data.prod_names).astype(str), name="equipment_name"
+            ),
+        )
+
+        rho = pd.DataFrame(
+            stacked["rho"].astype("float32"),
+            index=index,
+            columns=pd.Index(np.asarray(episode_data.line_names), name="line_name"),
+        )
+
+        action_data_table = pd.DataFrame(
+            action_rows, columns=COLS_ACTION_DATA_TABLE, index=range(size), dtype=object
+        )
+        action_data_table.insert(0, "timestep", self.timesteps)
+        action_data_table.insert(1, "timestamp", self.timestamps)
+        action_data_table.insert(2, "timestep_reward", episode_data.rewards[:size])
 
-        load_data["value"] = load_data["value"].astype('float32')
-        production["value"] = production["value"].astype('float32')
-        rho["value"] = rho["value"].astype('float16')
+        computed_rewards = self._make_computed_rewards(episode_data, size)
 
+        line_flows = LineFlows.from_stacked(stacked, episode_data.line_names)
+
+        target_redispatch = pd.DataFrame(
+            stacked["target_dispatch"].astype("float32"),
+            columns=episode_data.prod_names,
+        )
+        actual_redispatch = pd.DataFrame(
+            stacked["actual_dispatch"].astype("float32"),
+            columns=episode_data.prod_names,
+        )
+
+        attacks = episode_data.attacks
+        if hasattr(attacks, "vectors"):
+            # EpisodeReader: most attacks are the same, build each distinct one once
+            attack_ids = ActionStore.from_vectors(attacks.vectors, length=size).ids
+        else:
+            attack_ids = range(size)
+        attack_columns = self._map_distinct(attacks, attack_ids, self.get_attack_columns)
+        is_attacked = [is_attack for is_attack, _ in attack_columns]
+        id_lines = [id_line for _, id_line in attack_columns]
+        attacks_data_table = pd.DataFrame(
+            {
+                "timestep": self.timesteps,
+                "timestamp": self.timestamps,
+                "attack": pd.Series(is_attacked, dtype=object),
+                "id_lines": pd.Series(id_lines, dtype=object),
+            },
+            index=range(size),
+        )
+
+        return (
+            load_data,
+            production,
+            rho,
+            action_data_table,
+            computed_rewards,
+            line_flows,
+            target_redispatch,
+            actual_redispatch,
+            attacks_data_table,
+        )
+
+    def _make_computed_rewards(self, episode_data, size):
+        computed_rewards = pd.DataFrame(
+            index=range(size), columns=["timestep", "rewards", "cum_rewards"]
+        )
         computed_rewards["timestep"] = self.timestamps
         computed_rewards["rewards"] = episode_data.rewards[:size]
 
@@ -365,6 +737,94 @@ class EpisodeAnalytics:
                     ]
                     computed_rewards["rewards"] = computed_rewards["rewards"][:size]
         computed_rewards["cum_rewards"] = computed_rewards["rewards"].cumsum(axis=0)
+        return computed_rewards
+
+    def _make_df_from_data_loop(self, episode_data, distance="observed"):
+        size = len(episode_data.actions)
+        timesteps = list(range(size))
+        time_stamps = []
+
+        load_data = pd.DataFrame(
+            index=range(size),
+            columns=pd.Index(
+                np.asarray(episode_data.load_names).astype(str), name="equipment_name"
+            ),
+            dtype=float,
+        )
+
+        production = pd.DataFrame(
+            index=range(size),
+            columns=pd.Index(
+                np.asarray(episode_data.prod_names).astype(str), name="equipment_name"
+            ),
+            dtype=float,
+        )
+
+        rho = pd.DataFrame(
+            index=range(size),
+            columns=pd.Index(np.asarray(episode_data.line_names), name="line_name"),
+            dtype=float,
+        )
+
+        action_data_table = pd.DataFrame(
+            index=range(size),
+            columns=["timestep","timestamp","timestep_reward"] + COLS_ACTION_DATA_TABLE
+ ,
+        )
+
+        flows = np.empty(
+            (size, len(SIDES), len(QUANTITIES), episode_data.n_lines), dtype="float32"
+        )
+
+        target_redispatch = pd.DataFrame(
+            index=range(size), columns=episode_data.prod_names
+        )
+        actual_redispatch = pd.DataFrame(
+            index=range(size), columns=episode_data.prod_names
+        )
+
+        for time_step, obs, action_row in self._iter_action_rows(
+            episode_data, distance
+        ):
+            time_stamps.append(self.timestamp(obs))
+
+            load_data.loc[time_step, :] = obs.load_p.astype(float)
+            production.loc[time_step, :] = obs.prod_p.astype(float)
+            rho.loc[time_step, :] = obs.rho.astype(float)
+
+            pos = time_step
+
+            action_data_table.loc[pos, COLS_ACTION_DATA_TABLE] = action_row
+
+            flows[time_step] = np.array(
+                [
+                    [obs.p_or, obs.q_or, obs.a_or, obs.v_or],
+                    [obs.p_ex, obs.q_ex, obs.a_ex, obs.v_ex],
+                ]
+            ).astype('float32')
+
+            target_redispatch.loc[time_step, :] = obs.target_dispatch.astype('float32')
+            actual_redispatch.loc[time_step, :] = obs.actual_dispatch.astype('float32')
+
+        line_flows = LineFlows(flows, episode_data.line_names)
+
+        self.timestamps = sorted(set(time_stamps))
+        self.timesteps = timesteps
+
+        index = pd.DatetimeIndex(self.timestamps, name="timestamp")
+        load_data.index = index
+        production.index = index
+        rho.index = index
+
+        action_data_table["timestep"] = self.timesteps
+        action_data_table["timestamp"] = self.timestamps
+        action_data_table["timestep_reward"] = episode_data.rewards[:size]
+
+        load_data = load_data.astype('float32')
+        production = production.astype('float32')
+        rho = rho.astype('float32')
+
+        computed_rewards = self._make_computed_rewards(episode_data, size)
 
         attacks_data_table = pd.DataFrame(
             index=range(size), columns=["timestep", "timestamp", "attack", "id_lines"]
@@ -391,72 +851,101 @@ class EpisodeAnalytics:
             rho,
             action_data_table,
             computed_rewards,
-            flow_voltage_line_table,
+            line_flows,
             target_redispatch,
             actual_redispatch,
             attacks_data_table,
         )
 
+    def optimize_memory_footprint(self, opt_obs_act=False, storage_policy=None):
+        """
+        Store the tables with smaller dtypes.
+
+        Parameters
+        ----------
+        storage_policy: ``dict``
+            quantization.Storage of each of the quantization.TABLES, float16
+            by default. The largest absolute error each table got is kept in
+            quantization_errors and printed.
+        """
+        if storage_policy is None:
+            storage_policy = quantization.parse_storage_policy("")
+        names = (
+            list(MEMORY_FOOTPRINT_DTYPES)
+            + list(STORED_TABLES)
+            + ["flow_and_voltage_line"]
+        )
+        if opt_obs_act:
+            names += ["observations", "actions"]
+        # rebuilt from the optimized tables on their next access
+        self.release_derived_frames()
+        previous_errors = getattr(self, "quantization_errors", {})
+        errors = {}
+        for name in names:
+            # attributes still in the filesystem cache are optimized when loaded
+            if name in self.__dict__:
+                value = self.__dict__[name]
+                stored = self.optimize_attribute_memory(name, value, storage_policy)
+                table = STORED_TABLES.get(name)
+                # tables already stored so keep the error they got then
+                if table is not None and (
+                    stored is not value or table not in previous_errors
+                ):
+                    errors[table] = {
+                        "storage": str(storage_policy[table]),
+                        "max_abs_error": quantization.max_abs_error(
+                            self.table_values(value), self.table_values(stored)
+                        ),
+                    }
+                setattr(self, name, stored)
+        if errors:
+            self.quantization_errors = {**previous_errors, **errors}
+            print(quantization.error_report(errors))
+        self.set_attribute_load_hook(
+            lambda name, value: self.optimize_attribute_memory(
+                name, value, storage_policy
+            )
+            if name in names else value
+        )
+
+    @staticmethod
+    def table_values(value):
+        """Float array of the values of a table of STORED_TABLES"""
+        if isinstance(value, LineFlows):
+            return value.to_numpy()
+        return quantization.dequantize(value)
+
     @staticmethod
-    def get_action_id(action, list_actions):
-        if not action:
-            return None, list_actions
-        for idx, act_dict in enumerate(list_actions):
-            if action == act_dict:
-                return idx, list_actions
-        # if we havnt found the vect...
-        list_actions.append(action)
-        return len(list_actions) - 1, list_actions
-
-    def optimize_memory_footprint(self,opt_obs_act=False):
-        self.flow_and_voltage_line=self.flow_and_voltage_line.astype('float16')
-        self.production.equipment_name=self.production.equipment_name.astype('category')
-        self.production.value = self.production.value.astype('float16')
-        self.production.timestamp = self.production.timestamp.astype('category')
-        self.production.timestep = self.production.timestep.astype('category')
-        self.production.equipement_id = self.production.equipement_id.astype('category')
-
-        self.load.equipment_name = self.load.equipment_name.astype('category')
-        self.load.value = self.load.value.astype('float16')
-        self.load.timestamp=self.load.timestamp.astype('category')
-        self.load.timestep = self.load.timestep.astype('category')
-        self.load.equipement_id = self.load.equipement_id.astype('category')
-
-        self.maintenances.line_name=self.maintenances.line_name.astype('category')
-        self.maintenances.timestep=self.maintenances.timestep.astype('category')
-        self.maintenances.timestamp = self.maintenances.timestamp.astype('category')
-        self.maintenances.line_id=self.maintenances.line_id.astype('category')
-        self.maintenances.value = self.maintenances.value.astype('bool')
-
-        self.hazards.line_name = self.hazards.line_name.astype('category')
-        self.hazards.timestep = self.hazards.timestep.astype('category')
-        self.hazards.timestamp = self.hazards.timestamp.astype('category')
-        self.hazards.line_id=self.hazards.line_id.astype('category')
-        self.hazards.value = self.hazards.value.astype('bool')
-
-        self.rho.value=self.rho.value.astype('float16')
-        self.rho.equipment = self.rho.equipment.astype('category')
-        self.rho.time=self.rho.time.astype('category')
-        self.rho.timestamp=self.rho.timestamp.astype('category')
+    def optimize_attribute_memory(name, value, storage_policy=None):
+        if name in STORED_TABLES:
+            if storage_policy is None:
+                storage_policy = quantization.parse_storage_policy("")
+            storage = storage_policy[STORED_TABLES[name]]
+            if isinstance(value, LineFlows):
+                return value.stored_as(storage)
+            return quantization.quantize(value, storage)
+        if name == "flow_and_voltage_line":
+            return value.astype('float16')
+        if name in MEMORY_FOOTPRINT_DTYPES:
+            return value.astype(MEMORY_FOOTPRINT_DTYPES[name])
 
         #optimize observations with float16 instead of float32 here
         #optimize observation and action footprint a bit
-        if opt_obs_act:
-            for t in range(len(self.observations)):
-                for key, value in self.observations[t].__dict__.items():
-                    if type(value) == np.ndarray:
-                        if value.dtype == 'float32':
-                            setattr(self.observations[t], key, value.astype('float16'))
-#
-            for t in range(len(self.actions)):
-                for key, value in self.actions[t].__dict__.items():
-                    if type(value) == np.ndarray:
-                        if value.dtype == 'float32':
-                            setattr(self.actions[t], key, value.astype('float16'))
-                        if value.dtype == 'int32':
-                            setattr(self.actions[t], key, value.astype('int8'))
-
-
+        if name == "observations" and not isinstance(value, ObservationStore):
+            for obs in value:
+                for key, attr_value in obs.__dict__.items():
+                    if type(attr_value) == np.ndarray:
+                        if attr_value.dtype == 'float32':
+                            setattr(obs, key, attr_value.astype('float16'))
+        if name == "actions" and not isinstance(value, ActionStore):
+            for act in value:
+                for key, attr_value in act.__dict__.items():
+                    if type(attr_value) == np.ndarray:
+                        if attr_value.dtype == 'float32':
+                            setattr(act, key, attr_value.astype('float16'))
+                        if attr_value.dtype == 'int32':
+                            setattr(act, key, attr_value.astype('int8'))
+        return value
 
     def get_sub_name(self, act, obs):
         for sub in range(len(obs.sub_info)):
@@ -467,11 +956,66 @@ class EpisodeAnalytics:
                 return self.name_sub[sub]
         return None
 
+    def get_topology_distances(self, episode_data, size):
+        """
+        Topological distance to the reference topology, everything on bus 1,
+        after each of the size first actions: the number of disconnected lines
+        plus the number of substations with an element on bus 2 or more.
+
+        As when the actions are replayed, the lines disconnected by a hazard
+        or a maintenance are not counted until they are connected again.
+
+        Returns
+        -------
+        res: ``numpy.ndarray``
+            the distance after each action
+        """
+        # the observation following each action, the last one being repeated
+        # when the episode has no observation after its last action
+        n_obs = len(episode_data.observations)
+        following = np.minimum(np.arange(1, size + 1), n_obs - 1)
+        if hasattr(episode_data, "observation_matrix"):
+            line_status = episode_data.observation_matrix("line_status")[following]
+            topo_vect = episode_data.observation_matrix("topo_vect")[following]
+        else:
+            stacked = self.stack_observations(
+                episode_data.observations, ["line_status", "topo_vect"]
+            )
+            line_status = stacked["line_status"][following]
+            topo_vect = stacked["topo_vect"][following]
+
+        # elements of the topo_vect are ordered by substation
+        sub_info = np.asarray(episode_data.observations[0].sub_info)
+        sub_starts = np.concatenate(([0], np.cumsum(sub_info)[:-1]))
+        sub_starts = np.minimum(sub_starts, topo_vect.shape[1] - 1)
+        on_bus_2 = np.add.reduceat(
+            (np.asarray(topo_vect) >= 2).astype(np.int32), sub_starts, axis=1
+        )
+        # reduceat gives the element at the start for empty substations
+        subs_on_bus_2 = ((on_bus_2 > 0) & (sub_info > 0)).sum(axis=1)
+
+        connected = np.asarray(line_status).astype(bool)
+        hazards, maintenances = self._env_masks(episode_data)
+        env_disconnected = (hazards | maintenances)[:size] & ~connected
+        # disconnected since the last time the environment disconnected them
+        steps = np.arange(size)[:, np.newaxis]
+        last_env_disconnection = np.maximum.accumulate(
+            np.where(env_disconnected, steps, -1), axis=0
+        )
+        last_connected = np.maximum.accumulate(np.where(connected, steps, -1), axis=0)
+        disconnected_by_env = ~connected & (last_env_disconnection > last_connected)
+
+        lines_disconnected = (~connected & ~disconnected_by_env).sum(axis=1)
+        return lines_disconnected + subs_on_bus_2
+
     def get_distance_from_obs(
-        self, act, line_statuses, subs_on_bus_2, objs_on_bus_2, obs
+        self, act, line_statuses, subs_on_bus_2, objs_on_bus_2, obs, impact_on_objs=None
     ):
-
-        impact_on_objs = act.impact_on_objects()
+        """
+        :param impact_on_objs: act.impact_on_objects(), computed if None
+        """
+        if impact_on_objs is None:
+            impact_on_objs = act.impact_on_objects()
 
         # lines reconnetions/disconnections
         line_statuses[
@@ -557,42 +1101,213 @@ class EpisodeAnalytics:
             objs_on_bus_2[elem["substation"]].append(pos_topo_vect[elem["object_id"]])
         return objs_on_bus_2
 
-    # @jit(forceobj=True)
-    def _env_actions_as_df(self, episode_data):
-        agent_length = len(
-            episode_data.actions
-        )  # int(episode_data.meta['nb_timestep_played'])
-        hazards_size = agent_length * episode_data.n_lines
-        cols = ["timestep", "timestamp", "line_id", "line_name", "value"]
-        hazards = pd.DataFrame(index=range(hazards_size), columns=["value"], dtype=int)
-        maintenances = hazards.copy()
-
-        for (time_step, env_act) in tqdm(
-            enumerate(episode_data.env_actions), total=len(episode_data.env_actions)
+    def _env_events(self, episode_data):
+        """
+        Hazards and maintenances of the lines as LineEvents, read from the
+        (nb timesteps, nb lines) masks of the environment modifications.
+        """
+        hazards, maintenances = self._env_masks(episode_data)
+        return (
+            LineEvents.from_mask(hazards, episode_data.line_names),
+            LineEvents.from_mask(maintenances, episode_data.line_names),
+        )
+
+    @staticmethod
+    def _env_masks(episode_data):
+        """
+        (nb timesteps, nb lines) masks of the hazards and of the maintenances
+        of the environment modifications.
+        """
+        agent_length = len(episode_data.actions)
+        if hasattr(episode_data, "env_modification_matrix"):
+            # EpisodeReader: slice the raw arrays instead of going through objects
+            hazards = episode_data.env_modification_matrix("_hazards")[:agent_length]
+            maintenances = episode_data.env_modification_matrix("_maintenance")[
+                :agent_length
+            ]
+        else:
+            hazards = np.zeros((agent_length, episode_data.n_lines), dtype=bool)
+            maintenances = hazards.copy()
+            for time_step, env_act in enumerate(episode_data.env_actions[:agent_length]):
+                if env_act is None:
+                    continue
+                hazards[time_step] = env_act._hazards
+                maintenances[time_step] = env_act._maintenance
+        return np.asarray(hazards, dtype=bool), np.asarray(maintenances, dtype=bool)
+
+    def _derived_attribute(self, name, source, build):
+        """
+        Attribute name built by build(values of the source attributes), or as
+        stored by the episodes cached before it was derived from source.
+
+        The built value is kept until one of the source attributes is replaced
+        or released, see release_derived_frames.
+
+        :param source: name of the source attribute or tuple of names
+        """
+        if name in self.__dict__:
+            return self.__dict__[name]
+        sources = (source,) if isinstance(source, str) else source
+        try:
+            values = tuple(getattr(self, attribute) for attribute in sources)
+        except AttributeError:
+            return self.__getattr__(name)
+        derived_frames = self.__dict__.setdefault(DERIVED_FRAMES_ATTRIBUTE, {})
+        derived = derived_frames.get(name)
+        if derived is None or any(
+            value is not built_from for value, built_from in zip(values, derived[0])
         ):
-            if env_act is None:
-                continue
+            derived = derived_frames[name] = (values, build(*values))
+        return derived[1]
+
+    def release_derived_frames(self):
+        """Drop the dataframes built by _derived_attribute"""
+        self.__dict__.pop(DERIVED_FRAMES_ATTRIBUTE, None)
+
+    def release_attributes(self, names=None):
+        released = super().release_attributes(names)
+        if released:
+            self.release_derived_frames()
+        return released
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop(DERIVED_FRAMES_ATTRIBUTE, None)
+        # spaces cannot be pickled, see decorate_obs_act_spaces
+        state.pop("observation_space", None)
+        state.pop("action_space", None)
+        return state
+
+    @property
+    def load(self):
+        """Long format dataframe of the loads, built from load_matrix"""
+        return self._derived_attribute(
+            "load",
+            "load_matrix",
+            lambda matrix: observation_model.long_format(matrix, "load"),
+        )
 
-            time_stamp = self.timestamp(episode_data.observations[time_step])
+    @load.setter
+    def load(self, value):
+        self.__dict__["load"] = value
+
+    @property
+    def production(self):
+        """Long format dataframe of the productions, built from production_matrix"""
+        return self._derived_attribute(
+            "production",
+            "production_matrix",
+            lambda matrix: observation_model.long_format(matrix, "production"),
+        )
+
+    @production.setter
+    def production(self, value):
+        self.__dict__["production"] = value
+
+    @property
+    def rho(self):
+        """Long format dataframe of the usage rates, built from rho_matrix"""
+        return self._derived_attribute(
+            "rho", "rho_matrix", lambda matrix: observation_model.long_format(matrix, "rho")
+        )
+
+    @rho.setter
+    def rho(self, value):
+        self.__dict__["rho"] = value
+
+    @property
+    def flow_and_voltage_line(self):
+        """
+        Dataframe of the flows and voltages with a (side, quantity, line name)
+        column per line, built from line_flows
+        """
+        return self._derived_attribute(
+            "flow_and_voltage_line", "line_flows", lambda flows: flows.to_frame()
+        )
+
+    @flow_and_voltage_line.setter
+    def flow_and_voltage_line(self, value):
+        self.__dict__["flow_and_voltage_line"] = value
 
-            begin = time_step * episode_data.n_lines
-            end = (time_step + 1) * episode_data.n_lines - 1
-            hazards.loc[begin:end, "value"] = env_act._hazards.astype(int)
+    @property
+    def hazards(self):
+        """Long format dataframe of the hazards, built from hazard_events"""
+        return self._derived_attribute(
+            "hazards", "hazard_events", lambda events: events.dense(self.timestamps)
+        )
 
-            begin = time_step * episode_data.n_lines
-            end = (time_step + 1) * episode_data.n_lines - 1
-            maintenances.loc[begin:end, "value"] = env_act._maintenance.astype(int)
+    @hazards.setter
+    def hazards(self, value):
+        self.__dict__["hazards"] = value
+
+    @property
+    def maintenances(self):
+        """Long format dataframe of the maintenances, built from maintenance_events"""
+        return self._derived_attribute(
+            "maintenances",
+            "maintenance_events",
+            lambda events: events.dense(self.timestamps),
+        )
 
-        hazards["timestep"] = np.repeat(range(agent_length), episode_data.n_lines)
-        maintenances["timestep"] = hazards["timestep"]
-        hazards["timestamp"] = np.repeat(self.timestamps, episode_data.n_lines)
-        maintenances["timestamp"] = hazards["timestamp"]
-        hazards["line_name"] = np.tile(episode_data.line_names, agent_length)
-        maintenances["line_name"] = hazards["line_name"]
-        hazards["line_id"] = np.tile(range(episode_data.n_lines), agent_length)
-        maintenances["line_id"] = hazards["line_id"]
+    @maintenances.setter
+    def maintenances(self, value):
+        self.__dict__["maintenances"] = value
+
+    @property
+    def total_overflow_ts(self):
+        """Dataframe of the overflows, built from overflow_counts and overflow_line_ids"""
+        return self._derived_attribute(
+            "total_overflow_ts",
+            "overflow_counts",
+            lambda counts: EpisodeTrace.get_total_overflow_ts(self),
+        )
 
-        return hazards, maintenances
+    @total_overflow_ts.setter
+    def total_overflow_ts(self, value):
+        self.__dict__["total_overflow_ts"] = value
+
+    @staticmethod
+    def split_action_lists(action_data_table):
+        """
+        Split action_data_table in the dataframe of its scalar columns and a
+        dict of the RaggedArray of its ACTION_LIST_COLUMNS.
+        """
+        action_lists = {
+            column: RaggedArray.from_lists(
+                list(action_data_table[column]), dtype=object, categorical=True
+            )
+            for column in ACTION_LIST_COLUMNS
+        }
+        return action_data_table.drop(columns=ACTION_LIST_COLUMNS), action_lists
+
+    @staticmethod
+    def _join_action_lists(action_table, action_lists):
+        frame = action_table.copy()
+        for column, lists in action_lists.items():
+            frame[column] = pd.Series(lists.tolist(), index=frame.index, dtype=object)
+        columns = ["timestep", "timestamp", "timestep_reward"] + COLS_ACTION_DATA_TABLE
+        return frame[
+            [column for column in columns if column in frame.columns]
+            + [column for column in frame.columns if column not in columns]
+        ]
+
+    @property
+    def action_data_table(self):
+        """
+        Dataframe of the actions, built from action_table and action_lists
+        with the lists of modified elements per timestep.
+
+        Shared by the callbacks reading the episode, it must not be modified.
+        """
+        return self._derived_attribute(
+            "action_data_table",
+            ("action_table", "action_lists"),
+            self._join_action_lists,
+        )
+
+    @action_data_table.setter
+    def action_data_table(self, value):
+        self.__dict__["action_data_table"] = value
 
     def get_prod_types(self):
         types = self.observation_space.gen_type
@@ -613,9 +1328,12 @@ class EpisodeAnalytics:
                 if not (elem.startswith("__") or callable(getattr(episode_data, elem)))
              ]:
             if(attribute=="observations"):
-                self.observations=list(episode_data.observations)#make thos objects pickable
+                # arrays of the observations, grid2op objects being built when indexed
+                self.observations=ObservationStore.from_episode_data(episode_data)
             if(attribute=="actions"):
-                self.actions=list(episode_data.actions)#make thos objects pickable
+                # distinct action vectors, grid2op objects being built when indexed
+                if not isinstance(self.__dict__.get("actions"), ActionStore):
+                    self.actions = ActionStore.from_episode_data(episode_data)
             if(attribute in ["prod_names",  "line_names", "load_names", "meta",
                           "rewards"]):
                 setattr(self, attribute, getattr(episode_data, attribute))
@@ -635,62 +1353,61 @@ class EpisodeAnalytics:
         OBS_SPACE = "dict_observation_space.json"
         ACTION_SPACE = "dict_action_space.json"
 
-        self.observation_space = ObservationSpace.from_dict(
+        # spaces are shared by all the episodes with the same json files
+        self.observation_space = space_registry.observation_space(
             os.path.join(agent_path, OBS_SPACE))  # need to add action space maybe also, at least for simulation page
-        self.action_space = ActionSpace.from_dict(os.path.join(agent_path, ACTION_SPACE))
+        self.action_space = space_registry.action_space(os.path.join(agent_path, ACTION_SPACE))
 
     def compute_action_impacts(
         self,
         action,
-        list_actions,
+        action_id,
         observation,
         gens_modified_ids,
         actual_dispatch_previous_ts,
     ):
-
-        (
-            n_lines_modified,
-            str_lines_modified,
-            lines_modified,
-        ) = self.get_lines_modifications(action)
-        n_subs_modified, str_subs_modified, subs_modified = self.get_subs_modifications(
-            action
-        )
-
-        (
-            n_gens_modified,
-            str_gens_modified,
-            gens_modified_names,
-            gens_modified_ids,
-            redisp_volume,
-        ) = self.get_gens_modifications(
-            action, observation, gens_modified_ids, actual_dispatch_previous_ts
+        return self.make_action_impacts(
+            self.get_action_modifications(action),
+            action_id,
+            round(observation.actual_dispatch.sum(), 2),
+            observation.curtailment_mw.sum(),
+            observation.storage_power.sum(),
         )
 
-        (
-            n_ren_modified,
-            str_ren_modified,
-            ren_modified_names,
-            ren_modified_ids,
-            volume_curtailed,
-        ) = self.get_curtailment_modifications(
-            action, observation
+    def get_action_modifications(self, action):
+        """
+        Elements modified by an action, which do not depend on the timestep it
+        is played at, see make_action_impacts
+        """
+        return (
+            self.get_lines_modifications(action),
+            self.get_subs_modifications(action),
+            self.get_gens_modifications(action),
+            self.get_curtailment_modifications(action),
+            self.get_storage_modifications(action),
         )
 
+    @staticmethod
+    def make_action_impacts(
+        modifications, action_id, redisp_volume, volume_curtailed, volume_stored
+    ):
         (
-            n_storage_modified,
-            str_storage_modified,
-            storage_modified_names,
-            storage_modified_ids,
-            volume_stored,
-
-        ) = self.get_storage_modifications(
-            action,
-            observation
-        )
-
-
-        action_id, list_actions = self.get_action_id(action, list_actions)
+            (n_lines_modified, str_lines_modified, lines_modified),
+            (n_subs_modified, str_subs_modified, subs_modified),
+            (
+                n_gens_modified,
+                str_gens_modified,
+                gens_modified_names,
+                gens_modified_ids,
+            ),
+            (n_ren_modified, str_ren_modified, ren_modified_names, ren_modified_ids),
+            (
+                n_storage_modified,
+                str_storage_modified,
+                storage_modified_names,
+                storage_modified_ids,
+            ),
+        ) = modifications
 
         return (
             ActionImpacts(
@@ -709,7 +1426,6 @@ class EpisodeAnalytics:
                 storage_name=str_storage_modified,
                 action_id=action_id,
             ),
-            list_actions,
             lines_modified,
             subs_modified,
             gens_modified_names,
@@ -794,22 +1510,15 @@ class EpisodeAnalytics:
                 ],
             ]
 
-        subs_modified_set = set(subs_modified)
-        str_subs_modified = " - ".join(subs_modified_set)
+        # sorted so that the text does not depend on the set iteration order
+        str_subs_modified = " - ".join(sorted(set(subs_modified)))
         return n_subs_modified, str_subs_modified, subs_modified
 
-    def get_gens_modifications(
-        self,
-        action,
-        observation,
-        gens_modified_previous_time_step,
-        actual_dispatch_previous_ts,
-    ):
+    def get_gens_modifications(self, action):
         action_dict = action.as_dict()
         n_gens_modified = 0
         gens_modified_ids = []
         gens_modified_names = []
-        volume_redispatched=round(observation.actual_dispatch.sum(),2)
         if "redispatch" in action_dict:
             n_gens_modified = (action_dict["redispatch"] != 0).sum()
             gens_modified_ids = np.where(action_dict["redispatch"] != 0)[0]
@@ -837,19 +1546,13 @@ class EpisodeAnalytics:
             str_gens_modified,
             gens_modified_names,
             gens_modified_ids,
-            volume_redispatched,
         )
 
-    def get_curtailment_modifications(
-        self,
-        action,
-        observation
-    ):
+    def get_curtailment_modifications(self, action):
         action_dict = action.as_dict()
         n_ren_modified = 0
         ren_modified_names = []
         ren_modified_ids = []
-        volume_curtailed=observation.curtailment_mw.sum()
         if "curtailment" in action_dict:
             n_ren_modified = (action_dict["curtailment"] >0.001).sum()
             ren_modified_ids = np.where(action_dict["curtailment"] >0.001)[0]
@@ -872,19 +1575,13 @@ class EpisodeAnalytics:
             str_ren_modified,
             ren_modified_names,
             ren_modified_ids,
-            volume_curtailed,
         )
 
-    def get_storage_modifications(
-        self,
-        action,
-        observation
-    ):
+    def get_storage_modifications(self, action):
         action_dict = action.as_dict()
         n_storage_modified = 0
         storage_modified_names = []
         storage_modified_ids = []
-        volume_stored=observation.storage_power.sum()
         if "storage_power" in action_dict:
             n_storage_modified = (action_dict["storage_power"] != 0).sum()
             storage_modified_ids = np.where(action_dict["storage_power"] != 0)[0]
@@ -903,11 +1600,19 @@ class EpisodeAnalytics:
             str_storage_modified,
             storage_modified_names,
             storage_modified_ids,
-            volume_stored,
         )
 
 
 
+    def get_attack_columns(self, attack):
+        """Whether an attack modifies the grid, and the first line it modifies"""
+        n_lines_modified, _, lines_modified = self.get_lines_modifications(attack)
+        n_subs_modified, *_ = self.get_subs_modifications(attack)
+        return (
+            n_lines_modified > 0 or n_subs_modified > 0,
+            lines_modified[0] if len(lines_modified) else "",
+        )
+
     def get_subs_and_lines_impacted(self, action):
         line_impact, sub_impact = action.get_topological_impact()
         sub_names = action.name_sub[sub_impact]
@@ -6,8 +6,11 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
-from . import observation_model
+from . import observation_model, time_pyramid
 from .env_actions import env_actions
+from .observation_store import observation_matrix
+from .ragged import RaggedArray
+from .time_pyramid import TimeSeriesPyramid
 
 # colors for production share sunburst pie
 dic_colors_prod_types = {
@@ -23,37 +26,187 @@ dic_light_colors_prod_types["nuclear"] = "goldenrod"
 dic_light_colors_prod_types["wind"] = "green"
 dic_light_colors_prod_types["solar"] = "palegoldenrod"
 
+# aggregate of each usage rate statistic plotted from the pyramid levels, the
+# outer ones keeping the envelope of the periods
+USAGE_RATE_AGGREGATES = {
+    "quantile10": "min",
+    "quantile25": "mean",
+    "median": "mean",
+    "quantile75": "mean",
+    "quantile90": "max",
+    "max": "max",
+}
+
+# columns of the action_data_table kept in the action pyramid
+ACTION_PYRAMID_COLUMNS = ["distance", "redisp_impact", "curtail_impact", "storage_impact"]
+
 
 def get_total_overflow_trace(episode_analytics, episode_data):
-    df = get_total_overflow_ts(episode_analytics, episode_data)
+    counts, line_ids = overflow_arrays(episode_analytics)
     # line_in_overflow=
     return [
         go.Scatter(
-            x=df["time"],
-            y=np.array(df["value"].tolist()),
+            x=episode_analytics.timestamps[: len(counts)],
+            y=counts,
             text=[
                 "lines " + str(episode_data.line_names[liste]) if len(liste) > 0 else ""
-                for liste in df["line_ids"]
+                for liste in line_ids
             ],  # could be improve with names maybe, here only ids
             name="Nb of overflows",
         )
     ]
 
 
-def get_total_overflow_ts(episode_analytics, episode_data):
+def get_overflows(episode_analytics, episode_data):
+    """
+    Number of lines in overflow at each timestep and ids of the lines whose
+    overflow starts at each timestep, from the timestep_overflow of the
+    observations stacked at once.
+
+    Returns
+    -------
+    res: ``tuple``
+        the counts array and the line ids as a RaggedArray
+    """
+    # TODO: observations length and timsteps length should match
+    size = min(
+        len(episode_analytics.timesteps),
+        len(episode_analytics.timestamps),
+        len(episode_data.observations),
+    )
+    if hasattr(episode_data, "observation_matrix"):
+        timestep_overflow = episode_data.observation_matrix("timestep_overflow")[:size]
+    else:
+        timestep_overflow = observation_matrix(
+            episode_data.observations[:size], "timestep_overflow"
+        )
+    timestep_overflow = np.asarray(timestep_overflow).reshape(size, -1)
+    counts = (timestep_overflow > 0).sum(axis=1)
+    return counts, RaggedArray.from_mask(timestep_overflow == 1)
+
+
+def overflow_arrays(episode):
+    """Overflow counts and line ids of an episode, see get_overflows"""
+    try:
+        return episode.overflow_counts, episode.overflow_line_ids
+    except AttributeError:
+        # episodes cached with the total_overflow_ts dataframe only
+        df = episode.total_overflow_ts.dropna()
+        return (
+            df["value"].values.astype(int),
+            RaggedArray.from_lists(list(df["line_ids"]), dtype=np.int32),
+        )
+
+
+def get_total_overflow_ts(episode_analytics, episode_data=None):
+    """
+    Dataframe with the time, the number of lines in overflow and the ids of
+    the lines whose overflow starts at each timestep.
+    """
+    counts, line_ids = overflow_arrays(episode_analytics)
+    size = len(counts)
     df = pd.DataFrame(
-        index=episode_analytics.timesteps, columns=["time", "value", "line_ids"]
+        {
+            "time": list(episode_analytics.timestamps[:size]),
+            "value": counts,
+            "line_ids": line_ids.tolist(),
+        },
+        index=episode_analytics.timesteps[:size],
+    )
+    return df.reindex(episode_analytics.timesteps)
+
+
+def make_usage_rate_pyramid(episode):
+    timestamps, quantiles = observation_model.get_usage_rate_quantiles(episode)
+    return TimeSeriesPyramid.build(
+        timestamps, np.column_stack(list(quantiles.values())), list(quantiles)
+    )
+
+
+def make_rewards_pyramid(episode):
+    df = observation_model.get_df_computed_reward(episode)
+    return TimeSeriesPyramid.build(
+        df["timestep"],
+        df[["rewards", "cum_rewards"]].to_numpy(dtype=float),
+        ["rewards", "cum_rewards"],
+    )
+
+
+def make_load_pyramid(episode):
+    """Pyramid of the loads, of their total and of the total of the intercos"""
+    load = observation_model.get_equipment_matrix(episode, "load")
+    is_interco = load.columns.str.contains("interco")
+    return TimeSeriesPyramid.from_frame(
+        load.assign(
+            total=load.loc[:, ~is_interco].sum(axis=1),
+            total_intercos=load.loc[:, is_interco].sum(axis=1),
+        )
+    )
+
+
+def make_production_pyramid(episode, prod_types):
+    """Pyramid of the generators, of their total and of the total of each type"""
+    prod = observation_model.get_equipment_matrix(episode, "production")
+    types = pd.Series([prod_types.get(name) for name in prod.columns])
+    totals = {"total": prod.sum(axis=1)}
+    for prod_type in types.dropna().unique():
+        totals[prod_type] = prod.loc[:, (types == prod_type).values].sum(axis=1)
+    return TimeSeriesPyramid.from_frame(prod.assign(**totals))
+
+
+def make_action_pyramid(episode):
+    df = episode.action_table
+    return TimeSeriesPyramid.build(
+        df["timestamp"],
+        df[ACTION_PYRAMID_COLUMNS].to_numpy(dtype=float),
+        ACTION_PYRAMID_COLUMNS,
     )
-    for (time_step, obs) in enumerate(episode_data.observations):
-        # TODO: observations length and timsteps length should match
-        try:
-            tstamp = episode_analytics.timestamps[time_step]
-            ov = obs.timestep_overflow
-            overflows = [i for i in range(len(ov)) if ov[i] == 1]
-            df.loc[time_step, :] = [tstamp, (ov > 0).sum(), overflows]
-        except:
-            pass
-    return df
+
+
+def get_level_trace(level, column, x_range=None, aggregate="mean", band=True, **kwargs):
+    """
+    Scatter of a series of a pyramid level over x_range, with the min/max band
+    of each period as error bars.
+
+    :param column: index of the series in the pyramid
+    """
+    x, y = level.values(aggregate, column, x_range)
+    y = y.astype(float)
+    if band:
+        _, low = level.values("min", column, x_range)
+        _, high = level.values("max", column, x_range)
+        kwargs.setdefault(
+            "error_y",
+            dict(
+                type="data",
+                symmetric=False,
+                array=high.astype(float) - y,
+                arrayminus=y - low.astype(float),
+                thickness=1,
+                width=0,
+            ),
+        )
+    return go.Scatter(x=x, y=y, **kwargs)
+
+
+def clip_traces(traces, x_range=None):
+    """
+    Copies of the traces keeping only their points in x_range, see
+    time_pyramid.range_slice
+    """
+    if x_range is None:
+        return traces
+    clipped = []
+    for trace in traces:
+        trace = go.Scatter(trace)
+        if trace.x is not None and len(trace.x):
+            index = time_pyramid.range_slice(trace.x, x_range)
+            update = {"x": trace.x[index], "y": trace.y[index]}
+            if trace.text is not None and not isinstance(trace.text, str):
+                update["text"] = trace.text[index]
+            trace.update(update)
+        clipped.append(trace)
+    return clipped
 
 
 def get_prod_share_trace(episode):
@@ -103,7 +256,7 @@ def get_hazard_trace(episode, equipments=None):
 
     if "total" in equipments:
         ts_hazards_by_line = ts_hazards_by_line.assign(
-            total=episode.hazards.groupby("timestamp", as_index=True)["value"].sum()
+            total=ts_hazards_by_line.sum(axis=1)
         )
 
     if equipments is not None:
@@ -163,7 +316,12 @@ def get_maintenance_trace(episode, equipments=None):
     return traces
 
 
-def get_all_prod_trace(episode, prod_types, selection):
+def get_all_prod_trace(episode, prod_types, selection, x_range=None, level_range=None):
+    pyramid, level = time_pyramid.get_level(
+        episode, "production_pyramid", x_range, level_range
+    )
+    if level is not None:
+        return get_prod_level_traces(pyramid, level, prod_types, selection, x_range)
     prod_with_type = observation_model.get_prod(episode).assign(
         prod_type=[
             prod_types.get(equipment_name)
@@ -196,13 +354,55 @@ def get_all_prod_trace(episode, prod_types, selection):
                 name
             )  # remove prod type from selection to avoid misunderstanding in get_def_trace_per_equipment()
 
-    return [
-        *trace,
-        *get_df_trace_per_equipment(observation_model.get_prod(episode, selection)),
-    ]
+    return clip_traces(
+        [
+            *trace,
+            *get_df_trace_per_equipment(
+                observation_model.get_prod(episode, selection)
+            ),
+        ],
+        x_range,
+    )
+
+
+def get_prod_level_traces(pyramid, level, prod_types, selection, x_range=None):
+    """Same traces as get_all_prod_trace, from a level of the production pyramid"""
+    totals = {"total", *prod_types.values()}
+    trace = []
+    if "total" in selection:
+        trace.append(
+            get_level_trace(level, pyramid.column_index["total"], x_range, name="total")
+        )
+    for name in prod_types.values():
+        if name in selection:
+            trace.append(
+                get_level_trace(
+                    level,
+                    pyramid.column_index[name],
+                    x_range,
+                    name=name,
+                    marker_color=dic_colors_prod_types.get(name),
+                )
+            )
+            selection.remove(name)
+    for name in pyramid.columns:
+        if name in selection and name not in totals:
+            trace.append(
+                get_level_trace(level, pyramid.column_index[name], x_range, name=name)
+            )
+    return trace
 
 
-def get_load_trace_per_equipment(episode, equipements):
+def get_load_trace_per_equipment(episode, equipements, x_range=None, level_range=None):
+    pyramid, level = time_pyramid.get_level(
+        episode, "load_pyramid", x_range, level_range
+    )
+    if level is not None:
+        return [
+            get_level_trace(level, i, x_range, name=name)
+            for i, name in enumerate(pyramid.columns)
+            if name in equipements
+        ]
     all_equipements = observation_model.get_load(episode)
     load_equipments = observation_model.get_load(episode, equipements)
 
@@ -319,54 +519,68 @@ def get_load_trace_per_equipment(episode, equipements):
                 )
             )
 
-    return get_df_trace_per_equipment(load_equipments)
+    return clip_traces(get_df_trace_per_equipment(load_equipments), x_range)
 
 
-def get_usage_rate_trace(episode):
-    df = observation_model.get_usage_rate(episode)
+def get_usage_rate_trace(episode, x_range=None, level_range=None):
+    pyramid, level = time_pyramid.get_level(
+        episode, "usage_rate_pyramid", x_range, level_range
+    )
+    if level is None:
+        timestamps, quantiles = observation_model.get_usage_rate_quantiles(episode)
+        index = time_pyramid.range_slice(timestamps, x_range)
+        timestamps = timestamps[index]
+        quantiles = {stat: values[index] for stat, values in quantiles.items()}
+    else:
+        quantiles = {}
+        for stat, aggregate in USAGE_RATE_AGGREGATES.items():
+            timestamps, values = level.values(
+                aggregate, pyramid.column_index[stat], x_range
+            )
+            quantiles[stat] = values.astype(float)
     line = {"shape": "spline", "width": 0, "smoothing": 1}
     trace = [
         go.Scatter(
-            x=df["timestamp"],
-            y=np.array(df["value"]["quantile10"].tolist()),
+            x=timestamps,
+            y=quantiles["quantile10"],
             name="quantile 10",
             line=line,
         ),
         go.Scatter(
-            x=df["timestamp"],
-            y=np.array(df["value"]["quantile25"].tolist()),
+            x=timestamps,
+            y=quantiles["quantile25"],
             name="quantile 25",
             fill="tonexty",
             fillcolor="rgba(159, 197, 232, 0.63)",
             line=line,
         ),
         go.Scatter(
-            x=df["timestamp"],
-            y=np.array(df["value"]["median"].tolist()),
+            x=timestamps,
+            y=quantiles["median"],
             name="median",
             fill="tonexty",
             fillcolor="rgba(31, 119, 180, 0.5)",
             line={"color": "rgb(31, 119, 180)", "shape": "spline", "smoothing": 1},
         ),
         go.Scatter(
-            x=df["timestamp"],
-            y=np.array(df["value"]["quantile75"].tolist()),
+            x=timestamps,
+            y=quantiles["quantile75"],
             name="quantile 75",
             fill="tonexty",
             fillcolor="rgba(31, 119, 180, 0.5)",
             line=line,
         ),
         go.Scatter(
-            x=df["timestamp"],
-            y=np.array(df["value"]["quantile90"].tolist()),
+            x=timestamps,
+            y=quantiles["quantile90"],
             name="quantile 90",
             fill="tonexty",
             fillcolor="rgba(159, 197, 232, 0.63)",
             line=line,
         ),
         go.Scatter(
-            x=df["timestamp"],
-            y=np.array(df["value"]["max"].tolist()),
+            x=timestamps,
+            y=quantiles["max"],
             name="Max",
             line={"shape": "spline", "smoothing": 1, "color": "rgba(255,0,0,0.5)"},
         ),
@@ -385,8 +599,28 @@ def get_df_trace_per_equipment(df):
     ]
 
 
-def get_df_rewards_trace(episode):
+def get_df_rewards_trace(episode, x_range=None, level_range=None):
+    pyramid, level = time_pyramid.get_level(
+        episode, "rewards_pyramid", x_range, level_range
+    )
+    if level is not None:
+        return [
+            get_level_trace(
+                level,
+                pyramid.column_index["rewards"],
+                x_range,
+                name=episode.agent + "_reward",
+            ),
+            get_level_trace(
+                level,
+                pyramid.column_index["cum_rewards"],
+                x_range,
+                name=episode.agent + "cum_rewards",
+                yaxis="y2",
+            ),
+        ]
     df = observation_model.get_df_computed_reward(episode)
+    df = df.iloc[time_pyramid.range_slice(df["timestep"], x_range)]
     return [
         go.Scatter(x=df["timestep"], y=df["rewards"], name=episode.agent + "_reward"),
         go.Scatter(
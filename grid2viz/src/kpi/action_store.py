@@ -0,0 +1,169 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Array-backed storage of the actions of an episode.
+
+Agents play the same few actions many times, so ActionStore keeps each
+distinct action vector once, in a (nb distinct actions, action size) array,
+with the id of the action played at each timestep. Distinct actions are found
+with a dict indexed by the bytes of their vectors, so that ids are assigned in
+constant time instead of comparing each action with all the previous ones.
+grid2op Action objects are only built when the store is indexed.
+"""
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from ..cache.spaces import space_registry
+from .episode_reader import ACTION_SPACE
+
+# number of Action objects kept once built
+MATERIALIZED_CACHE_SIZE = 16
+
+
+def action_key(vector):
+    """Bytes identifying an action vector, whatever its nan payloads or signed zeros"""
+    vector = np.asarray(vector, dtype=np.float32) + np.float32(0.0)
+    return np.where(np.isnan(vector), np.float32(np.nan), vector).tobytes()
+
+
+class ActionStore:
+    def __init__(self, vectors, ids, space_path=None, space=None):
+        """
+        :param vectors: (nb distinct actions, action size) array, the row of an
+        action being its id
+        :param ids: id of the action played at each timestep
+        :param space_path: json file of the action space, used to build the
+        actions when no space is given
+        """
+        self.vectors = vectors
+        self.ids = ids
+        self.space_path = space_path
+        self._space = space
+        self._index = None
+        self._materialized = OrderedDict()
+
+    @classmethod
+    def from_vectors(cls, vectors, space=None, length=None, space_path=None):
+        """
+        Build a store from the (nb actions, action size) array of the action
+        vectors, as saved by the grid2op runner.
+        """
+        if length is None:
+            length = len(vectors)
+        store = cls(
+            np.empty((0, vectors.shape[1]), dtype=np.float32),
+            np.empty(length, dtype=np.int32),
+            space_path=space_path,
+            space=space,
+        )
+        distinct = []
+        store._index = {}
+        for time_step in range(length):
+            vector = np.asarray(vectors[time_step], dtype=np.float32)
+            key = action_key(vector)
+            action_id = store._index.get(key)
+            if action_id is None:
+                action_id = store._index[key] = len(distinct)
+                distinct.append(vector)
+            store.ids[time_step] = action_id
+        if distinct:
+            store.vectors = np.array(distinct)
+        return store
+
+    @classmethod
+    def from_episode_data(cls, episode_data):
+        """Store of the actions of an EpisodeData or an EpisodeReader"""
+        actions = episode_data.actions
+        space_path = None
+        agent_path = getattr(episode_data, "agent_path", None)
+        if agent_path is not None and os.path.isfile(
+            os.path.join(agent_path, ACTION_SPACE)
+        ):
+            space_path = os.path.join(os.path.abspath(agent_path), ACTION_SPACE)
+        if hasattr(actions, "vectors"):
+            # EpisodeReader: the raw vectors are already there
+            vectors = actions.vectors
+        else:
+            vectors = np.array([act.to_vect() for act in actions])
+        return cls.from_vectors(
+            vectors,
+            getattr(episode_data, "action_space", None),
+            length=len(actions),
+            space_path=space_path,
+        )
+
+    @property
+    def space(self):
+        if self._space is None and self.space_path is not None:
+            self._space = space_registry.action_space(self.space_path)
+        return self._space
+
+    @space.setter
+    def space(self, space):
+        self._space = space
+        self._materialized.clear()
+
+    @property
+    def nb_distinct(self):
+        return len(self.vectors)
+
+    def action_id(self, time_step):
+        """Id of the action played at time_step, the same for equal actions"""
+        return int(self.ids[time_step])
+
+    def find(self, vector):
+        """Id of the action of the given vector, None if it was never played"""
+        if self._index is None:
+            self._index = {
+                action_key(vector): action_id
+                for action_id, vector in enumerate(self.vectors)
+            }
+        return self._index.get(action_key(vector))
+
+    def distinct_action(self, action_id):
+        """grid2op Action of the given id"""
+        if action_id in self._materialized:
+            self._materialized.move_to_end(action_id)
+            return self._materialized[action_id]
+        if self.space is None:
+            raise ValueError(
+                "The action space is needed to build the actions of the store"
+            )
+        act = self.space.from_vect(self.vectors[action_id], check_legit=False)
+        self._materialized[action_id] = act
+        if len(self._materialized) > MATERIALIZED_CACHE_SIZE:
+            self._materialized.popitem(last=False)
+        return act
+
+    def map(self, function):
+        """
+        function applied to the action of each timestep, computed only once per
+        distinct action, e.g. for the texts of the action tooltips
+        """
+        values = [function(self.distinct_action(i)) for i in range(self.nb_distinct)]
+        return [values[action_id] for action_id in self.ids]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[idx] for idx in range(*i.indices(len(self)))]
+        return self.distinct_action(self.action_id(i))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getstate__(self):
+        # spaces cannot be pickled, they are found again from space_path,
+        # and the index is rebuilt from the vectors when needed
+        state = dict(self.__dict__)
+        state["_space"] = None
+        state["_index"] = None
+        state["_materialized"] = OrderedDict()
+        return state
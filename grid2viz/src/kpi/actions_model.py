@@ -6,6 +6,7 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
+from grid2viz.src.kpi.ragged import RaggedArray
 from grid2viz.src.utils.graph_utils import layout_no_data, layout_def
 
 
@@ -15,14 +16,7 @@ def get_action_per_line(new_episode):
 
 
 def get_modified_lines(new_episode):
-    data = get_action_table_data(new_episode)
-    # Below to flatten the series of lists "lines_modified"
-    try:
-        s = data[(data["action_line"] > 0)]["lines_modified"].apply(pd.Series).stack()
-        count = s.value_counts()
-    except (IndexError, AttributeError):
-        count = pd.Series(dtype=np.float64)
-    return count
+    return count_modified_elements(new_episode, "lines_modified", "action_line")
 
 
 def get_action_redispatch(new_epsiode):
@@ -39,34 +33,13 @@ def get_action_storage(new_epsiode):
 
 
 def get_modified_gens(new_episode):
-    data = get_action_table_data(new_episode)
-    # Below to flatten the series of lists "lines_modified"
-    try:
-        s = data[(data["action_redisp"] > 0)]["gens_modified"].apply(pd.Series).stack()
-        count = s.value_counts()
-    except (IndexError, AttributeError):
-        count = pd.Series(dtype=np.float64)
-    return count
+    return count_modified_elements(new_episode, "gens_modified", "action_redisp")
 
 def get_modified_curtails(new_episode):
-    data = get_action_table_data(new_episode)
-    # Below to flatten the series of lists "lines_modified"
-    try:
-        s = data[(data["action_curtail"] > 0)]["rens_modified"].apply(pd.Series).stack()
-        count = s.value_counts()
-    except (IndexError, AttributeError):
-        count = pd.Series(dtype=np.float64)
-    return count
+    return count_modified_elements(new_episode, "rens_modified", "action_curtail")
 
 def get_modified_storages(new_episode):
-    data = get_action_table_data(new_episode)
-    # Below to flatten the series of lists "lines_modified"
-    try:
-        s = data[(data["action_storage"] > 0)]["storages_modified"].apply(pd.Series).stack()
-        count = s.value_counts()
-    except (IndexError, AttributeError):
-        count = pd.Series(dtype=np.float64)
-    return count
+    return count_modified_elements(new_episode, "storages_modified", "action_storage")
 
 
 def get_action_table_data(new_episode):
@@ -74,16 +47,49 @@ def get_action_table_data(new_episode):
 
 
 def get_action_per_sub(new_episode):
-    data = get_action_table_data(new_episode)
-    # Below to flatten the series of lists "subs_modified"
-    try:
-        s = data[(data["action_subs"] > 0)]["subs_modified"].apply(pd.Series).stack()
-        count = s.value_counts()
-    except (IndexError, AttributeError):
-        count = pd.Series(dtype=np.float64)
+    count = count_modified_elements(new_episode, "subs_modified", "action_subs")
     return [go.Bar(x=count.index, y=count.values, name=new_episode.agent)]
 
 
+def get_action_lists(new_episode, column):
+    """
+    RaggedArray of the elements of a list column of action_data_table,
+    e.g. lines_modified, for each timestep.
+    """
+    try:
+        return new_episode.action_lists[column]
+    except AttributeError:
+        # episodes cached with the lists in action_data_table
+        return RaggedArray.from_lists(
+            list(new_episode.action_data_table[column]), dtype=object, categorical=True
+        )
+
+
+def get_action_scalars(new_episode):
+    """action_data_table without its list columns"""
+    try:
+        return new_episode.action_table
+    except AttributeError:
+        return new_episode.action_data_table
+
+
+def count_modified_elements(new_episode, column, count_column=None):
+    """
+    Number of timesteps each element of the list column was modified at,
+    only counting the timesteps with a positive count_column if given.
+    """
+    rows = None
+    if count_column is not None:
+        rows = (get_action_scalars(new_episode)[count_column] > 0).values
+    return get_action_lists(new_episode, column).value_counts(rows)
+
+
+def timesteps_modifying(new_episode, column, element):
+    """Timesteps at which the actions modified element, according to the list column"""
+    rows = get_action_lists(new_episode, column).rows_with(element)
+    return np.asarray(get_action_scalars(new_episode)["timestep"])[rows]
+
+
 def update_layout(predicate, msg):
     if predicate:
         figure_layout = layout_no_data(msg)
@@ -5,25 +5,24 @@
 import pandas as pd
 import plotly.graph_objects as go
 
-from .observation_model import quantile10, quantile25, quantile75, quantile90
+from .observation_model import (
+    get_equipment_matrix,
+    quantile10,
+    quantile25,
+    quantile75,
+    quantile90,
+)
 
 
 def consumption_profiles(episode, freq="30T"):
+    load_matrix = get_equipment_matrix(episode, "load")
 
     # filter intercos
-    idx_no_interco = [
-        i
-        for i in range(len(episode.load.equipment_name))
-        if "interco" not in episode.load.equipment_name[i]
-    ]
+    no_interco = ~load_matrix.columns.str.contains("interco")
 
     load = (
-        pd.pivot_table(
-            episode.load.loc[idx_no_interco],
-            index="timestamp",
-            columns=["equipment_name"],
-            values="value",
-        )
+        load_matrix.loc[:, no_interco]
+        .sort_index()
         .astype('float64').sum(axis=1)
         .resample(freq)
         .mean()
@@ -2,8 +2,20 @@
 # See AUTHORS.txt
 # SPDX-License-Identifier: MPL-2.0
 
+import threading
+import weakref
+
+import numpy as np
 import pandas as pd
 
+# attributes of the episodes storing the events of each kind as LineEvents
+EVENTS_ATTRIBUTES = {"hazards": "hazard_events", "maintenances": "maintenance_events"}
+
+# results already computed for each episode, by (which, kind, aggr), with a
+# weak reference to the events or dataframe they were computed from
+_results = weakref.WeakKeyDictionary()
+_results_lock = threading.Lock()
+
 
 def env_actions(episode, which="hazards", kind="ts", aggr=True):
     if kind not in ("ts", "nb", "dur"):
@@ -15,24 +27,82 @@ def env_actions(episode, which="hazards", kind="ts", aggr=True):
             "which argument can only be either hazards or "
             f"maintenances. {which} passed"
         )
-    env_acts = getattr(episode, which)
-    #env_acts = env_acts.fillna(0)
-    env_acts = pd.pivot_table(
-        env_acts, index="timestamp", columns=["line_name"], values="value"
-    )
+    key = (which, kind, aggr)
+    try:
+        with _results_lock:
+            episode_results = _results.setdefault(episode, {})
+    except TypeError:
+        # episodes which cannot be weakly referenced are not memoized
+        episode_results = {}
+    # computed again once the events are replaced, e.g. by
+    # optimize_memory_footprint or when they are read again from the cache
+    source = _env_actions_source(episode, which)
+    memoized = episode_results.get(key)
+    if memoized is None or memoized[0]() is not source:
+        memoized = episode_results[key] = (
+            weakref.ref(source),
+            _compute_env_actions(episode, which, kind, aggr),
+        )
+    result = memoized[1]
+    # callers get their own copy of the memoized dataframes
+    return result.copy() if isinstance(result, (pd.DataFrame, pd.Series)) else result
 
-    if kind == "dur":
-        env_acts = env_acts.sum()
+
+def _env_actions_source(episode, which):
+    """LineEvents of the episode, or the dataframe of the older cache entries"""
+    events = getattr(episode, EVENTS_ATTRIBUTES[which], None)
+    return events if events is not None else getattr(episode, which)
+
+
+def _compute_env_actions(episode, which, kind, aggr):
+    events = getattr(episode, EVENTS_ATTRIBUTES[which], None)
     if kind == "nb":
-        equipments = env_acts.columns
-        for col in env_acts.columns:
-            env_acts["temp"] = env_acts[col].shift(1).fillna(0)
-            env_acts[col] = env_acts[[col, "temp"]].apply(
-                lambda row: 1 if row[0] == 1 and row[1] == 0 else 0, axis=1
-            )
-        env_acts = env_acts[equipments].sum()
+        if events is not None:
+            # each event is one start of a hazard or maintenance
+            env_acts = pd.Series(
+                events.start_counts(), index=pd.Index(events.line_names, name="line_name")
+            ).sort_index()
+        else:
+            env_acts = count_starts(env_actions_by_line(episode, which))
         if aggr:
             env_acts = env_acts.sum()
-    if kind == "ts" and aggr:
+        return env_acts
+
+    if kind == "dur":
+        if events is not None:
+            return pd.Series(
+                events.durations(), index=pd.Index(events.line_names, name="line_name")
+            ).sort_index()
+        return env_actions_by_line(episode, which).sum()
+
+    env_acts = env_actions_by_line(episode, which)
+    if aggr:
         env_acts = env_acts.sum(axis=1).to_frame(name=which)
     return env_acts
+
+
+def count_starts(env_acts):
+    """
+    Number of 0 to 1 transitions of each column of a dataframe of events
+    with a row per timestamp, an event at the first timestamp being a start.
+    """
+    values = env_acts.values
+    previous = np.vstack([np.zeros((1, values.shape[1])), values[:-1]])
+    starts = (values == 1) & (previous == 0)
+    return pd.Series(starts.sum(axis=0), index=env_acts.columns)
+
+
+def env_actions_by_line(episode, which="hazards"):
+    """
+    Dataframe of the hazards or maintenances with a row per timestamp and a
+    column per line.
+    """
+    events = getattr(episode, EVENTS_ATTRIBUTES[which], None)
+    if events is not None:
+        return events.wide(episode.timestamps)
+    # episodes cached with the long format dataframes only
+    env_acts = getattr(episode, which)
+    #env_acts = env_acts.fillna(0)
+    return pd.pivot_table(
+        env_acts, index="timestamp", columns=["line_name"], values="value"
+    )
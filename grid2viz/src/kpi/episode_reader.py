@@ -0,0 +1,261 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Direct access to the arrays of an episode stored by the grid2op runner.
+
+EpisodeData.from_disk builds one grid2op Observation and Action object per
+timestep before anything can be computed. EpisodeReader instead opens the npz
+files as raw arrays (memory-mapped when they are stored uncompressed) and uses
+the agent's observation and action spaces to slice named attributes out of the
+flat vectors. It exposes the same attributes as EpisodeData so it can be given
+to EpisodeAnalytics, grid2op objects being only built when they are accessed.
+"""
+
+import json
+import os
+import struct
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+from grid2op.Action import ActionSpace
+from grid2op.Observation import ObservationSpace
+
+from ..cache.spaces import space_registry
+
+OBSERVATIONS_FILE = "observations.npz"
+ACTIONS_FILE = "actions.npz"
+ENV_MODIFICATIONS_FILE = "env_modifications.npz"
+REWARDS_FILE = "rewards.npz"
+ATTACKS_FILE = "opponent_attack.npz"
+META_FILE = "episode_meta.json"
+OTHER_REWARDS_FILE = "other_rewards.json"
+
+OBS_SPACE = "dict_observation_space.json"
+ACTION_SPACE = "dict_action_space.json"
+ENV_MODIFICATION_SPACE = "dict_env_modification_space.json"
+ATTACK_SPACE = "dict_attack_space.json"
+
+# observation properties which are stored under another name in the vectors
+ATTRIBUTE_ALIASES = {"prod_p": "gen_p", "prod_q": "gen_q", "prod_v": "gen_v"}
+
+# size of the fixed part of a zip local file header
+ZIP_LOCAL_HEADER_SIZE = 30
+
+# number of grid2op objects an ObjectCollection keeps once built
+MATERIALIZED_CACHE_SIZE = 16
+
+
+def load_npz_array(path, key="data", mmap_mode="r"):
+    """
+    Load an array from a npz archive.
+
+    The array is memory-mapped when the archive member is stored without
+    compression (np.savez) and mmap_mode is not None. Members written with
+    np.savez_compressed, as the grid2op runner does, are read in memory.
+    """
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(key + ".npy")
+        with archive.open(info) as f:
+            if mmap_mode is None or info.compress_type != zipfile.ZIP_STORED:
+                return np.lib.format.read_array(f, allow_pickle=False)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(f)
+            else:
+                header = np.lib.format.read_array_header_2_0(f)
+            shape, fortran_order, dtype = header
+            npy_header_size = f.tell()
+
+    if not np.prod(shape):
+        return np.empty(shape, dtype=dtype)
+
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        local_header = f.read(ZIP_LOCAL_HEADER_SIZE)
+    name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+    offset = (
+        info.header_offset
+        + ZIP_LOCAL_HEADER_SIZE
+        + name_length
+        + extra_length
+        + npy_header_size
+    )
+    return np.memmap(
+        path,
+        dtype=dtype,
+        mode=mmap_mode,
+        shape=shape,
+        offset=offset,
+        order="F" if fortran_order else "C",
+    )
+
+
+def attribute_slices(space):
+    """
+    Position of each attribute of the space's objects in their flat vector.
+
+    :param space: a grid2op ObservationSpace or ActionSpace
+    :return: dict attribute name -> slice
+    """
+    slices = {}
+    begin = 0
+    for attribute, size in zip(space.subtype.attr_list_vect, space.shape):
+        slices[attribute] = slice(begin, begin + int(size))
+        begin += int(size)
+    return slices
+
+
+class ObjectCollection:
+    """
+    Sequence of grid2op objects built from the rows of an array when accessed,
+    only the last MATERIALIZED_CACHE_SIZE ones being kept.
+    """
+
+    def __init__(self, vectors, space, length, check_legit=False):
+        self.vectors = vectors
+        self.space = space
+        self.length = length
+        self.check_legit = check_legit
+        self._materialized = OrderedDict()
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[idx] for idx in range(*i.indices(self.length))]
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError(
+                f"Trying to reach element {i} but there are only {self.length}"
+            )
+        if i in self._materialized:
+            self._materialized.move_to_end(i)
+            return self._materialized[i]
+        obj = self.space.from_vect(
+            np.asarray(self.vectors[i], dtype=np.float32),
+            check_legit=self.check_legit,
+        )
+        self._materialized[i] = obj
+        if len(self._materialized) > MATERIALIZED_CACHE_SIZE:
+            self._materialized.popitem(last=False)
+        return obj
+
+    def __iter__(self):
+        return (self[i] for i in range(self.length))
+
+
+class EpisodeReader:
+    """
+    Raw arrays of one episode of an agent.
+
+    Attributes mirror the ones of grid2op's EpisodeData that grid2viz uses,
+    observations, actions, env_actions and attacks being ObjectCollection.
+    Named attributes can be sliced directly out of the arrays with
+    observation_matrix, action_matrix and env_modification_matrix.
+    """
+
+    def __init__(self, agent_path, episode_name, mmap_mode="r"):
+        self.agent_path = os.path.abspath(agent_path)
+        self.name = episode_name
+        self.episode_path = os.path.join(self.agent_path, episode_name)
+        self.mmap_mode = mmap_mode
+
+        with open(os.path.join(self.episode_path, META_FILE)) as f:
+            self.meta = json.load(fp=f)
+        other_rewards_path = os.path.join(self.episode_path, OTHER_REWARDS_FILE)
+        self.other_rewards = []
+        if os.path.exists(other_rewards_path):
+            with open(other_rewards_path) as f:
+                self.other_rewards = json.load(fp=f)
+
+        # names are read from the json directly to avoid building the spaces
+        with open(os.path.join(self.agent_path, OBS_SPACE)) as f:
+            dict_observation_space = json.load(fp=f)
+        self.load_names = np.array(dict_observation_space["name_load"])
+        self.n_loads = len(self.load_names)
+        self.prod_names = np.array(dict_observation_space["name_gen"])
+        self.n_prods = len(self.prod_names)
+        self.line_names = np.array(dict_observation_space["name_line"])
+        self.n_lines = len(self.line_names)
+        self.name_sub = np.array(dict_observation_space["name_sub"])
+
+        self._arrays = {}
+        self._spaces = {}
+        self._slices = {}
+
+        n_actions = self._array(ACTIONS_FILE).shape[0]
+        n_played = int(self.meta.get("nb_timestep_played", n_actions))
+        self.nb_timestep_played = min(n_played, n_actions)
+
+        self.rewards = self._array(REWARDS_FILE)
+        self.observations = ObjectCollection(
+            self._array(OBSERVATIONS_FILE),
+            self._space(OBS_SPACE),
+            min(self.nb_timestep_played + 1, self._array(OBSERVATIONS_FILE).shape[0]),
+        )
+        self.actions = ObjectCollection(
+            self._array(ACTIONS_FILE), self._space(ACTION_SPACE), self.nb_timestep_played
+        )
+        self.env_actions = ObjectCollection(
+            self._array(ENV_MODIFICATIONS_FILE),
+            self._space(ENV_MODIFICATION_SPACE),
+            self.nb_timestep_played,
+        )
+        self.attacks = ObjectCollection(
+            self._array(ATTACKS_FILE), self._space(ATTACK_SPACE), self.nb_timestep_played
+        )
+        self.observation_space = self._space(OBS_SPACE)
+        self.action_space = self._space(ACTION_SPACE)
+
+    def _array(self, file_name):
+        if file_name not in self._arrays:
+            self._arrays[file_name] = load_npz_array(
+                os.path.join(self.episode_path, file_name), mmap_mode=self.mmap_mode
+            )
+        return self._arrays[file_name]
+
+    def _space(self, file_name):
+        if file_name not in self._spaces:
+            space_class = ObservationSpace if file_name == OBS_SPACE else ActionSpace
+            self._spaces[file_name] = space_registry.get(
+                space_class, os.path.join(self.agent_path, file_name)
+            )
+        return self._spaces[file_name]
+
+    def _matrix(self, file_name, space_file_name, attribute, length):
+        if space_file_name not in self._slices:
+            self._slices[space_file_name] = attribute_slices(
+                self._space(space_file_name)
+            )
+        slices = self._slices[space_file_name]
+        if attribute not in slices:
+            attribute = ATTRIBUTE_ALIASES.get(attribute, attribute)
+        if attribute not in slices:
+            raise KeyError(f"{attribute} is not stored in {file_name}")
+        return self._array(file_name)[:length, slices[attribute]]
+
+    def observation_matrix(self, attribute):
+        """(nb observations, attribute size) array of an observation attribute"""
+        return self._matrix(
+            OBSERVATIONS_FILE, OBS_SPACE, attribute, len(self.observations)
+        )
+
+    def action_matrix(self, attribute):
+        """(nb timesteps played, attribute size) array of an action attribute"""
+        return self._matrix(
+            ACTIONS_FILE, ACTION_SPACE, attribute, self.nb_timestep_played
+        )
+
+    def env_modification_matrix(self, attribute):
+        """(nb timesteps played, attribute size) array of an environment modification attribute"""
+        return self._matrix(
+            ENV_MODIFICATIONS_FILE,
+            ENV_MODIFICATION_SPACE,
+            attribute,
+            self.nb_timestep_played,
+        )
@@ -0,0 +1,127 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Sparse storage of the hazards and maintenances of the lines of an episode.
+
+Lines are rarely in maintenance or hit by a hazard, so instead of a value per
+line and per timestep LineEvents keeps the intervals (line, start, end) during
+which a line is affected. The dense (timestep, line) views used by the KPIs
+and the graphs are built from them on demand.
+"""
+
+import numpy as np
+import pandas as pd
+
+# dtypes of the columns of the long format dataframe
+LONG_FORMAT_DTYPES = {
+    "value": "bool",
+    "timestep": "category",
+    "timestamp": "category",
+    "line_name": "category",
+    "line_id": "category",
+}
+
+
+class LineEvents:
+    def __init__(self, line_ids, starts, ends, line_names, length):
+        """
+        :param line_ids: line of each event
+        :param starts: first timestep of each event
+        :param ends: timestep following the last one of each event
+        :param length: number of timesteps of the episode
+        """
+        self.line_ids = np.asarray(line_ids, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.ends = np.asarray(ends, dtype=np.int32)
+        self.line_names = np.asarray(line_names)
+        self.length = length
+
+    @classmethod
+    def from_mask(cls, mask, line_names):
+        """
+        Events of a (nb timesteps, nb lines) array, non-zero where a line is affected
+        """
+        mask = np.asarray(mask) > 0
+        length, n_lines = mask.shape
+        # +1 where an event starts and -1 at the timestep following its end
+        padded = np.zeros((length + 2, n_lines), dtype=np.int8)
+        padded[1:-1] = mask
+        edges = np.diff(padded, axis=0)
+        start_steps, start_lines = np.nonzero(edges == 1)
+        end_steps, end_lines = np.nonzero(edges == -1)
+        # the starts and ends of a line alternate: sort both by line then time
+        start_order = np.lexsort((start_steps, start_lines))
+        end_order = np.lexsort((end_steps, end_lines))
+        return cls(
+            start_lines[start_order],
+            start_steps[start_order],
+            end_steps[end_order],
+            line_names,
+            length,
+        )
+
+    @property
+    def n_lines(self):
+        return len(self.line_names)
+
+    def __len__(self):
+        return len(self.line_ids)
+
+    def start_counts(self):
+        """Number of events of each line"""
+        return np.bincount(self.line_ids, minlength=self.n_lines)
+
+    def durations(self):
+        """Number of timesteps each line is affected"""
+        return np.bincount(
+            self.line_ids, weights=self.ends - self.starts, minlength=self.n_lines
+        ).astype(int)
+
+    def intervals(self):
+        """Dataframe of the events, one row per (line, start, end) interval"""
+        return pd.DataFrame(
+            {
+                "line_id": self.line_ids,
+                "line_name": self.line_names[self.line_ids],
+                "start": self.starts,
+                "end": self.ends,
+            }
+        )
+
+    def mask(self):
+        """(nb timesteps, nb lines) boolean array, True where a line is affected"""
+        # +1 at the start of an event and -1 after its end, summed over time
+        edges = np.zeros((self.length + 1, self.n_lines), dtype=np.int32)
+        np.add.at(edges, (self.starts, self.line_ids), 1)
+        np.add.at(edges, (self.ends, self.line_ids), -1)
+        return np.cumsum(edges[:-1], axis=0) > 0
+
+    def wide(self, timestamps):
+        """
+        Dataframe of the events with a row per timestamp and a column per
+        line, as pivoted from the long format with the lines sorted by name.
+        """
+        frame = pd.DataFrame(
+            self.mask().astype(int),
+            index=pd.DatetimeIndex(timestamps, name="timestamp"),
+            columns=pd.Index(self.line_names, name="line_name"),
+        )
+        return frame.sort_index(axis=1)
+
+    def dense(self, timestamps):
+        """
+        Long format dataframe of the events with a row per timestep and line,
+        with the value, timestep, timestamp, line_name and line_id columns.
+        """
+        frame = pd.DataFrame(
+            {
+                "value": self.mask().ravel(),
+                "timestep": np.repeat(np.arange(self.length), self.n_lines),
+                "timestamp": np.repeat(timestamps, self.n_lines),
+                "line_name": np.tile(self.line_names, self.length),
+                "line_id": np.tile(np.arange(self.n_lines), self.length),
+            }
+        )
+        return frame.astype(LONG_FORMAT_DTYPES)
@@ -0,0 +1,122 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Flows and voltages at both sides of the lines of an episode.
+
+LineFlows keeps them in a single (nb timesteps, side, quantity, nb lines)
+array with the index of each side, quantity and line name, so that the values
+of one line are a view of the array instead of a lookup in a dataframe with
+three levels of columns. That dataframe is still built by to_frame for the
+callers using it. The array can also be a QuantizedArray, see quantization.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .quantization import dequantize, quantize
+
+SIDES = ("or", "ex")
+QUANTITIES = ("active", "reactive", "current", "voltage")
+
+# observation attribute of each (side, quantity)
+OBS_ATTRIBUTES = {
+    (side, quantity): f"{prefix}_{side}"
+    for side in SIDES
+    for quantity, prefix in zip(QUANTITIES, ("p", "q", "a", "v"))
+}
+
+
+class LineFlows:
+    def __init__(self, values, line_names):
+        """
+        :param values: (nb timesteps, len(SIDES), len(QUANTITIES), nb lines)
+        array or QuantizedArray
+        """
+        self.values = values
+        self.line_names = np.asarray(line_names)
+        self.side_index = {side: i for i, side in enumerate(SIDES)}
+        self.quantity_index = {quantity: i for i, quantity in enumerate(QUANTITIES)}
+        self.line_index = {name: i for i, name in enumerate(self.line_names)}
+
+    @classmethod
+    def from_stacked(cls, stacked, line_names, dtype=np.float32):
+        """
+        :param stacked: dict observation attribute -> (nb timesteps, nb lines) array
+        """
+        first = stacked[OBS_ATTRIBUTES[SIDES[0], QUANTITIES[0]]]
+        values = np.empty(
+            (len(first), len(SIDES), len(QUANTITIES), first.shape[1]), dtype=dtype
+        )
+        for (side, quantity), attribute in OBS_ATTRIBUTES.items():
+            values[:, SIDES.index(side), QUANTITIES.index(quantity)] = stacked[attribute]
+        return cls(values, line_names)
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Flows of a dataframe with (side, quantity, line name) columns"""
+        line_names = list(frame["or"]["active"].columns)
+        values = np.stack(
+            [
+                np.stack(
+                    [
+                        frame[side][quantity][line_names].to_numpy()
+                        for quantity in QUANTITIES
+                    ],
+                    axis=1,
+                )
+                for side in SIDES
+            ],
+            axis=1,
+        )
+        return cls(values, line_names)
+
+    def __len__(self):
+        return len(self.values)
+
+    def series(self, side, quantity, line_name):
+        """
+        Values of a line over the episode, as a view of the array unless it
+        is quantized
+        """
+        return self.values[
+            :,
+            self.side_index[side],
+            self.quantity_index[quantity],
+            self.line_index[line_name],
+        ]
+
+    def to_numpy(self):
+        """Array of the values, decoded if they are quantized"""
+        return dequantize(self.values)
+
+    def stored_as(self, storage):
+        """LineFlows with the values stored as a quantization.Storage"""
+        values = quantize(self.values, storage)
+        if values is self.values:
+            return self
+        return LineFlows(values, self.line_names)
+
+    def to_frame(self):
+        """Dataframe with a (side, quantity, line name) column per line"""
+        columns = pd.MultiIndex.from_product([SIDES, QUANTITIES, self.line_names])
+        return pd.DataFrame(self.to_numpy().reshape(len(self), -1), columns=columns)
+
+    def __getstate__(self):
+        # the name to index maps are rebuilt when unpickled
+        return {"values": self.values, "line_names": self.line_names}
+
+    def __setstate__(self, state):
+        self.__init__(state["values"], state["line_names"])
+
+
+def line_flows(episode):
+    """
+    LineFlows of an episode, built from the flow_and_voltage_line dataframe of
+    the episodes cached before they were kept.
+    """
+    try:
+        return episode.line_flows
+    except AttributeError:
+        return LineFlows.from_frame(episode.flow_and_voltage_line)
@@ -3,6 +3,7 @@
 # SPDX-License-Identifier: MPL-2.0
 
 from .env_actions import env_actions
+from .observation_store import observation_matrix
 
 
 def total_duration_maintenance(episode):
@@ -16,4 +17,8 @@ def total_duration_maintenance(episode):
 def hist_duration_maintenances(episode):
     # Suppose that there is at most one maintenance per line per episode
 
-    return [t for t in episode.observations[0].duration_next_maintenance if t]
+    return [
+        t
+        for t in observation_matrix(episode.observations, "duration_next_maintenance")[0]
+        if t
+    ]
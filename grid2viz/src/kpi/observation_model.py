@@ -2,30 +2,112 @@
 # See AUTHORS.txt
 # SPDX-License-Identifier: MPL-2.0
 
+import numpy as np
 import pandas as pd
 
 from .env_actions import env_actions
+from .observation_store import observation_matrix
+from .quantization import dequantize
+
+
+# columns of the long format dataframes of the equipments, in their order, and
+# the columns of the timesteps, of the equipment ids and of the equipment names
+LONG_FORMAT_COLUMNS = {
+    "load": ["timestamp", "value", "timestep", "equipment_name", "equipement_id"],
+    "production": [
+        "value",
+        "timestep",
+        "timestamp",
+        "equipment_name",
+        "equipement_id",
+    ],
+    "rho": ["value", "time", "timestamp", "equipment"],
+}
+LONG_FORMAT_KEYS = {
+    "load": ("timestep", "equipement_id", "equipment_name"),
+    "production": ("timestep", "equipement_id", "equipment_name"),
+    "rho": ("time", "equipment", None),
+}
+
+
+def long_format(matrix, kind):
+    """
+    Long format dataframe of the load, production or rho of an episode, with a
+    row per timestep and equipment, from its (nb timesteps, nb equipments)
+    dataframe. Its columns other than value are categorical.
+    """
+    matrix = dequantize(matrix)
+    n_steps, n_equipments = matrix.shape
+    time_column, id_column, name_column = LONG_FORMAT_KEYS[kind]
+    columns = {
+        "value": matrix.to_numpy().ravel(),
+        time_column: np.repeat(np.arange(n_steps), n_equipments),
+        "timestamp": np.repeat(matrix.index.values, n_equipments),
+        id_column: np.tile(np.arange(n_equipments), n_steps),
+    }
+    if name_column is not None:
+        columns[name_column] = np.tile(matrix.columns.values.astype(str), n_steps)
+    frame = pd.DataFrame(columns)[LONG_FORMAT_COLUMNS[kind]]
+    return frame.astype(
+        {column: "category" for column in frame.columns if column != "value"}
+    )
 
 
-def get_prod_and_conso(episode):
-    episode_data = episode
-    productions = pd.pivot_table(
-        episode_data.production,
-        index="timestamp",
-        values="value",
-        columns=["equipment_name"],
+def wide_format(frame, kind):
+    """
+    (nb timesteps, nb equipments) dataframe of a long format dataframe of the
+    load, production or rho, with a row per timestamp and a column per equipment
+    in the order of their ids.
+    """
+    time_column, id_column, name_column = LONG_FORMAT_KEYS[kind]
+    times = frame[time_column].to_numpy().astype(np.int64)
+    ids = frame[id_column].to_numpy().astype(np.int64)
+    values = frame["value"].to_numpy()
+    if values.dtype.kind != "f":
+        values = values.astype(float)
+    time_values, rows = np.unique(times, return_inverse=True)
+    n_equipments = ids.max(initial=-1) + 1
+    matrix = np.full((len(time_values), n_equipments), np.nan, dtype=values.dtype)
+    matrix[rows, ids] = values
+    timestamps = np.empty(len(time_values), dtype="datetime64[ns]")
+    timestamps[rows] = pd.to_datetime(frame["timestamp"].to_numpy())
+    if name_column is None:
+        names, columns_name = np.arange(n_equipments), id_column
+    else:
+        names = np.empty(n_equipments, dtype=object)
+        names[ids] = frame[name_column].to_numpy().astype(str)
+        columns_name = name_column
+    return pd.DataFrame(
+        matrix,
+        index=pd.DatetimeIndex(timestamps, name="timestamp"),
+        columns=pd.Index(names, name=columns_name),
     )
 
-    loads = pd.pivot_table(
-        episode_data.load, index="timestamp", values="value", columns=["equipment_name"]
-    )
 
-    prods_and_loads = productions.merge(loads, left_index=True, right_index=True)
-    return prods_and_loads
+def get_equipment_matrix(episode, kind):
+    """
+    (nb timesteps, nb equipments) dataframe of the "load", "production" or
+    "rho" of an episode, decoded if it is quantized, or pivoted from the long
+    format for the episodes cached before the matrices were kept.
+    """
+    try:
+        return dequantize(getattr(episode, kind + "_matrix"))
+    except AttributeError:
+        return wide_format(getattr(episode, kind), kind)
+
+
+def get_prod_and_conso(episode):
+    return pd.concat(
+        [
+            get_equipment_matrix(episode, "production"),
+            get_equipment_matrix(episode, "load"),
+        ],
+        axis=1,
+    )
 
 
 def get_episode_active_consumption_ts(episode):
-    return [sum(obs.load_p) for obs in episode.observations]
+    return list(observation_matrix(episode.observations, "load_p").sum(axis=1))
 
 
 def get_prod(episode, equipments=None):
@@ -52,6 +134,16 @@ def get_df_computed_reward(episode):
     return episode.computed_reward
 
 
+def init_table_inspection_data(episode):
+    ts_hazards = env_actions(episode, which="hazards", kind="ts", aggr=True)
+    ts_maintenances = env_actions(episode, which="maintenances", kind="ts", aggr=True)
+    table = ts_hazards.merge(ts_maintenances, left_index=True, right_index=True)
+    table = table.reset_index()
+    if not table.empty:
+        table["IsWorkingDay"] = table["timestamp"].dt.weekday < 5
+    return table
+
+
 # quantiles utilities
 def quantile10(df):
     return df.quantile(0.1)
@@ -69,22 +161,51 @@ def quantile90(df):
     return df.quantile(0.90)
 
 
-def get_usage_rate(episode):
-    rho = get_rho(episode)
-    return (
-        rho.groupby("timestamp")
-        .aggregate(["median", quantile10, quantile25, quantile75, quantile90, "max"])[
-            ["value"]
-        ]
-        .reset_index()
-    )
+# statistics of the usage rates of the lines at each timestep, and the
+# quantile they are computed as
+USAGE_RATE_QUANTILES = {
+    "quantile10": 0.1,
+    "quantile25": 0.25,
+    "median": 0.5,
+    "quantile75": 0.75,
+    "quantile90": 0.9,
+    "max": 1.0,
+}
+
+
+def usage_rate_quantiles(rho_matrix):
+    """
+    Statistics of USAGE_RATE_QUANTILES over the lines at each timestep of a
+    (nb timesteps, nb lines) array, all computed with a single np.quantile.
+    Missing values are ignored, as pandas does.
+    """
+    rho_matrix = np.asarray(rho_matrix, dtype=np.float64)
+    probabilities = list(USAGE_RATE_QUANTILES.values())
+    if len(rho_matrix) == 0 or rho_matrix.shape[1] == 0:
+        values = np.full((len(probabilities), len(rho_matrix)), np.nan)
+    elif np.isnan(rho_matrix).any():
+        values = np.nanquantile(rho_matrix, probabilities, axis=1)
+    else:
+        values = np.quantile(rho_matrix, probabilities, axis=1)
+    return dict(zip(USAGE_RATE_QUANTILES, values))
 
 
-def init_table_inspection_data(episode):
-    ts_hazards = env_actions(episode, which="hazards", kind="ts", aggr=True)
-    ts_maintenances = env_actions(episode, which="maintenances", kind="ts", aggr=True)
-    table = ts_hazards.merge(ts_maintenances, left_index=True, right_index=True)
-    table = table.reset_index()
-    if not table.empty:
-        table["IsWorkingDay"] = table["timestamp"].dt.weekday < 5
-    return table
+def get_usage_rate_quantiles(episode):
+    """Timestamps and dict statistic -> values of the usage rates of the lines"""
+    matrix = get_equipment_matrix(episode, "rho")
+    return matrix.index, usage_rate_quantiles(matrix.to_numpy())
+
+
+def get_usage_rate(episode):
+    """
+    Dataframe of the usage rate statistics, with a timestamp column and a
+    ("value", statistic) column per statistic, as aggregated by timestamp.
+    """
+    timestamps, quantiles = get_usage_rate_quantiles(episode)
+    stats = ["median", "quantile10", "quantile25", "quantile75", "quantile90", "max"]
+    df = pd.DataFrame(
+        {("value", stat): quantiles[stat] for stat in stats},
+        index=pd.Index(timestamps, name="timestamp"),
+    )
+    df.columns = pd.MultiIndex.from_tuples(df.columns)
+    return df.reset_index()
@@ -0,0 +1,159 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Array-backed storage of the observations of an episode.
+
+Instead of one grid2op Observation per timestep, ObservationStore keeps each
+attribute of the observations as one (nb observations, attribute size) array,
+float32 attributes being downcast to float16 as optimize_memory_footprint does
+for Observation objects. An Observation is only built when the store is
+indexed, e.g. to plot the grid at a timestep, while the KPIs read the arrays.
+"""
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from ..cache.spaces import space_registry
+from .episode_reader import ATTRIBUTE_ALIASES, OBS_SPACE, attribute_slices
+
+# number of Observation objects kept once built
+MATERIALIZED_CACHE_SIZE = 16
+
+
+class ObservationStore:
+    def __init__(self, arrays, attr_list, length, space_path=None, space=None):
+        """
+        :param arrays: dict attribute name -> (length, attribute size) array
+        :param attr_list: attributes in the order of the observation vectors
+        :param space_path: json file of the observation space, used to build
+        the observations when no space is given
+        """
+        self.arrays = arrays
+        self.attr_list = list(attr_list)
+        self.length = length
+        self.space_path = space_path
+        self._space = space
+        self._materialized = OrderedDict()
+
+    @classmethod
+    def from_vectors(cls, vectors, space, length=None, space_path=None):
+        """
+        Build a store from the (nb observations, observation size) array of
+        the observation vectors, as saved by the grid2op runner.
+        """
+        if length is None:
+            length = len(vectors)
+        template = space.from_vect(
+            np.asarray(vectors[0], dtype=np.float32), check_legit=False
+        )
+        arrays = {}
+        for attribute, attribute_slice in attribute_slices(space).items():
+            dtype = np.asarray(getattr(template, attribute)).dtype
+            if dtype == np.float32:
+                dtype = np.float16
+            arrays[attribute] = np.asarray(vectors[:length, attribute_slice]).astype(
+                dtype
+            )
+        return cls(
+            arrays,
+            space.subtype.attr_list_vect,
+            length,
+            space_path=space_path,
+            space=space,
+        )
+
+    @classmethod
+    def from_episode_data(cls, episode_data):
+        """Store of the observations of an EpisodeData or an EpisodeReader"""
+        observations = episode_data.observations
+        space_path = None
+        agent_path = getattr(episode_data, "agent_path", None)
+        if agent_path is not None and os.path.isfile(os.path.join(agent_path, OBS_SPACE)):
+            space_path = os.path.join(os.path.abspath(agent_path), OBS_SPACE)
+        if hasattr(observations, "vectors"):
+            # EpisodeReader: the raw vectors are already there
+            vectors = observations.vectors
+        else:
+            vectors = np.array([obs.to_vect() for obs in observations])
+        return cls.from_vectors(
+            vectors,
+            episode_data.observation_space,
+            length=len(observations),
+            space_path=space_path,
+        )
+
+    @property
+    def space(self):
+        if self._space is None and self.space_path is not None:
+            self._space = space_registry.observation_space(self.space_path)
+        return self._space
+
+    @space.setter
+    def space(self, space):
+        self._space = space
+        self._materialized.clear()
+
+    def matrix(self, attribute):
+        """(nb observations, attribute size) array of an attribute of the observations"""
+        if attribute not in self.arrays:
+            attribute = ATTRIBUTE_ALIASES.get(attribute, attribute)
+        return self.arrays[attribute]
+
+    def vector(self, i):
+        """Observation vector at index i"""
+        return np.concatenate(
+            [
+                np.asarray(self.arrays[attribute][i], dtype=np.float32).ravel()
+                for attribute in self.attr_list
+            ]
+        )
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[idx] for idx in range(*i.indices(self.length))]
+        i = int(i)
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError(
+                f"Trying to reach observation {i} but there are only {self.length}"
+            )
+        if i in self._materialized:
+            self._materialized.move_to_end(i)
+            return self._materialized[i]
+        if self.space is None:
+            raise ValueError(
+                "The observation space is needed to build the observations of the store"
+            )
+        obs = self.space.from_vect(self.vector(i), check_legit=False)
+        self._materialized[i] = obs
+        if len(self._materialized) > MATERIALIZED_CACHE_SIZE:
+            self._materialized.popitem(last=False)
+        return obs
+
+    def __iter__(self):
+        return (self[i] for i in range(self.length))
+
+    def __getstate__(self):
+        # spaces cannot be pickled, they are found again from space_path
+        state = dict(self.__dict__)
+        state["_space"] = None
+        state["_materialized"] = OrderedDict()
+        return state
+
+
+def observation_matrix(observations, attribute):
+    """
+    (nb observations, attribute size) array of an attribute of a store, or of
+    a list of grid2op observations as kept by the episodes with reboot.
+    """
+    if isinstance(observations, ObservationStore):
+        return observations.matrix(attribute)
+    return np.array([getattr(obs, attribute) for obs in observations])
@@ -0,0 +1,228 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Storage of the large tables of the episodes kept in memory and in the cache.
+
+optimize_memory_footprint stores each table of TABLES as set by the
+storage_policy key of the config.ini, e.g.
+
+    storage_policy=rho:uint16:1e-4,load:float32,production:float32,flows:float16
+
+float16 and float32 keep floats, with about 3 and 7 significant digits: float16
+values are rounded to 1 MW above 1024 MW and to 2 MW above 2048 MW. An integer
+dtype with a scale keeps the integer codes round(value / scale) instead, e.g.
+the usage rates as uint16 in 1e-4 units are exact to 5e-5 from 0 to 6.5534 for
+the same memory as float16. The largest code of the dtype stands for nan.
+
+Tables missing from the policy are stored as float16 as in previous versions.
+"""
+
+import numpy as np
+import pandas as pd
+
+# tables the storage policy applies to
+TABLES = ("rho", "load", "production", "flows")
+
+DEFAULT_STORAGE = "float16"
+DEFAULT_STORAGE_POLICY = ",".join(f"{table}:{DEFAULT_STORAGE}" for table in TABLES)
+
+FLOAT_DTYPES = ("float16", "float32", "float64")
+INTEGER_DTYPES = ("int8", "uint8", "int16", "uint16", "int32", "uint32")
+
+
+class Storage:
+    def __init__(self, dtype, scale=None):
+        """
+        :param dtype: one of FLOAT_DTYPES, or of INTEGER_DTYPES with a scale
+        :param scale: value of an integer code of dtype
+        """
+        dtype = str(np.dtype(dtype))
+        if dtype in FLOAT_DTYPES:
+            if scale is not None:
+                raise ValueError(f"A {dtype} storage cannot have a scale")
+        elif dtype in INTEGER_DTYPES:
+            if scale is None or not scale > 0:
+                raise ValueError(
+                    f"A {dtype} storage needs a positive scale, e.g. {dtype}:1e-4"
+                )
+        else:
+            raise ValueError(
+                f"Storage dtype can only be one of {FLOAT_DTYPES + INTEGER_DTYPES}. "
+                f"{dtype} passed"
+            )
+        self.dtype = dtype
+        self.scale = None if scale is None else float(scale)
+
+    @classmethod
+    def parse(cls, spec):
+        """Storage of a spec such as float32 or uint16:1e-4"""
+        dtype, _, scale = str(spec).strip().partition(":")
+        try:
+            return cls(dtype.strip(), float(scale) if scale.strip() else None)
+        except TypeError:
+            raise ValueError(f"Cannot read {spec} as a storage")
+
+    @property
+    def is_quantized(self):
+        return self.scale is not None
+
+    def encode(self, values):
+        """values stored as this storage, a float array or a QuantizedArray"""
+        if self.is_quantized:
+            return QuantizedArray.encode(values, self.dtype, self.scale)
+        return np.asarray(values).astype(self.dtype, copy=False)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Storage)
+            and self.dtype == other.dtype
+            and self.scale == other.scale
+        )
+
+    def __str__(self):
+        if self.is_quantized:
+            return f"{self.dtype}:{self.scale:g}"
+        return self.dtype
+
+    def __repr__(self):
+        return f"Storage({self})"
+
+
+class QuantizedArray:
+    def __init__(self, codes, scale):
+        """
+        :param codes: integer array, its largest value standing for nan
+        :param scale: value of a code
+        """
+        self.codes = codes
+        self.scale = scale
+
+    @classmethod
+    def encode(cls, values, dtype, scale):
+        values = np.asarray(values, dtype=np.float64)
+        info = np.iinfo(dtype)
+        codes = np.clip(np.round(values / scale), info.min, info.max - 1)
+        codes[np.isnan(values)] = info.max
+        return cls(codes.astype(dtype), scale)
+
+    def decode(self, dtype=np.float32):
+        values = self.codes.astype(dtype) * dtype(self.scale)
+        values[self.codes == np.iinfo(self.codes.dtype).max] = np.nan
+        return values
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, key):
+        return QuantizedArray(np.asarray(self.codes[key]), self.scale).decode()
+
+
+class QuantizedFrame:
+    def __init__(self, values, index, columns):
+        """
+        Dataframe of floats stored as the QuantizedArray of its values.
+        """
+        self.values = values
+        self.index = index
+        self.columns = columns
+
+    @classmethod
+    def encode(cls, frame, storage):
+        return cls(storage.encode(frame.to_numpy()), frame.index, frame.columns)
+
+    def decode(self):
+        return pd.DataFrame(self.values.decode(), index=self.index, columns=self.columns)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+
+def dequantize(value):
+    """Float values of a table whatever its storage"""
+    if isinstance(value, (QuantizedArray, QuantizedFrame)):
+        return value.decode()
+    return value
+
+
+def quantize(value, storage):
+    """
+    Dataframe or array value stored as storage, value itself if it already is.
+    """
+    if isinstance(value, QuantizedFrame):
+        if storage.is_quantized and storage.scale == value.values.scale and (
+            storage.dtype == str(value.values.codes.dtype)
+        ):
+            return value
+        value = value.decode()
+    if isinstance(value, pd.DataFrame):
+        if storage.is_quantized:
+            return QuantizedFrame.encode(value, storage)
+        if all(dtype == storage.dtype for dtype in value.dtypes):
+            return value
+        return value.astype(storage.dtype)
+    if isinstance(value, QuantizedArray):
+        if storage.is_quantized and storage.scale == value.scale and (
+            storage.dtype == str(value.codes.dtype)
+        ):
+            return value
+        value = value.decode()
+    if not storage.is_quantized and value.dtype == storage.dtype:
+        return value
+    return storage.encode(value)
+
+
+def max_abs_error(original, stored):
+    """Largest absolute difference between two tables, nan where both are nan"""
+    original = np.asarray(dequantize(original), dtype=np.float64)
+    stored = np.asarray(dequantize(stored), dtype=np.float64)
+    errors = np.abs(original - stored)
+    errors[np.isnan(original) & np.isnan(stored)] = 0
+    if errors.size == 0:
+        return 0.0
+    return float(np.max(errors))
+
+
+def parse_storage_policy(text):
+    """
+    dict table -> Storage of a policy such as rho:uint16:1e-4,load:float32,
+    float16 for the TABLES not in it.
+    """
+    policy = {table: Storage.parse(DEFAULT_STORAGE) for table in TABLES}
+    for item in str(text).split(","):
+        if not item.strip():
+            continue
+        table, _, spec = item.strip().partition(":")
+        if table not in TABLES:
+            raise ValueError(
+                f"storage_policy tables can only be among {TABLES}. {table} passed"
+            )
+        policy[table] = Storage.parse(spec)
+    return policy
+
+
+def format_storage_policy(policy):
+    """Text of a storage policy, as read by parse_storage_policy"""
+    return ",".join(f"{table}:{policy[table]}" for table in TABLES if table in policy)
+
+
+def error_report(errors):
+    """
+    Dataframe of the storage of each table and of the largest absolute error
+    its values got when stored so.
+
+    :param errors: dict table -> {"storage": ..., "max_abs_error": ...}
+    """
+    return pd.DataFrame.from_dict(
+        errors, orient="index", columns=["storage", "max_abs_error"]
+    ).rename_axis("table")
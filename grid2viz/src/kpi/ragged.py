@@ -0,0 +1,117 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Rows of different lengths stored in two flat arrays, as the CSR format of
+sparse matrices: the values of all the rows one after the other and the
+offset of the beginning of each row in them.
+
+Values repeated a lot, such as the names of the lines or substations modified
+by each action, can be stored as integer codes into their categories, so that
+counting them is a bincount.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class RaggedArray:
+    def __init__(self, offsets, values, categories=None):
+        """
+        :param offsets: (nb rows + 1) array, row i being values[offsets[i]:offsets[i + 1]]
+        :param values: values of all the rows, or their codes if categories is given
+        :param categories: array of the values the codes refer to
+        """
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.values = np.asarray(values)
+        self.categories = None if categories is None else np.asarray(categories)
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Column indices of the non-zero values of each row of a 2D array"""
+        mask = np.asarray(mask) != 0
+        rows, columns = np.nonzero(mask)
+        offsets = np.zeros(len(mask) + 1, dtype=np.int64)
+        np.cumsum(mask.sum(axis=1), out=offsets[1:])
+        return cls(offsets, columns.astype(np.int32))
+
+    @classmethod
+    def from_lists(cls, lists, dtype=None, categorical=False):
+        """
+        :param categorical: store the values as codes into their sorted unique values
+        """
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in lists], out=offsets[1:])
+        values = [value for row in lists for value in row]
+        if not categorical:
+            return cls(offsets, np.array(values, dtype=dtype))
+        codes, categories = pd.factorize(pd.Series(values, dtype=dtype), sort=True)
+        return cls(offsets, codes.astype(np.int32), np.asarray(categories))
+
+    def decoded_values(self):
+        """Values of all the rows one after the other"""
+        if self.categories is None:
+            return self.values
+        return self.categories[self.values]
+
+    def row_ids(self):
+        """Row of each value"""
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+    def value_counts(self, rows=None):
+        """
+        Number of occurrences of each value, most frequent first, as
+        pandas.Series.value_counts of the flattened rows.
+
+        :param rows: boolean mask of the rows to count, all of them by default
+        """
+        values = self.values
+        if rows is not None:
+            values = values[np.asarray(rows, dtype=bool)[self.row_ids()]]
+        if self.categories is None:
+            return pd.Series(values).value_counts()
+        counts = pd.Series(
+            np.bincount(values, minlength=len(self.categories)), index=self.categories
+        )
+        return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+    def rows_with(self, value):
+        """Boolean mask of the rows containing value"""
+        if self.categories is not None:
+            matches = np.nonzero(self.categories == value)[0]
+            if not len(matches):
+                return np.zeros(len(self), dtype=bool)
+            found = self.values == matches[0]
+        else:
+            found = self.values == value
+        rows = np.zeros(len(self), dtype=bool)
+        rows[self.row_ids()[found]] = True
+        return rows
+
+    def lengths(self):
+        """Number of values of each row"""
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[idx] for idx in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        values = self.values[self.offsets[i] : self.offsets[i + 1]]
+        if self.categories is None:
+            return values
+        return self.categories[values]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def tolist(self):
+        """Rows as python lists"""
+        values = self.decoded_values().tolist()
+        return [
+            values[begin:end] for begin, end in zip(self.offsets[:-1], self.offsets[1:])
+        ]
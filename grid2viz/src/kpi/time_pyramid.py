@@ -0,0 +1,184 @@
+# Copyright (C) 2021, RTE (http://www.rte-france.com/)
+# See AUTHORS.txt
+# SPDX-License-Identifier: MPL-2.0
+
+"""
+Pyramids of aggregates of the time series of an episode.
+
+The charts of a year-long episode would otherwise send every timestep of each
+series to the browser. A TimeSeriesPyramid keeps the min, mean and max of its
+series over the periods of each resolution of RESOLUTIONS coarser than the
+timesteps, computed once at ingestion and cached with the episode.
+
+level_for picks the coarsest level with at least min_points periods in the
+visible x range: each pixel of the chart still gets a period of its own, and
+the min/max band keeps the peaks the mean would flatten. Below that, the
+series are plotted at the resolution of the timesteps, only over that range.
+"""
+
+import numpy as np
+import pandas as pd
+
+# name and length of the periods of the levels, from the finest to the coarsest
+RESOLUTIONS = {"5min": "5min", "hour": "60min", "day": "1D"}
+
+# about the width in pixels of a chart
+MIN_POINTS = 1000
+
+AGGREGATES = ("min", "mean", "max")
+
+
+class PyramidLevel:
+    def __init__(self, resolution, x, minimum, mean, maximum):
+        """
+        :param x: datetime64 array of the beginning of each period
+        :param minimum: (nb periods, nb series) array, as mean and maximum
+        """
+        self.resolution = resolution
+        self.x = x
+        self.min = minimum
+        self.mean = mean
+        self.max = maximum
+
+    @classmethod
+    def aggregate(cls, resolution, x, values, starts, dtype=np.float32):
+        """
+        Level of the values over the periods beginning at the starts indices.
+        """
+        valid = ~np.isnan(values)
+        counts = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+        sums = np.add.reduceat(np.where(valid, values, 0), starts, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sums / counts
+        return cls(
+            resolution,
+            x[starts],
+            np.fmin.reduceat(values, starts, axis=0).astype(dtype),
+            mean.astype(dtype),
+            np.fmax.reduceat(values, starts, axis=0).astype(dtype),
+        )
+
+    def __len__(self):
+        return len(self.x)
+
+    def until(self, x_max):
+        """Level of the periods beginning at or before x_max"""
+        stop = np.searchsorted(self.x, to_datetime64(x_max), side="right")
+        return PyramidLevel(
+            self.resolution,
+            self.x[:stop],
+            self.min[:stop],
+            self.mean[:stop],
+            self.max[:stop],
+        )
+
+    def values(self, aggregate, column, x_range=None):
+        """
+        Timestamps and values of an aggregate of a series over x_range.
+
+        :param column: index of the series
+        """
+        index = range_slice(self.x, x_range)
+        return self.x[index], getattr(self, aggregate)[index, column]
+
+
+class TimeSeriesPyramid:
+    def __init__(self, columns, levels):
+        """
+        :param columns: names of the series
+        :param levels: PyramidLevel list, from the finest to the coarsest
+        """
+        self.columns = list(columns)
+        self.levels = levels
+        self.column_index = {column: i for i, column in enumerate(self.columns)}
+
+    @classmethod
+    def build(cls, timestamps, values, columns, dtype=np.float32):
+        """
+        :param timestamps: sorted timestamps of the rows of values
+        :param values: (nb timestamps, nb series) array
+        """
+        timestamps = pd.DatetimeIndex(timestamps)
+        values = np.asarray(values, dtype=np.float64).reshape(len(timestamps), -1)
+        levels = []
+        if not len(timestamps):
+            return cls(columns, levels)
+        x = timestamps.values
+        for resolution, period in RESOLUTIONS.items():
+            keys = timestamps.floor(period).asi8
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            # levels which do not aggregate anything are left out
+            if len(starts) == len(timestamps) or (
+                levels and len(starts) == len(levels[-1])
+            ):
+                continue
+            levels.append(PyramidLevel.aggregate(resolution, x, values, starts, dtype))
+        return cls(columns, levels)
+
+    @classmethod
+    def from_frame(cls, frame, dtype=np.float32):
+        """Pyramid of the columns of a dataframe indexed by timestamp"""
+        return cls.build(frame.index, frame.to_numpy(), frame.columns, dtype)
+
+    def level_for(self, x_range=None, min_points=MIN_POINTS):
+        """
+        Coarsest level with at least min_points periods in x_range, None if
+        the series have to be plotted at the resolution of the timesteps.
+        """
+        for level in reversed(self.levels):
+            index = range_slice(level.x, x_range)
+            if index.stop - index.start >= min_points:
+                return level
+        return None
+
+    def __getstate__(self):
+        return {"columns": self.columns, "levels": self.levels}
+
+    def __setstate__(self, state):
+        self.__init__(state["columns"], state["levels"])
+
+
+def to_datetime64(value):
+    """x axis bound of a relayoutData, a date string, as a datetime64"""
+    return pd.Timestamp(value).to_datetime64()
+
+
+def range_slice(x, x_range=None):
+    """
+    Slice of the sorted timestamps x in x_range, with the timestamp before and
+    the one after so that the lines reach the edges of the chart.
+
+    :param x_range: (xmin, xmax) or None for all of them
+    """
+    if x_range is None:
+        return slice(0, len(x))
+    x = np.asarray(x, dtype="datetime64[ns]")
+    start = np.searchsorted(x, to_datetime64(x_range[0]), side="right") - 1
+    stop = np.searchsorted(x, to_datetime64(x_range[1]), side="left") + 1
+    return slice(max(start, 0), min(stop, len(x)))
+
+
+def get_pyramid(episode, name):
+    """
+    Pyramid attribute of an episode, None for the episodes cached before they
+    were computed.
+    """
+    try:
+        return getattr(episode, name)
+    except AttributeError:
+        return None
+
+
+def get_level(episode, name, x_range=None, level_range=None):
+    """
+    Pyramid of an episode and its level for x_range, see level_for
+
+    :param level_range: x range to pick the level for instead of x_range, for
+    the traces plotted over more than the range displayed
+    """
+    pyramid = get_pyramid(episode, name)
+    if pyramid is None:
+        return None, None
+    if level_range is None:
+        level_range = x_range
+    return pyramid, pyramid.level_for(level_range)
@@ -27,6 +27,7 @@ from grid2viz.src.utils.graph_utils import layout_def, layout_no_data
 from grid2viz.src.utils.constants import DONT_SHOW_FILENAME
 from grid2viz.src.utils.graph_utils import (
     get_axis_relayout,
+    get_x_range,
     relayout_callback,
     max_or_zero,
 )
@@ -102,33 +103,54 @@ def register_callbacks_macro(app):
             condition = (
                 relayout_data_store is not None and relayout_data_store["relayout_data"]
             )
+        # the traces are plotted again over the x range of a relayout, at the
+        # resolution it needs
+        x_range = None
+        axis_layouts = [None] * len(figures)
         if condition:
             relayout_data = relayout_data_store["relayout_data"]
-            relayouted = False
-            for figure in figures:
-                axis_layout = get_axis_relayout(figure, relayout_data)
-                if axis_layout is not None:
-                    figure["layout"].update(axis_layout)
-                    relayouted = True
-            if relayouted:
-                return figures
+            x_range = get_x_range(relayout_data)
+            axis_layouts = [
+                get_axis_relayout(figure, relayout_data) for figure in figures
+            ]
         new_reward_fig, new_cumreward_fig = make_rewards_ts(
-            study_agent, ref_agent, scenario, rew_figure, cumrew_figure
+            study_agent, ref_agent, scenario, rew_figure, cumrew_figure, x_range
         )
 
-        overflow_figure["data"] = episode.total_overflow_trace.copy()
+        overflow_figure["data"] = EpisodeTrace.clip_traces(
+            episode.total_overflow_trace.copy(), x_range
+        )
         for event in ["maintenance", "hazard", "attacks"]:
             func = getattr(EpisodeTrace, f"get_{event}_trace")
-            traces = func(episode, ["total"])
+            traces = EpisodeTrace.clip_traces(func(episode, ["total"]), x_range)
             if len(traces) > 0:
                 traces[0].update({"name": event.capitalize()})
                 overflow_figure["data"].append(traces[0])
 
-        usage_rate_figure["data"] = episode.usage_rate_trace
+        if x_range is None:
+            usage_rate_figure["data"] = episode.usage_rate_trace
+        else:
+            usage_rate_figure["data"] = EpisodeTrace.get_usage_rate_trace(
+                episode, x_range
+            )
 
         new_topology_action_fig,new_dispatch_action_fig = make_action_ts(
-            study_agent, ref_agent, scenario, actions_topology_figure["layout"],actions_dispatch_figure
+            study_agent, ref_agent, scenario, actions_topology_figure["layout"],actions_dispatch_figure, x_range
         )
+        new_figures = [
+            new_reward_fig,
+            new_cumreward_fig,
+            overflow_figure,
+            usage_rate_figure,
+            new_topology_action_fig,
+            new_dispatch_action_fig,
+        ]
+        for figure, axis_layout in zip(new_figures, axis_layouts):
+            if axis_layout is None and x_range is not None:
+                # make_*_ts set the range of the traces, clipped to x_range
+                axis_layout = dict(xaxis=dict(range=list(x_range), autorange=False))
+            if axis_layout is not None:
+                figure["layout"].update(axis_layout)
 
         return (
             new_reward_fig,
@@ -286,7 +308,7 @@ def register_callbacks_macro(app):
         return episode.meta["chronics_max_timestep"]
 
     def get_nb_overflow_agent(episode):
-        return episode.total_overflow_ts["value"].sum()
+        return EpisodeTrace.overflow_arrays(episode)[0].sum()
 
     def get_nb_action_agent(episode):
         return int(
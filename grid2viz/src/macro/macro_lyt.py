@@ -11,7 +11,7 @@ from dash import html
 from dash import dash_table as dt
 import plotly.graph_objects as go
 
-from grid2viz.src.kpi import actions_model
+from grid2viz.src.kpi import EpisodeTrace, actions_model
 from grid2viz.src.manager import (
     make_episode,
     agents,
@@ -107,9 +107,9 @@ def indicator_line(scenario, study_agent, ref_agent):
                                     html.P(
                                         id="indicator_nb_overflow",
                                         className="border-bottom h3 mb-0 text-right",
-                                        children=episode.total_overflow_ts[
-                                            "value"
-                                        ].sum(),
+                                        children=EpisodeTrace.overflow_arrays(
+                                            episode
+                                        )[0].sum(),
                                     ),
                                     html.P(
                                         className="text-muted",
@@ -3,13 +3,14 @@
 # SPDX-License-Identifier: MPL-2.0
 
 import configparser
-import itertools
 import json
 import os
 import time
 from pathlib import Path
 import pickle
 import gzip
+import shutil
+import traceback
 
 from colorama import Fore, Style
 import dill
@@ -21,7 +22,12 @@ from scipy.spatial import ConvexHull
 from grid2op.Episode import EpisodeData
 from grid2op.PlotGrid import PlotPlotly, PlotMatplot
 
-from grid2viz.src.kpi.EpisodeAnalytics import EpisodeAnalytics
+from grid2viz.src.cache import columnar, locking, manifest, ram, scheduling
+from grid2viz.src.cache.single_flight import SingleFlight
+from grid2viz.src.kpi import EpisodeTrace, actions_model, observation_model, quantization
+from grid2viz.src.kpi.EpisodeAnalytics import EpisodeAnalytics, SCENARIO_SHARED_ATTRIBUTES
+from grid2viz.src.kpi.env_actions import env_actions_by_line
+from grid2viz.src.kpi.episode_reader import EpisodeReader
 
 # refer to https://github.com/rte-france/Grid2Op/blob/master/getting_started/8_PlottingCapabilities.ipynb for better usage
 
@@ -223,12 +229,9 @@ def make_network_agent_study(episode, timestep, figure_obs=None, responsive=Fals
 
     ##########
     # We color subs where we had actions
-    sub_name_modified = list(
-        itertools.chain.from_iterable(episode.action_data_table.subs_modified)
-    )
     sub_id_modified = [
         int(str.split("_")[1])
-        for str in episode.action_data_table.subs_modified[timestep]
+        for str in actions_model.get_action_lists(episode, "subs_modified")[timestep]
     ]
     fig = add_substation_color_plotly(sub_id_modified, graph,fig)
 
@@ -244,15 +247,16 @@ def make_network_agent_study(episode, timestep, figure_obs=None, responsive=Fals
         sub_2buses, graph, fig, color="green"
     )  # also other color for subs not in ref topo
 
-    if ("is_alarm" in episode.action_data_table.columns):
+    action_table = actions_model.get_action_scalars(episode)
+    if ("is_alarm" in action_table.columns):
         alarms_lines_area = episode.observations[timestep].alarms_lines_area
 
         light_colors_plotly = ["lightcoral", "lightsalmon", "lightpink"]
         n_colors = len(light_colors_plotly)
 
-        if (episode.action_data_table.is_alarm[timestep]):
+        if (action_table.is_alarm[timestep]):
 
-            alarm_zones = episode.action_data_table.alarm_zone[timestep]
+            alarm_zones = actions_model.get_action_lists(episode, "alarm_zone")[timestep]
 
             for i_zone,zone in enumerate(alarm_zones):
                 id_lines_alarm = []
@@ -283,9 +287,8 @@ def make_network_agent_overview(episode):
             episode.attacks_data_table.attack
         ].unique()
     )
-    lines_overflowed_ids = list(
-        itertools.chain.from_iterable(episode.total_overflow_ts.line_ids)
-    )
+    _, overflow_line_ids = EpisodeTrace.overflow_arrays(episode)
+    lines_overflowed_ids = np.unique(overflow_line_ids.values).astype(int)
     # to color assets on our graph with different colors while not overloading it with information
     # we will use plot_obs instead of plot_info for now
     ####
@@ -315,9 +318,9 @@ def make_network_agent_overview(episode):
 
     ##########
     # We color subs where we had actions
-    sub_name_modified = list(
-        itertools.chain.from_iterable(episode.action_data_table.subs_modified)
-    )
+    sub_name_modified = actions_model.get_action_lists(
+        episode, "subs_modified"
+    ).categories
     sub_id_modified = set([int(str.split("_")[1]) for str in sub_name_modified])
     fig = add_substation_color_plotly(sub_id_modified, graph, fig)
 
@@ -325,21 +328,10 @@ def make_network_agent_overview(episode):
 
 
 def make_network_scenario_overview(episode,timestep=0):
-    max_loads = (
-        episode.load[["value", "equipement_id"]]
-        .groupby("equipement_id")
-        .max()
-        .sort_index()
-    )
-    max_gens = (
-        episode.production[["value", "equipement_id"]]
-        .groupby("equipement_id")
-        .max()
-        .sort_index()
-    )
-    lines_in_maintenance = list(
-        episode.maintenances["line_name"][episode.maintenances.value == 1].unique()
-    )
+    max_loads = observation_model.get_equipment_matrix(episode, "load").max()
+    max_gens = observation_model.get_equipment_matrix(episode, "production").max()
+    maintenances_by_line = env_actions_by_line(episode, which="maintenances")
+    lines_in_maintenance = list(maintenances_by_line.columns[maintenances_by_line.any()])
 
     graph = make_network_matplotlib(episode)
 
@@ -363,8 +355,8 @@ def make_network_scenario_overview(episode,timestep=0):
     obs_colored.rho = rho_to_color
     obs_colored.line_status = line_status_colored
 
-    obs_colored.load_p = np.array(max_loads.value)
-    obs_colored.gen_p = np.array(max_gens.value)
+    obs_colored.load_p = max_loads.to_numpy()
+    obs_colored.gen_p = max_gens.to_numpy()
 
     network_graph = graph.plot_obs(obs_colored, line_info=None)
     # network_graph=graph.plot_info(
@@ -380,21 +372,34 @@ def make_network_scenario_overview(episode,timestep=0):
     return network_graph
 
 
-store = {}
-
-
 def make_episode(agent, episode_name,with_reboot=False):
     """
     Load episode from cache. If not already in, compute episode data
     and save it in cache.
 
+    Concurrent calls for the same episode wait for the first one to load it
+    rather than loading it again.
+
     :param agent: Agent Name
     :param episode_name: Name of the studied episode
     :return: Episode with computed data
     """
-    if is_in_ram_cache(episode_name, agent):
-        episode=get_from_ram_cache(episode_name, agent)
-    elif is_in_fs_cache(episode_name, agent):
+    return episode_flights.do(
+        (make_ram_cache_id(episode_name, agent), with_reboot),
+        _make_episode,
+        agent,
+        episode_name,
+        with_reboot,
+    )
+
+
+def _make_episode(agent, episode_name, with_reboot=False):
+    episode = get_from_ram_cache(episode_name, agent)
+    if episode is not None:
+        pass
+    elif is_in_fs_cache(episode_name, agent) and is_fs_cache_fresh(
+        episode_name, agent, require_manifest=False
+    ):
         episode = get_from_fs_cache(episode_name, agent)
         save_in_ram_cache(episode_name, agent, episode)
         #to see evolution of ram footprint
@@ -423,10 +428,11 @@ def make_episode_without_decorate(agent, episode_name,save=False):
     :param episode_name: Name of the studied episode
     :return: Episode with computed data (without EpisodeData attributes), EpisodeData instance
     """
-    if is_in_ram_cache(episode_name, agent):
+    episode_analytics = get_from_ram_cache(episode_name, agent)
+    if episode_analytics is not None:
         if save:
             return None
-        return get_from_ram_cache(episode_name, agent)
+        return episode_analytics
     elif is_in_fs_cache(episode_name, agent):
         if save:
             return None
@@ -434,7 +440,7 @@ def make_episode_without_decorate(agent, episode_name,save=False):
         episode_analytics=get_from_fs_cache(episode_name, agent)
         return episode_analytics
     else:
-        episode_data = retrieve_episode_from_disk(episode_name, agent)
+        episode_data = read_episode_from_disk(episode_name, agent)
         if episode_data is not None:
             episode_analytics = EpisodeAnalytics(episode_data, episode_name, agent)
             if save:
@@ -453,7 +459,9 @@ def clear_fs_cache():
 def is_in_fs_cache(episode_name, agent):
     dill_path=get_fs_cached_file(episode_name, agent)
     is_in_fs_cache=(os.path.isfile(dill_path) | os.path.isfile(dill_path+".bz"))
-    return is_in_fs_cache
+    return is_in_fs_cache or columnar.is_columnar_entry(
+        get_fs_cached_dir(episode_name, agent)
+    )
 
 
 def get_fs_cached_file(episode_name, agent):
@@ -462,8 +470,98 @@ def get_fs_cached_file(episode_name, agent):
         os.makedirs(episode_dir,exist_ok=True)
     return os.path.join(episode_dir, agent + ".dill")
 
+
+def get_fs_cached_dir(episode_name, agent):
+    """Directory of the episode in the columnar cache format"""
+    return os.path.join(cache_dir, episode_name, agent)
+
+
+def get_fs_cache_manifest_file(episode_name, agent):
+    return os.path.join(cache_dir, episode_name, agent + manifest.MANIFEST_SUFFIX)
+
+
+def is_fs_cache_fresh(episode_name, agent, require_manifest=True):
+    """
+    Whether the cached episode was computed with the current cache schema from
+    the current logs of the agent. See grid2viz.src.cache.manifest
+    """
+    return manifest.is_fresh(
+        get_fs_cache_manifest_file(episode_name, agent),
+        os.path.join(agents_dir, agent),
+        episode_name,
+        require_manifest=require_manifest,
+        storage_policy=quantization.format_storage_policy(storage_policy),
+    )
+
+
+def get_fs_cache_lock_file(episode_name, agent):
+    """
+    Lock of the entry of an episode, taken exclusively to write it and shared
+    to read it, see grid2viz.src.cache.locking
+    """
+    return os.path.join(cache_dir, episode_name, agent + locking.LOCK_SUFFIX)
+
+
+def remove_from_fs_cache(episode_name, agent):
+    """Remove the entry of an episode in all the cache formats, with its manifest"""
+    with locking.entry_lock(get_fs_cache_lock_file(episode_name, agent)):
+        manifest.remove_manifest(get_fs_cache_manifest_file(episode_name, agent))
+        path = get_fs_cached_file(episode_name, agent)
+        for file_path in [path, path + ".bz"]:
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+        columnar_dir = get_fs_cached_dir(episode_name, agent)
+        if os.path.isdir(columnar_dir):
+            shutil.rmtree(columnar_dir)
+
+
+def save_columnar_entry(path, episode):
+    """
+    Save an episode in the columnar cache format at path, its tables shared
+    by all the agents being stored in the _shared folder of the scenario.
+    """
+    columnar.save_episode(
+        path,
+        episode,
+        shared_dir=os.path.join(os.path.dirname(path), columnar.SHARED_DIR),
+        shared_attributes=SCENARIO_SHARED_ATTRIBUTES,
+    )
+
+
 def save_in_fs_cache(episode_name, agent, episode):
+    if isinstance(episode, columnar.LazyAttributes):
+        # read under the shared lock of the entry, which cannot be taken once
+        # its exclusive lock is held below
+        episode.load_attributes()
+    # saved with the compact dtypes so that loading it does not convert them
+    episode.optimize_memory_footprint(opt_obs_act=True, storage_policy=storage_policy)
+    entry_manifest = manifest.make_manifest(
+        os.path.join(agents_dir, agent),
+        episode_name,
+        cache_format,
+        storage_policy=quantization.format_storage_policy(storage_policy),
+    )
+    with locking.entry_lock(get_fs_cache_lock_file(episode_name, agent)):
+        _save_in_fs_cache(episode_name, agent, episode, entry_manifest)
+
+
+def _save_in_fs_cache(episode_name, agent, episode, entry_manifest):
+    # the manifest is only written back once the entry is complete
+    manifest_file = get_fs_cache_manifest_file(episode_name, agent)
+    manifest.remove_manifest(manifest_file)
+
     path = get_fs_cached_file(episode_name, agent)
+    columnar_dir = get_fs_cached_dir(episode_name, agent)
+    if cache_format == columnar.CACHE_FORMAT:
+        save_columnar_entry(columnar_dir, episode)
+        for old_path in [path, path + ".bz"]:
+            if os.path.isfile(old_path):
+                os.remove(old_path)
+        manifest.write_manifest(manifest_file, entry_manifest)
+        return
+    # a columnar entry would be read first
+    if os.path.isdir(columnar_dir):
+        shutil.rmtree(columnar_dir)
 
     #####
     #to assess size of objects
@@ -478,11 +576,14 @@ def save_in_fs_cache(episode_name, agent, episode):
     #import bz2
     #import zipfile
     #bz2.BZ2File('bz2_test.pbz2', 'wb') as f:
-    with gzip.open(path+".bz", "wb") as f:
-    #with zipfile.ZipFile.write(path+".zip") as f:
-    #with open(path, "wb") as f:
-        #dill.dump(episode, f, protocol=4)
-        pickle.dump(episode, f, protocol=4)
+    # readers only ever see the previous file or the complete new one
+    with locking.atomic_file(path + ".bz") as tmp_path:
+        with gzip.open(tmp_path, "wb") as f:
+        #with zipfile.ZipFile.write(path+".zip") as f:
+        #with open(path, "wb") as f:
+            #dill.dump(episode, f, protocol=4)
+            pickle.dump(episode, f, protocol=4)
+    manifest.write_manifest(manifest_file, entry_manifest)
 
 
 
@@ -493,15 +594,23 @@ def get_from_fs_cache(episode_name, agent):
 
     start = time.time()
 
-    if(os.path.exists(path + ".bz")):
+    columnar_dir = get_fs_cached_dir(episode_name, agent)
+    lock_file = get_fs_cache_lock_file(episode_name, agent)
+    with locking.entry_lock(lock_file, shared=True):
+        if columnar.is_columnar_entry(columnar_dir):
+            # attributes are only read from disk when a page accesses them
+            episode_analytics = columnar.load_episode(
+                columnar_dir, EpisodeAnalytics, lazy=True, lock_path=lock_file
+            )
+        elif(os.path.exists(path + ".bz")):
 
-        with gzip.open(path + ".bz", "rb") as f:
-            # with zipfile.ZipFile.open(path + ".zip") as f:
-            print(path)
-            episode_analytics=pickle.load(f)
-    else:
-        with open(path, "rb") as f:
-            episode_analytics = pickle.load(f)
+            with gzip.open(path + ".bz", "rb") as f:
+                # with zipfile.ZipFile.open(path + ".zip") as f:
+                print(path)
+                episode_analytics=pickle.load(f)
+        else:
+            with open(path, "rb") as f:
+                episode_analytics = pickle.load(f)
 
     ######
     #add observation_space only to decorate as it could not be saved in pickle
@@ -514,8 +623,15 @@ def get_from_fs_cache(episode_name, agent):
     if("observations" not in dir(episode_analytics)):
         print("WARNING: the cache management have been updated in grid2viz 1.3.1 for faster loading. "
               "You Should delete the old _cache folder and recompute it with latest grid2viz version")
-    episode_analytics.optimize_memory_footprint(opt_obs_act=True)#this adds a bit of 25% loading time overhead,
-    # in particular when resetting observations and actions, which only brings a 10% size decrease
+    # entries are saved with the compact dtypes since the cache schema version 2,
+    # older ones are converted here
+    entry_manifest = manifest.read_manifest(get_fs_cache_manifest_file(episode_name, agent))
+    if (
+        entry_manifest is None
+        or entry_manifest.get("schema_version", 0) < manifest.COMPACT_DTYPES_SCHEMA_VERSION
+    ):
+        episode_analytics.optimize_memory_footprint(opt_obs_act=True, storage_policy=storage_policy)#this adds a bit of 25% loading time overhead,
+        # in particular when resetting observations and actions, which only brings a 10% size decrease
 
     #episode_analytics.decorate(episode_data)
     #episode_analytics=decorate(episode_analytics,episode_data)
@@ -527,10 +643,45 @@ def get_from_fs_cache(episode_name, agent):
     return episode_analytics
 
 
+def migrate_fs_cache(cache_dir):
+    """
+    Convert the pickled episodes of a _cache tree to the columnar format,
+    removing each pickle file once converted.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    for episode_name in sorted(os.listdir(cache_dir)):
+        episode_dir = os.path.join(cache_dir, episode_name)
+        if not os.path.isdir(episode_dir):
+            continue
+        for file in sorted(os.listdir(episode_dir)):
+            if not (file.endswith(".dill") or file.endswith(".dill.bz")):
+                continue
+            path = os.path.join(episode_dir, file)
+            agent = file[: -len(".bz")] if file.endswith(".bz") else file
+            agent = agent[: -len(".dill")]
+            print(f"Migrating agent {agent} on scenario {episode_name} to the columnar cache")
+            opener = gzip.open if file.endswith(".bz") else open
+            with locking.entry_lock(os.path.join(episode_dir, agent + locking.LOCK_SUFFIX)):
+                with opener(path, "rb") as f:
+                    episode_analytics = pickle.load(f)
+                save_columnar_entry(os.path.join(episode_dir, agent), episode_analytics)
+                os.remove(path)
+                manifest_file = os.path.join(episode_dir, agent + manifest.MANIFEST_SUFFIX)
+                entry_manifest = manifest.read_manifest(manifest_file)
+                if entry_manifest is not None:
+                    entry_manifest["cache_format"] = columnar.CACHE_FORMAT
+                    manifest.write_manifest(manifest_file, entry_manifest)
+
+
 def compute_episode(episode_name, agent,with_reboot=False):
     print(f"Loading from logs agent {agent} on scenario {episode_name}...")
     beg = time.time()
-    episode_data = retrieve_episode_from_disk(episode_name, agent)
+    if with_reboot:
+        # reboot needs the grid2op EpisodeData
+        episode_data = retrieve_episode_from_disk(episode_name, agent)
+    else:
+        episode_data = read_episode_from_disk(episode_name, agent)
     episode_analytics = EpisodeAnalytics(episode_data, episode_name, agent)
     if with_reboot:
         episode_analytics.decorate_with_reboot(episode_data)
@@ -555,6 +706,19 @@ def retrieve_episode_from_disk(episode_name, agent):
         return None
 
 
+def read_episode_from_disk(episode_name, agent):
+    """
+    Same as retrieve_episode_from_disk but returns an EpisodeReader, which reads
+    the raw arrays and only builds grid2op objects when they are accessed.
+    """
+    path = os.path.join(agents_dir, agent)
+    episode_path = os.path.abspath(os.path.join(path, episode_name))
+    if os.path.isdir(episode_path):
+        return EpisodeReader(path, episode_name)
+    else:
+        return None
+
+
 def is_in_ram_cache(episode_name, agent):
     return make_ram_cache_id(episode_name, agent) in store
 
@@ -564,7 +728,19 @@ def save_in_ram_cache(episode_name, agent, episode):
 
 
 def get_from_ram_cache(episode_name, agent):
-    return store[make_ram_cache_id(episode_name, agent)]
+    """
+    Episode from the RAM cache, None if it is not there (or was evicted) or if
+    its filesystem cache entry was rewritten since it was lazily loaded
+    """
+    ram_cache_id = make_ram_cache_id(episode_name, agent)
+    episode = store.get(ram_cache_id)
+    if isinstance(episode, columnar.LazyAttributes) and episode.is_stale_entry():
+        try:
+            del store[ram_cache_id]
+        except KeyError:
+            pass
+        return None
+    return episode
 
 
 def make_ram_cache_id(episode_name, agent):
@@ -654,43 +830,162 @@ def check_all_tree_and_get_meta_and_best(base_dir, agents):
 
     return meta_json, best_agents, survival_df, attention_df
 
-def make_cache(scenarios,agents,n_cores,cache_dir,agent_selection=None):
+MAKE_CACHE_REPORT_FILE = "make_cache_report.json"
+
+
+def build_fs_cache_entry(agent, episode_name):
+    """
+    Compute an episode from the agent logs and save it in the filesystem cache.
+    Returns None to avoid pickling the episode back from the worker processes.
+    """
+    episode_data = read_episode_from_disk(episode_name, agent)
+    if episode_data is None:
+        return None
+    episode_analytics = EpisodeAnalytics(episode_data, episode_name, agent)
+    episode_analytics.decorate_light_without_reboot(episode_data)
+    save_in_fs_cache(episode_name, agent, episode_analytics)
+    return None
+
+
+def _isolated_build_fs_cache_entry(agent, episode_name, retries=0):
+    """
+    Build an entry, trying again up to retries times if it fails, without
+    ever raising so that a bad episode does not stop the other builds.
+
+    :return: dict with agent, scenario, attempts, elapsed time in seconds and
+    the traceback of the last error (None on success)
+    """
+    beg = time.time()
+    error = None
+    for attempt in range(1, retries + 2):
+        try:
+            build_fs_cache_entry(agent, episode_name)
+            error = None
+            break
+        except Exception:
+            error = traceback.format_exc()
+            print(
+                f"Attempt {attempt} of building agent {agent} on scenario "
+                f"{episode_name} failed:\n{error}"
+            )
+            remove_from_fs_cache(episode_name, agent)
+    return {
+        "agent": agent,
+        "scenario": episode_name,
+        "attempts": attempt,
+        "elapsed": time.time() - beg,
+        "traceback": error,
+    }
+
+
+def make_cache(scenarios,agents,n_cores,cache_dir,agent_selection=None,retries=None):
+    """
+    Build the filesystem cache entries which are missing or stale.
+
+    An entry is stale when its manifest is missing (entry interrupted or
+    written by an older grid2viz) or when the cache schema or the agent logs
+    changed since it was written, so that make_cache can be run again after
+    an interruption or after some agents were run again.
+
+    An episode failing to build is tried again up to retries times (the
+    cache_build_retries option by default) and is then reported in
+    <cache_dir>/make_cache_report.json while the others keep being built.
+
+    :return: list of the failed builds, see _isolated_build_fs_cache_entry
+    """
+    if retries is None:
+        retries = cache_build_retries
 
     if(agent_selection is not None):
         agents=[agent for agent in agents if agent in agent_selection]
 
     from pathos.multiprocessing import ProcessPool
 
-    if not os.path.exists(cache_dir):
-        print("Starting Multiprocessing for reading the best agent of each scenario")
-
-    # TODO: tous les agents n'ont pas forcément tourner sur exactement tous les mêmes scenarios
-    # Eviter une erreur si un agent n'a pas tourné sur un scenario
+    # not all the agents have necessarily been run on all the scenarios
     agent_scenario_list = [
-        (agent, scenario) for agent in agents for scenario in scenarios
+        (agent, scenario)
+        for agent in agents
+        for scenario in sorted(scenarios)
+        if os.path.isdir(os.path.join(agents_dir, agent, scenario))
     ]
+    stale_agent_scenario_list = [
+        (agent, scenario)
+        for agent, scenario in agent_scenario_list
+        if not (
+            is_in_fs_cache(scenario, agent) and is_fs_cache_fresh(scenario, agent)
+        )
+    ]
+    print(
+        f"{len(agent_scenario_list) - len(stale_agent_scenario_list)} of "
+        f"{len(agent_scenario_list)} cache entries are up to date, "
+        f"building {len(stale_agent_scenario_list)}"
+    )
+    if not stale_agent_scenario_list:
+        return []
 
-    agents_data = []
-    if n_cores == 1:  # no multiprocess useful for debug if needed
-        i = 0
-        for agent_scenario in agent_scenario_list:
-            agents_data.append(
-                make_episode_without_decorate(agent_scenario[0], agent_scenario[1],save=True)
+    # longest episodes first so that no core is left idle at the end
+    nb_timesteps = {
+        (agent, scenario): scheduling.episode_nb_timesteps(
+            os.path.join(agents_dir, agent), scenario
+        )
+        for agent, scenario in stale_agent_scenario_list
+    }
+    stale_agent_scenario_list.sort(key=lambda agent_scenario: -nb_timesteps[agent_scenario])
+    progress = scheduling.ProgressReporter(nb_timesteps)
+
+    n_workers = min(n_cores, len(stale_agent_scenario_list))
+    if n_workers > 1:
+        memory = scheduling.available_memory()
+        n_workers = scheduling.max_workers(
+            n_workers,
+            [
+                scheduling.estimate_build_memory(os.path.join(agents_dir, agent), scenario)
+                for agent, scenario in stale_agent_scenario_list
+            ],
+            memory,
+        )
+        if n_workers < min(n_cores, len(stale_agent_scenario_list)):
+            print(
+                f"Using {n_workers} processes instead of {n_cores} to fit in the "
+                f"{memory / 1024 ** 3:.1f} GB of available memory"
             )
-            i += 1
+
+    results = []
+    if n_workers == 1:  # no multiprocess useful for debug if needed
+        for agent, scenario in stale_agent_scenario_list:
+            result = _isolated_build_fs_cache_entry(agent, scenario, retries)
+            progress.update(agent, scenario, result["elapsed"], result["traceback"] is not None)
+            results.append(result)
     else:
-        pool = ProcessPool(n_cores)
-        list(
-            pool.imap(
-                make_episode_without_decorate,
-                [agent_scenario[0] for agent_scenario in agent_scenario_list],  # agents
-                [agent_scenario[1] for agent_scenario in agent_scenario_list],
-                [True for agent_scenario in agent_scenario_list],
+        print("Starting Multiprocessing for building the cache")
+        pool = ProcessPool(n_workers)
+        # results come in the order the builds complete
+        for result in pool.uimap(
+            _isolated_build_fs_cache_entry,
+            [agent_scenario[0] for agent_scenario in stale_agent_scenario_list],  # agents
+            [agent_scenario[1] for agent_scenario in stale_agent_scenario_list],  # scenarios
+            [retries for agent_scenario in stale_agent_scenario_list],
+        ):
+            progress.update(
+                result["agent"], result["scenario"], result["elapsed"], result["traceback"] is not None
             )
-        )  # scenarios #we go over all agents and all scenarios for each agent
+            results.append(result)
         pool.close()
         print("Multiprocessing done")
 
+    failures = [result for result in results if result["traceback"] is not None]
+    report = {"built": len(results) - len(failures), "failed": failures}
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, MAKE_CACHE_REPORT_FILE), "w") as f:
+        json.dump(report, f, indent=1)
+    if failures:
+        print(
+            Fore.RED + f"{len(failures)} of {len(results)} cache entries could not be built: "
+            + ", ".join(f"agent {failure['agent']} on scenario {failure['scenario']}" for failure in failures)
+            + f". See {os.path.join(cache_dir, MAKE_CACHE_REPORT_FILE)}" + Style.RESET_ALL
+        )
+    return failures
+
 
 """
 Initialisation routine
@@ -733,6 +1028,45 @@ try:
 except configparser.NoOptionError:
     n_cores = 1
 
+# "columnar" (one file per table, see grid2viz.src.cache.columnar) or "pickle"
+# (whole episode in one gzip pickle). Both formats are read whatever the setting.
+try:
+    cache_format = parser.get("DEFAULT", "cache_format")
+except configparser.NoOptionError:
+    cache_format = columnar.CACHE_FORMAT
+if cache_format not in (columnar.CACHE_FORMAT, "pickle"):
+    raise ValueError(
+        f"cache_format can only be either columnar or pickle. {cache_format} passed"
+    )
+
+# Budget of the RAM cache of episodes, in bytes or with a unit such as 4GB.
+# The least recently used episodes are evicted past it and read again from
+# the filesystem cache when needed. 0 means no limit.
+try:
+    ram_cache_size = ram.parse_size(parser.get("DEFAULT", "ram_cache_size"))
+except configparser.NoOptionError:
+    ram_cache_size = ram.parse_size(ram.DEFAULT_MAX_SIZE)
+store = ram.LRUCache(ram_cache_size)
+
+# Storage of the large tables of the episodes, e.g. rho:uint16:1e-4,load:float32
+# to keep the usage rates as integers in 1e-4 units and the loads in float32.
+# See grid2viz.src.kpi.quantization
+try:
+    storage_policy = quantization.parse_storage_policy(
+        parser.get("DEFAULT", "storage_policy")
+    )
+except configparser.NoOptionError:
+    storage_policy = quantization.parse_storage_policy(
+        quantization.DEFAULT_STORAGE_POLICY
+    )
+
+# Number of times make_cache tries again to build an episode that failed
+try:
+    cache_build_retries = int(parser.get("DEFAULT", "cache_build_retries"))
+except configparser.NoOptionError:
+    cache_build_retries = 1
+episode_flights = SingleFlight()
+
 for agent in agents:
     scen_path = os.path.join(agents_dir, agent)
     scens = [
@@ -13,6 +13,8 @@ from grid2op.Exceptions import Grid2OpException
 from pathlib import Path
 import numpy as np
 
+from grid2viz.src.kpi import observation_model
+from grid2viz.src.kpi.line_flows import line_flows
 from grid2viz.src.manager import grid2viz_home_directory
 from grid2viz.src.manager import make_episode, make_network_agent_study
 from grid2viz.src.utils import common_graph
@@ -21,6 +23,7 @@ from grid2viz.src.utils.constants import DONT_SHOW_FILENAME
 from grid2viz.src.utils.graph_utils import (
     relayout_callback,
     get_axis_relayout,
+    get_x_range,
     layout_no_data,
 )
 
@@ -184,27 +187,52 @@ def register_callbacks_micro(app):
         condition = (
             relayout_data_store is not None and relayout_data_store["relayout_data"]
         )
+        # the traces are clipped to the x range of a relayout only, the window
+        # just picks the resolution they are plotted at
+        x_range = None
+        level_range = window
+        axis_layouts = [None] * len(figures)
         if condition:
             relayout_data = relayout_data_store["relayout_data"]
-            relayouted = False
-            for figure in figures:
-                axis_layout = get_axis_relayout(figure, relayout_data)
-                if axis_layout is not None:
-                    figure["layout"].update(axis_layout)
-                    relayouted = True
-            if relayouted:
-                return figures
+            axis_layouts = [
+                get_axis_relayout(figure, relayout_data) for figure in figures
+            ]
+        relayouted = any(axis_layout is not None for axis_layout in axis_layouts)
+        if relayouted:
+            x_range = get_x_range(relayout_data)
+            level_range = None
 
         rew_figure, cumrew_figure = common_graph.make_rewards_ts(
-            study_agent, agent_ref, scenario, rew_figure, cumrew_figure
+            study_agent,
+            agent_ref,
+            scenario,
+            rew_figure,
+            cumrew_figure,
+            x_range,
+            level_range,
         )
 
         new_topology_action_fig,new_dispatch_action_fig = common_graph.make_action_ts(
-            study_agent, agent_ref, scenario, topology_action_fig["layout"]
+            study_agent,
+            agent_ref,
+            scenario,
+            topology_action_fig["layout"],
+            x_range=x_range,
+            level_range=level_range,
         )
         #TO DO
         figures = [rew_figure, cumrew_figure, new_topology_action_fig,new_dispatch_action_fig]
 
+        if relayouted:
+            for figure, axis_layout in zip(figures, axis_layouts):
+                if axis_layout is None and x_range is not None:
+                    axis_layout = dict(
+                        xaxis=dict(range=list(x_range), autorange=False)
+                    )
+                if axis_layout is not None:
+                    figure["layout"].update(axis_layout)
+            return figures
+
         if window is not None:
             start_datetime = dt.datetime.strptime(window[0], "%Y-%m-%dT%H:%M:%S")
             end_datetime = dt.datetime.strptime(window[-1], "%Y-%m-%dT%H:%M:%S")
@@ -313,7 +341,7 @@ def register_callbacks_micro(app):
             return {"display": "none"}
 
     def load_voltage_for_lines(lines, new_episode):
-        voltage = new_episode.flow_and_voltage_line
+        flows = line_flows(new_episode)
         traces = []
 
         for value in lines:
@@ -325,7 +353,7 @@ def register_callbacks_micro(app):
                     go.Scatter(
                         x=new_episode.timestamps,
                         # remove the first 3 char to get the line name and round to 3 dec
-                        y=np.array(voltage["ex"]["voltage"][line_name[3:]].tolist()),
+                        y=flows.series("ex", "voltage", line_name[3:]).astype(float),
                         name=line_name,
                     )
                 )
@@ -333,7 +361,7 @@ def register_callbacks_micro(app):
                 traces.append(
                     go.Scatter(
                         x=new_episode.timestamps,
-                        y=np.array(voltage["or"]["voltage"][line_name[3:]].tolist()),
+                        y=flows.series("or", "voltage", line_name[3:]).astype(float),
                         name=line_name,
                     )
                 )
@@ -357,7 +385,7 @@ def register_callbacks_micro(app):
         return traces
 
     def load_flows_for_lines(lines, new_episode):
-        flow = new_episode.flow_and_voltage_line
+        flows = line_flows(new_episode)
         traces = []
 
         x = new_episode.timestamps
@@ -374,18 +402,18 @@ def register_callbacks_micro(app):
             ]  # the name is the 2nd part of the string: 'type_name'
             if line_side == "ex":
                 traces.append(
-                    go.Scatter(x=x, y=np.array(flow["ex"][flow_type][line_name].tolist()), name=value)
+                    go.Scatter(x=x, y=flows.series("ex", flow_type, line_name).astype(float), name=value)
                 )
             elif line_side == "or":
                 traces.append(
-                    go.Scatter(x=x, y=np.array(flow["or"][flow_type][line_name].tolist()), name=value)
+                    go.Scatter(x=x, y=flows.series("or", flow_type, line_name).astype(float), name=value)
                 )
             else:  # this concern usage rate
                 name = value.split("_", 2)[2]  # get the powerline name
                 index_powerline = list(new_episode.line_names).index(name)
-                usage_rate_powerline = new_episode.rho.loc[
-                    new_episode.rho["equipment"] == index_powerline
-                ]["value"]
+                usage_rate_powerline = observation_model.get_equipment_matrix(
+                    new_episode, "rho"
+                ).iloc[:, index_powerline]
 
                 traces.append(go.Scatter(x=x, y=np.array(usage_rate_powerline.tolist()), name=name))
 
@@ -418,22 +446,30 @@ def register_callbacks_micro(app):
     def load_context_data(
         equipments, relayout_data_store, window, figure, kind, scenario, agent_study
     ):
+        # the window only picks the resolution of the traces, see load_ts
+        x_range = None
+        level_range = window
+        relayouted = False
         if relayout_data_store is not None and relayout_data_store["relayout_data"]:
             relayout_data = relayout_data_store["relayout_data"]
             layout = figure["layout"]
             new_axis_layout = get_axis_relayout(figure, relayout_data)
             if new_axis_layout is not None:
                 layout.update(new_axis_layout)
-                return figure
+                x_range = get_x_range(relayout_data)
+                level_range = None
+                relayouted = True
 
         if kind is None:
             return figure
         if isinstance(equipments, str):
             equipments = [equipments]  # to make pd.series.isin() work
         episode = make_episode(agent_study, scenario)
-        figure["data"] = common_graph.environment_ts_data(kind, episode, equipments)
+        figure["data"] = common_graph.environment_ts_data(
+            kind, episode, equipments, x_range, level_range
+        )
 
-        if window is not None:
+        if window is not None and not relayouted:
             figure["layout"].update(xaxis=dict(range=window, autorange=False))
 
         return figure
@@ -456,6 +492,10 @@ def register_callbacks_micro(app):
         study_agent,
         scenario,
     ):
+        # the window only picks the resolution of the traces, see load_ts
+        x_range = None
+        level_range = window
+        relayouted = False
         if relayout_data_store is not None and relayout_data_store["relayout_data"]:
             relayout_data = relayout_data_store["relayout_data"]
             layout_usage = figure_usage["layout"]
@@ -463,14 +503,20 @@ def register_callbacks_micro(app):
             if new_axis_layout is not None:
                 layout_usage.update(new_axis_layout)
                 figure_overflow["layout"].update(new_axis_layout)
-                return figure_overflow, figure_usage
+                x_range = get_x_range(relayout_data)
+                level_range = None
+                relayouted = True
 
-        if window is not None:
+        if window is not None and not relayouted:
             figure_overflow["layout"].update(xaxis=dict(range=window, autorange=False))
             figure_usage["layout"].update(xaxis=dict(range=window, autorange=False))
 
         return common_graph.agent_overflow_usage_rate_trace(
-            make_episode(study_agent, scenario), figure_overflow, figure_usage
+            make_episode(study_agent, scenario),
+            figure_overflow,
+            figure_usage,
+            x_range,
+            level_range,
         )
 
     @app.callback(
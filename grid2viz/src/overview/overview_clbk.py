@@ -14,7 +14,11 @@ from grid2viz.src.manager import make_episode, best_agents, grid2viz_home_direct
 from grid2viz.src.utils import common_graph
 from grid2viz.src.utils.callbacks_helpers import toggle_modal_helper
 from grid2viz.src.utils.constants import DONT_SHOW_FILENAME
-from grid2viz.src.utils.graph_utils import relayout_callback, get_axis_relayout
+from grid2viz.src.utils.graph_utils import (
+    relayout_callback,
+    get_axis_relayout,
+    get_x_range,
+)
 
 
 def filter_table_datetime(
@@ -30,6 +34,50 @@ def filter_table_datetime(
     return df
 
 
+def inspection_table(episode, loads, prods, start_date, end_date, data):
+    """
+    Columns and records of the inspection table of an episode, with the
+    hazards, maintenances and the loads and prods selected between the dates.
+    """
+    df = observation_model.init_table_inspection_data(episode)
+    if data is None:
+        return [{"name": i, "id": i} for i in df.columns], df.to_dict("records")
+    if loads is None:
+        loads = []
+    if prods is None:
+        prods = []
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    cols_to_drop = []
+    for col in df.columns[4:]:
+        if col not in loads and col not in prods:
+            cols_to_drop.append(col)
+    cols_to_add = [col for col in loads + prods if col not in df.columns]
+    df = df.drop(cols_to_drop, axis=1)
+    if cols_to_add:
+        df_col = observation_model.get_prod_and_conso(episode)[cols_to_add]
+        df_col.index = pd.to_datetime(df_col.index)
+        df = df.merge(
+            df_col,
+            left_on="timestamp",
+            right_index=True,
+            how="right",
+        )
+    start_date_timestamp = None
+    end_date_timestamp = None
+    if start_date is not None:
+        start_date_timestamp = dt.datetime.strptime(start_date, "%Y-%m-%d")
+    if end_date is not None:
+        end_date_timestamp = dt.datetime.strptime(
+            end_date, "%Y-%m-%d"
+        ) + dt.timedelta(days=1)
+    df = filter_table_datetime(
+        df, start_date=start_date_timestamp, end_date=end_date_timestamp
+    )
+    cols = [{"name": i, "id": i} for i in df.columns]
+    df.timestamp=df.timestamp.astype('category')
+    return cols, df.to_dict("records")
+
+
 def register_callbacks_overview(app):
     @app.callback(
         Output("relayoutStoreOverview", "data"),
@@ -78,15 +126,17 @@ def register_callbacks_overview(app):
         Load selected kind of environment for chosen equipments in a scenario.
 
         Triggered when user click on a equipment displayed in the
-        input_assets_selector in the overview layout.
+        input_assets_selector in the overview layout. The traces are plotted
+        again over the x range of a relayout, at the resolution it needs.
         """
+        x_range = None
         if relayout_data_store is not None and relayout_data_store["relayout_data"]:
             relayout_data = relayout_data_store["relayout_data"]
+            x_range = get_x_range(relayout_data)
             layout = figure["layout"]
             new_axis_layout = get_axis_relayout(figure, relayout_data)
             if new_axis_layout is not None:
                 layout.update(new_axis_layout)
-                return figure
 
         if kind is None:
             return figure
@@ -94,7 +144,10 @@ def register_callbacks_overview(app):
             equipments = [equipments]  # to make pd.series.isin() work
 
         figure["data"] = common_graph.environment_ts_data(
-            kind, make_episode(best_agents[scenario]["agent"], scenario), equipments
+            kind,
+            make_episode(best_agents[scenario]["agent"], scenario),
+            equipments,
+            x_range,
         )
 
         return figure
@@ -149,44 +202,9 @@ def register_callbacks_overview(app):
         """
         if agent_ref is None:
             raise PreventUpdate
-        episode = make_episode(agent_ref, scenario)
-        df = observation_model.init_table_inspection_data(episode)
-        if data is None:
-            return [{"name": i, "id": i} for i in df.columns], df.to_dict("records")
-        if loads is None:
-            loads = []
-        if prods is None:
-            prods = []
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        cols_to_drop = []
-        for col in df.columns[4:]:
-            if col not in loads and col not in prods:
-                cols_to_drop.append(col)
-        cols_to_add = [col for col in loads + prods if col not in df.columns]
-        df = df.drop(cols_to_drop, axis=1)
-        if cols_to_add:
-            df_col = observation_model.get_prod_and_conso(episode)[cols_to_add]
-            df_col.index = pd.to_datetime(df_col.index)
-            df = df.merge(
-                df_col,
-                left_on="timestamp",
-                right_index=True,
-                how="right",
-            )
-        start_date_timestamp = None
-        end_date_timestamp = None
-        if start_date is not None:
-            start_date_timestamp = dt.datetime.strptime(start_date, "%Y-%m-%d")
-        if end_date is not None:
-            end_date_timestamp = dt.datetime.strptime(
-                end_date, "%Y-%m-%d"
-            ) + dt.timedelta(days=1)
-        df = filter_table_datetime(
-            df, start_date=start_date_timestamp, end_date=end_date_timestamp
+        return inspection_table(
+            make_episode(agent_ref, scenario), loads, prods, start_date, end_date, data
         )
-        cols = [{"name": i, "id": i} for i in df.columns]
-        df.timestamp=df.timestamp.astype('category')
-        return cols, df.to_dict("records")
 
     @app.callback(Output("nb_steps_card", "children"), [Input("scenario", "data")])
     def update_card_step(scenario):
@@ -250,17 +268,18 @@ def register_callbacks_overview(app):
     ):
         if ref_agent is None or scenario is None:
             raise PreventUpdate
+        x_range = None
         if relayout_data_store is not None and relayout_data_store["relayout_data"]:
             relayout_data = relayout_data_store["relayout_data"]
+            x_range = get_x_range(relayout_data)
             layout_usage = figure_usage["layout"]
             new_axis_layout = get_axis_relayout(figure_usage, relayout_data)
             if new_axis_layout is not None:
                 layout_usage.update(new_axis_layout)
                 figure_overflow["layout"].update(new_axis_layout)
-                return figure_overflow, figure_usage
 
         return common_graph.agent_overflow_usage_rate_trace(
-            make_episode(ref_agent, scenario), figure_overflow, figure_usage
+            make_episode(ref_agent, scenario), figure_overflow, figure_usage, x_range
         )
 
     @app.callback(
@@ -296,10 +315,10 @@ def register_callbacks_overview(app):
         if agent_ref is None or scenario is None:
             raise PreventUpdate
         episode = make_episode(agent_ref, scenario)
-        return (
-            episode.production["timestamp"].dt.date.values[0],
-            episode.production["timestamp"].dt.date.values[-1],
-        )
+        timestamps = observation_model.get_equipment_matrix(
+            episode, "production"
+        ).index
+        return timestamps.date[0], timestamps.date[-1]
 
     @app.callback(
         [
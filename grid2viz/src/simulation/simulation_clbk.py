@@ -18,6 +18,7 @@ from grid2viz.src.simulation.reboot import env, params_for_reboot, BACKEND
 from grid2viz.src.simulation.simulation_lyt import choose_tab_content
 from grid2viz.src.utils.serialization import NoIndent, MyEncoder
 from grid2viz.src.simulation.simulation_utils import action_dict_from_choose_tab
+from grid2viz.src.kpi import observation_model
 from grid2viz.src.kpi.EpisodeAnalytics import compute_losses
 
 
@@ -436,7 +437,7 @@ def register_callbacks_simulation(app, assistant):
         episode = make_episode(study_agent, scenario)
         reward = f"{episode.rewards[int(ts)]:,.0f}"
         rho_max = (
-            f"{episode.rho.loc[episode.rho.time == int(ts), 'value'].max() * 100:.0f}%"
+            f"{observation_model.get_equipment_matrix(episode, 'rho').iloc[int(ts)].max() * 100:.0f}%"
         )
         nb_overflows = f"{episode.total_overflow_ts['value'][int(ts)]:,.0f}"
         losses = f"{compute_losses(episode.observations[int(ts)])*100:.2f}%"
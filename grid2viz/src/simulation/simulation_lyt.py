@@ -3,6 +3,7 @@ import dash_bootstrap_components as dbc
 from dash import dcc
 from dash import html
 import datetime as dt
+from grid2viz.src.kpi import observation_model
 from grid2viz.src.manager import make_episode, make_network_agent_study
 
 
@@ -286,9 +287,9 @@ def choose_assist_line(network_graph):
 
 
 def compare_line(episode, timestep):
-    timestamp = episode.timestamps[timestep]
     reward = f"{episode.rewards[timestep]:,.0f}"
-    rho = f"{episode.rho.loc[ episode.rho.timestamp == timestamp, 'value'].max() * 100:.0f}%"
+    rho_matrix = observation_model.get_equipment_matrix(episode, "rho")
+    rho = f"{rho_matrix.iloc[timestep].max() * 100:.0f}%"
     nb_overflows = f"{episode.total_overflow_ts['value'][timestep]:,.0f}"
     losses = f"0"
     return html.Div(
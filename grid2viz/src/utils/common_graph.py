@@ -10,7 +10,8 @@ import numpy as np
 import pandas as pd
 from plotly import graph_objects as go
 
-from grid2viz.src.kpi import EpisodeTrace, observation_model
+from grid2viz.src.kpi import EpisodeTrace, observation_model, time_pyramid
+from grid2viz.src.kpi.action_store import ActionStore
 from grid2viz.src.kpi.actions_model import get_actions_sum
 from grid2viz.src.manager import make_episode
 
@@ -58,7 +59,7 @@ def ts_graph_avail_assets(ts_kind, episode):
     return options, value
 
 
-def environment_ts_data(kind, episode, equipments):
+def environment_ts_data(kind, episode, equipments, x_range=None, level_range=None):
     """
     Get the selected kind of timeserie trace for an equipment used in episode.
 
@@ -72,30 +73,52 @@ def environment_ts_data(kind, episode, equipments):
     :param episode: Episode studied
     :param equipments: A equipment to analyze like substation etc.
     :param prod_types: Different types of production
+    :param x_range: x axis range displayed, the whole episode if None
+    :param level_range: x range to pick the pyramid levels for, x_range if None
     :return: A list of plotly object corresponding to a trace
     """
     if kind == "Load":
-        return EpisodeTrace.get_load_trace_per_equipment(episode, equipments)
+        return EpisodeTrace.get_load_trace_per_equipment(
+            episode, equipments, x_range, level_range
+        )
     if kind == "Production":
         prod_types = episode.get_prod_types()
-        return EpisodeTrace.get_all_prod_trace(episode, prod_types, equipments)
+        return EpisodeTrace.get_all_prod_trace(
+            episode, prod_types, equipments, x_range, level_range
+        )
     if kind == "Hazards":
-        return EpisodeTrace.get_hazard_trace(episode, equipments)
+        return EpisodeTrace.clip_traces(
+            EpisodeTrace.get_hazard_trace(episode, equipments), x_range
+        )
     if kind == "Maintenances":
-        return EpisodeTrace.get_maintenance_trace(episode, equipments)
+        return EpisodeTrace.clip_traces(
+            EpisodeTrace.get_maintenance_trace(episode, equipments), x_range
+        )
 
 
-def agent_overflow_usage_rate_trace(episode, figure_overflow, figure_usage):
+def agent_overflow_usage_rate_trace(
+    episode, figure_overflow, figure_usage, x_range=None, level_range=None
+):
     """
     Get the trace of the overflow and the usage_rate for given episode.
 
     :param episode: Episode studied
     :param figure_overflow: figure which will contain the overflow trace
     :param figure_usage: figure which will contain the usage rate trace
+    :param x_range: x axis range displayed, the whole episode if None
+    :param level_range: x range to pick the pyramid levels for, x_range if None
     :returns: Plotly figure for usage_rate and for overflow
     """
-    figure_overflow["data"] = episode.total_overflow_trace
-    figure_usage["data"] = episode.usage_rate_trace
+    if x_range is None and level_range is None:
+        figure_overflow["data"] = episode.total_overflow_trace
+        figure_usage["data"] = episode.usage_rate_trace
+    else:
+        figure_overflow["data"] = EpisodeTrace.clip_traces(
+            episode.total_overflow_trace, x_range
+        )
+        figure_usage["data"] = EpisodeTrace.get_usage_rate_trace(
+            episode, x_range, level_range
+        )
     return figure_overflow, figure_usage
 
 
@@ -234,7 +257,14 @@ def make_action_trace( agent_name,agent_episode,max_ts,color,graph_type="Reward"
     else:# (graph_type=="Topology")
         action_events_df=topology_trace_event_df(study_action_df, col="is_action")
 
-    action_text = ["<br>-".join(str(act).split("-"))[0:800] for act in agent_episode.actions]
+    def format_action(act):
+        return "<br>-".join(str(act).split("-"))[0:800]
+
+    if isinstance(agent_episode.actions, ActionStore):
+        # only the distinct actions are built and formatted
+        action_text = agent_episode.actions.map(format_action)
+    else:
+        action_text = [format_action(act) for act in agent_episode.actions]
 
     marker_type="Actions"
     action_trace=make_marker_trace(action_events_df.iloc[:max_ts],marker_name=agent_name+" "+marker_type,
@@ -264,7 +294,10 @@ def reward_trace_event_df(agent_episode,col="is_action"):#else is_alarm
     study_action_df = agent_episode.action_data_table
 
     actions_ts = get_actions_sum(study_action_df)
-    study_action_df["is_action"]=(actions_ts["Nb Actions"] > 0).values
+    # the action_data_table of the episode is shared by the callbacks
+    study_action_df = study_action_df.assign(
+        is_action=(actions_ts["Nb Actions"] > 0).values
+    )
 
     reward_event_df = pd.DataFrame(
         index=df["timestep"], data=np.nan, columns=["events"]
@@ -279,7 +312,9 @@ def reward_trace_event_df(agent_episode,col="is_action"):#else is_alarm
 
 def topology_trace_event_df(study_action_df, col="is_action"):
     actions_ts = get_actions_sum(study_action_df)
-    study_action_df["is_action"]=(actions_ts["Nb Actions"] > 0).values
+    study_action_df = study_action_df.assign(
+        is_action=(actions_ts["Nb Actions"] > 0).values
+    )
 
     topology_distance_events_df = pd.DataFrame(
         index=actions_ts.index, data=np.nan, columns=["events"]
@@ -351,7 +386,42 @@ def make_marker_trace( events_df,marker_name,color,text):
     return event_trace
 
 
-def make_action_ts(study_agent, ref_agent, scenario, layout_topology_def=None,layout_dispatch_def=None):
+def make_action_impact_trace(
+    episode, column, name, x_range=None, max_ts=None, level_range=None
+):
+    """
+    Trace of a column of the action_data_table of an episode over x_range,
+    from the level of its action pyramid for that range when there is one.
+
+    :param max_ts: maximum number of timesteps to display, the x range
+    being cut at the last of them for the pyramid levels too
+    :param level_range: x range to pick the pyramid levels for, x_range if None
+    """
+    action_df = episode.action_data_table.iloc[:max_ts]
+    last_timestamp = None
+    if max_ts is not None and len(action_df):
+        last_timestamp = action_df.timestamp.iloc[-1]
+        x_range = (
+            (action_df.timestamp.iloc[0], last_timestamp)
+            if x_range is None
+            else (x_range[0], min(pd.Timestamp(x_range[1]), last_timestamp))
+        )
+    pyramid, level = time_pyramid.get_level(
+        episode, "action_pyramid", x_range, level_range
+    )
+    if level is not None:
+        if last_timestamp is not None:
+            level = level.until(last_timestamp)
+        return EpisodeTrace.get_level_trace(
+            level, pyramid.column_index[column], x_range, name=name
+        )
+    index = time_pyramid.range_slice(action_df.timestamp, x_range)
+    return go.Scatter(
+        x=action_df.timestamp.iloc[index], y=action_df[column].iloc[index], name=name
+    )
+
+
+def make_action_ts(study_agent, ref_agent, scenario, layout_topology_def=None,layout_dispatch_def=None, x_range=None, level_range=None):
     """
     Make the action timeseries trace of study and reference agents.
 
@@ -359,6 +429,8 @@ def make_action_ts(study_agent, ref_agent, scenario, layout_topology_def=None,la
     :param ref_agent: reference agent to compare with
     :param scenario:
     :param layout_def: layout page
+    :param x_range: x axis range displayed, the whole episode if None
+    :param level_range: x range to pick the pyramid levels for, x_range if None
     :return: nb action and distance for each agents
     """
     ref_episode = make_episode(ref_agent, scenario)
@@ -386,16 +458,21 @@ def make_action_ts(study_agent, ref_agent, scenario, layout_topology_def=None,la
     ref_alarm_trace=make_alarm_trace( ref_agent,ref_episode,max_ts,"purple",graph_type="Topology")
 
 
-    topology_distance_trace = go.Scatter(
-        x=study_action_df.timestamp,
-        y=study_action_df["distance"],
-        name=study_agent,
+    action_trace, ref_action_trace = EpisodeTrace.clip_traces(
+        [action_trace, ref_action_trace], x_range
+    )
+    if alarm_trace is not None:
+        alarm_trace, ref_alarm_trace = EpisodeTrace.clip_traces(
+            [alarm_trace, ref_alarm_trace], x_range
+        )
+
+    # every trace is cut at the last timestep of the study agent
+    topology_distance_trace = make_action_impact_trace(
+        study_episode, "distance", study_agent, x_range, max_ts, level_range
     )
 
-    ref_topology_distance_trace = go.Scatter(
-        x=ref_action_df.timestamp[:max_ts],
-        y=ref_action_df["distance"][:max_ts],
-        name=ref_agent,
+    ref_topology_distance_trace = make_action_impact_trace(
+        ref_episode, "distance", ref_agent, x_range, max_ts, level_range
     )
 
     layout_topology_def.update(xaxis=dict(range=[topology_distance_trace.x[0], topology_distance_trace.x[-1]]))
@@ -415,40 +492,28 @@ def make_action_ts(study_agent, ref_agent, scenario, layout_topology_def=None,la
         figure_topology["data"].append(ref_alarm_trace)
 
     #####################
-    dispatch_distance_trace = go.Scatter(
-        x=study_action_df.timestamp,
-        y=study_action_df["redisp_impact"],#.cumsum(),#cumulative redispatchinh over time
-        name=study_agent+"dispatch",
+    dispatch_distance_trace = make_action_impact_trace(
+        study_episode, "redisp_impact", study_agent+"dispatch", x_range, max_ts, level_range
     )
 
-    curtail_distance_trace = go.Scatter(
-        x=study_action_df.timestamp,
-        y=study_action_df["curtail_impact"],#.cumsum(),
-        name=study_agent+"curtail",
+    curtail_distance_trace = make_action_impact_trace(
+        study_episode, "curtail_impact", study_agent+"curtail", x_range, max_ts, level_range
     )
 
-    storage_distance_trace = go.Scatter(
-        x=study_action_df.timestamp,
-        y=study_action_df["storage_impact"],  # .cumsum(),#cumulative redispatchinh over time
-        name=study_agent+"storage",
+    storage_distance_trace = make_action_impact_trace(
+        study_episode, "storage_impact", study_agent+"storage", x_range, max_ts, level_range
     )
 
-    ref_dispatch_distance_trace = go.Scatter(
-        x=ref_action_df.timestamp,
-        y=ref_action_df["redisp_impact"],#.cumsum(),#cumulative redispatchinh over time
-        name=ref_agent+"dispatch",
+    ref_dispatch_distance_trace = make_action_impact_trace(
+        ref_episode, "redisp_impact", ref_agent+"dispatch", x_range, max_ts, level_range
     )
 
-    ref_curtail_distance_trace = go.Scatter(
-        x=ref_action_df.timestamp,
-        y=ref_action_df["curtail_impact"],#.cumsum(),
-        name=ref_agent+"curtail",
+    ref_curtail_distance_trace = make_action_impact_trace(
+        ref_episode, "curtail_impact", ref_agent+"curtail", x_range, max_ts, level_range
     )
 
-    ref_storage_distance_trace = go.Scatter(
-        x=ref_action_df.timestamp,
-        y=ref_action_df["storage_impact"],#.cumsum(),#cumulative redispatchinh over time
-        name=ref_agent+"storage",
+    ref_storage_distance_trace = make_action_impact_trace(
+        ref_episode, "storage_impact", ref_agent+"storage", x_range, max_ts, level_range
     )
 
     #layout_dispatch_def.update(xaxis=dict(range=[dispatch_distance_trace.x[0], dispatch_distance_trace.x[-1]]))
@@ -470,7 +535,13 @@ def make_action_ts(study_agent, ref_agent, scenario, layout_topology_def=None,la
 
 
 def make_rewards_ts(
-    study_agent, ref_agent, scenario, reward_figure, cumulative_reward_figure
+    study_agent,
+    ref_agent,
+    scenario,
+    reward_figure,
+    cumulative_reward_figure,
+    x_range=None,
+    level_range=None,
 ):
     """
     Make kpi with rewards and cumulated reward for both reference agent and study agent.
@@ -479,6 +550,8 @@ def make_rewards_ts(
     :param ref_agent: agent to compare with
     :param scenario:
     :param layout: display configuration
+    :param x_range: x axis range displayed, the whole episode if None
+    :param level_range: x range to pick the pyramid levels for, x_range if None
     :return: rewards and cumulated rewards for each agents
     """
     study_episode = make_episode(study_agent, scenario)
@@ -493,11 +566,23 @@ def make_rewards_ts(
     alarm_trace=make_alarm_trace( study_agent,study_episode,max_ts,"orange",graph_type="Reward")
 
     # create reward traces
-    ref_reward_trace, ref_reward_cum_trace = ref_episode.reward_trace
-    (
-        studied_agent_reward_trace,
-        studied_agent_reward_cum_trace,
-    ) = study_episode.reward_trace
+    if x_range is None and level_range is None:
+        ref_reward_trace, ref_reward_cum_trace = ref_episode.reward_trace
+        (
+            studied_agent_reward_trace,
+            studied_agent_reward_cum_trace,
+        ) = study_episode.reward_trace
+    else:
+        (action_trace,) = EpisodeTrace.clip_traces([action_trace], x_range)
+        if alarm_trace is not None:
+            (alarm_trace,) = EpisodeTrace.clip_traces([alarm_trace], x_range)
+        ref_reward_trace, ref_reward_cum_trace = EpisodeTrace.get_df_rewards_trace(
+            ref_episode, x_range, level_range
+        )
+        (
+            studied_agent_reward_trace,
+            studied_agent_reward_cum_trace,
+        ) = EpisodeTrace.get_df_rewards_trace(study_episode, x_range, level_range)
 
     #reward_figure["data"] = [ref_reward_trace, studied_agent_reward_trace, action_trace]
     #if ("is_alarm" in study_episode.action_data_table.columns):
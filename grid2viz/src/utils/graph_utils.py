@@ -118,6 +118,16 @@ def get_axis_relayout(figure, relayout_data):
         return res
 
 
+def get_x_range(relayout_data):
+    """
+    (xmin, xmax) of the x axis range of a relayoutData, None when the x axis is
+    reset to its whole range.
+    """
+    if relayout_data and "xaxis.range[0]" in relayout_data:
+        return relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+    return None
+
+
 layout_def = {
     "legend": {"orientation": "h"},
     "margin": {"l": 0, "r": 0, "t": 0, "b": 0},
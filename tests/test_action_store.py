@@ -0,0 +1,49 @@
+import os
+import pathlib
+import pickle
+import unittest
+
+# We need to make this below so that the manager.py finds the config.ini
+os.environ["GRID2VIZ_ROOT"] = os.path.join(
+    pathlib.Path(__file__).parent.absolute(), "data"
+)
+
+agents_path = os.path.join(pathlib.Path(__file__).parent.absolute(), "data", "agents")
+
+from grid2op.Episode.EpisodeData import EpisodeData
+from grid2viz.src.kpi.action_store import ActionStore
+from grid2viz.src.kpi.episode_reader import EpisodeReader
+
+
+class TestActionStore(unittest.TestCase):
+    def setUp(self):
+        agent_path = os.path.join(agents_path, "multiTopology-baseline")
+        self.episode_data = EpisodeData.from_disk(agent_path, "000")
+        self.store = ActionStore.from_episode_data(EpisodeReader(agent_path, "000"))
+
+    def test_same_ids_as_equality_search(self):
+        distinct = []
+        expected_ids = []
+        for act in self.episode_data.actions:
+            for idx, other in enumerate(distinct):
+                if act == other:
+                    expected_ids.append(idx)
+                    break
+            else:
+                distinct.append(act)
+                expected_ids.append(len(distinct) - 1)
+
+        self.assertEqual(len(self.store), len(self.episode_data.actions))
+        self.assertEqual(self.store.nb_distinct, len(distinct))
+        self.assertListEqual(self.store.ids.tolist(), expected_ids)
+        self.assertEqual(self.store.find(distinct[2].to_vect()), 2)
+
+    def test_actions_built_when_indexed(self):
+        self.assertEqual(self.store[3], self.episode_data.actions[3])
+        texts = self.store.map(str)
+        self.assertEqual(texts[3], str(self.episode_data.actions[3]))
+
+        # the space and the index are found again after pickling
+        store = pickle.loads(pickle.dumps(self.store))
+        self.assertEqual(store[-1], self.store[-1])
+        self.assertEqual(store.find(self.store.vectors[1]), 1)
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from grid2viz.src.cache import locking
+
+
+class TestCacheLocking(unittest.TestCase):
+    def test_atomic_file_keeps_previous_content_on_error(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "entry.dill.bz")
+            with locking.atomic_file(path) as tmp_path:
+                with open(tmp_path, "w") as f:
+                    f.write("first")
+
+            with self.assertRaises(RuntimeError):
+                with locking.atomic_file(path) as tmp_path:
+                    with open(tmp_path, "w") as f:
+                        f.write("trunc")
+                    raise RuntimeError("interrupted")
+
+            with open(path) as f:
+                self.assertEqual(f.read(), "first")
+            self.assertListEqual(os.listdir(tmp_dir), ["entry.dill.bz"])
+
+    def test_atomic_directory_replaces_previous_one(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "agent")
+            for content in ["first", "second"]:
+                with locking.atomic_directory(path) as tmp_path:
+                    with open(os.path.join(tmp_path, content), "w") as f:
+                        f.write(content)
+            self.assertListEqual(os.listdir(path), ["second"])
+            self.assertListEqual(os.listdir(tmp_dir), ["agent"])
+
+    @unittest.skipIf(locking.fcntl is None, "no advisory locks on this platform")
+    def test_exclusive_lock_waits_for_readers(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lock_path = os.path.join(tmp_dir, "000", "agent.lock")
+            events = []
+
+            def write():
+                with locking.entry_lock(lock_path):
+                    events.append("write")
+
+            with locking.entry_lock(lock_path, shared=True):
+                with locking.entry_lock(lock_path, shared=True):
+                    writer = threading.Thread(target=write)
+                    writer.start()
+                    time.sleep(0.2)
+                    events.append("read")
+            writer.join()
+            self.assertListEqual(events, ["read", "write"])
@@ -1,6 +1,10 @@
 import os
 import pathlib
 import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
 
 # We need to make this below so that the manager.py finds the config.ini
 os.environ["GRID2VIZ_ROOT"] = os.path.join(
@@ -12,8 +16,20 @@ agents_path = os.path.join(pathlib.Path(__file__).parent.absolute(), "data", "ag
 config_file_path = os.path.join(os.environ["GRID2VIZ_ROOT"], "config.ini")
 
 from grid2op.Episode.EpisodeData import EpisodeData
+from grid2viz.src.kpi import EpisodeTrace, time_pyramid
 from grid2viz.src.kpi.EpisodeAnalytics import EpisodeAnalytics
-from grid2viz.src.kpi.actions_model import get_action_per_line, get_action_per_sub
+from grid2viz.src.kpi.episode_reader import EpisodeReader
+from grid2viz.src.kpi.actions_model import (
+    get_action_per_line,
+    get_action_per_sub,
+    timesteps_modifying,
+)
+from grid2viz.src.kpi.observation_model import (
+    get_equipment_matrix,
+    get_usage_rate,
+    wide_format,
+)
+from grid2viz.src.kpi.quantization import parse_storage_policy
 
 
 class TestEpisodeAnalytics(unittest.TestCase):
@@ -44,6 +60,188 @@ class TestEpisodeAnalytics(unittest.TestCase):
             self.episode_analytics.action_data_table.distance[37:40].tolist(), [2, 2, 3]
         )
 
+    def test_overflows(self):
+        total_overflow_ts = self.episode_analytics.total_overflow_ts
+        self.assertEqual(total_overflow_ts["value"].sum(), 2218)
+        for time_step in [0, 100, 1000]:
+            ov = self.episode_data.observations[time_step].timestep_overflow
+            self.assertEqual(total_overflow_ts["value"][time_step], (ov > 0).sum())
+            self.assertListEqual(
+                total_overflow_ts["line_ids"][time_step],
+                [i for i in range(len(ov)) if ov[i] == 1],
+            )
+        self.assertListEqual(
+            self.episode_analytics.overflow_line_ids.tolist(),
+            total_overflow_ts["line_ids"].tolist(),
+        )
+
+    def test_usage_rate(self):
+        rho = self.episode_analytics.rho.astype({"value": float})
+        expected = rho.groupby("timestamp")["value"].quantile([0.1, 0.5, 0.9])
+        usage_rate = get_usage_rate(self.episode_analytics)
+        for stat, quantile in [("quantile10", 0.1), ("median", 0.5), ("quantile90", 0.9)]:
+            np.testing.assert_allclose(
+                usage_rate["value"][stat], expected.xs(quantile, level=1)
+            )
+        np.testing.assert_allclose(
+            usage_rate["value"]["max"], rho.groupby("timestamp")["value"].max()
+        )
+
+    def test_time_series_pyramids(self):
+        load = self.episode_analytics.load_matrix.astype(float)
+        pyramid = self.episode_analytics.load_pyramid
+        hour = pyramid.levels[0]
+        self.assertEqual(hour.resolution, "hour")
+        np.testing.assert_allclose(
+            hour.max[:, pyramid.column_index["total"]],
+            load.sum(axis=1).resample("60min").max(),
+            rtol=1e-5,
+        )
+        # a week of 5 minutes timesteps is plotted as it is
+        self.assertIsNone(pyramid.level_for())
+        self.assertIs(pyramid.level_for(min_points=100), hour)
+
+        x_range = (str(load.index[100]), str(load.index[199]))
+        traces = EpisodeTrace.get_usage_rate_trace(self.episode_analytics, x_range)
+        np.testing.assert_array_equal(
+            pd.DatetimeIndex(traces[0].x).values, load.index[100:200].values
+        )
+        # a level range alone does not clip the traces
+        traces = EpisodeTrace.get_usage_rate_trace(
+            self.episode_analytics, level_range=x_range
+        )
+        np.testing.assert_array_equal(
+            pd.DatetimeIndex(traces[0].x).values, load.index.values
+        )
+        usage_rate = self.episode_analytics.usage_rate_pyramid
+        self.assertListEqual(
+            list(usage_rate.columns), list(EpisodeTrace.USAGE_RATE_AGGREGATES)
+        )
+
+    def test_action_impact_trace(self):
+        from grid2viz.src.utils.common_graph import make_action_impact_trace
+
+        episode = self.episode_analytics
+        timestamps = episode.action_data_table.timestamp
+        trace = make_action_impact_trace(episode, "distance", "agent", max_ts=100)
+        np.testing.assert_array_equal(
+            pd.DatetimeIndex(trace.x).values, timestamps[:100].values
+        )
+        # the pyramid levels are cut at max_ts too
+        pyramid = episode.action_pyramid
+        with mock.patch.object(
+            time_pyramid,
+            "get_level",
+            lambda episode, name, x_range, level_range=None: (
+                pyramid,
+                pyramid.level_for(x_range, min_points=2),
+            ),
+        ):
+            trace = make_action_impact_trace(episode, "distance", "agent", max_ts=100)
+        self.assertLessEqual(pd.Timestamp(trace.x[-1]), timestamps[99])
+        self.assertLess(len(trace.x), 100)
+
+    def test_inspection_table(self):
+        from grid2viz.src.overview.overview_clbk import inspection_table
+
+        columns, records = inspection_table(
+            self.episode_analytics, None, None, None, None, None
+        )
+        self.assertListEqual(
+            [column["id"] for column in columns],
+            ["timestamp", "hazards", "maintenances", "IsWorkingDay"],
+        )
+        self.assertEqual(len(records), len(self.episode_analytics.timestamps))
+
+        load_name = self.episode_data.load_names[0]
+        prod_name = self.episode_data.prod_names[0]
+        columns, records = inspection_table(
+            self.episode_analytics, [load_name], [prod_name], "2019-01-06", None, []
+        )
+        self.assertListEqual(
+            [column["id"] for column in columns][-2:], [load_name, prod_name]
+        )
+        self.assertTrue(
+            all(record["timestamp"] >= pd.Timestamp("2019-01-06") for record in records)
+        )
+        self.assertEqual(
+            records[0][load_name],
+            get_equipment_matrix(self.episode_analytics, "load").loc[
+                records[0]["timestamp"], load_name
+            ],
+        )
+
+    def test_equipment_matrices(self):
+        rho_matrix = self.episode_analytics.rho_matrix
+        self.assertEqual(rho_matrix.shape, (2000, self.episode_data.n_lines))
+        self.assertListEqual(
+            list(rho_matrix.columns), list(self.episode_data.line_names)
+        )
+        np.testing.assert_array_equal(
+            rho_matrix.iloc[100], self.episode_data.observations[100].rho
+        )
+        obs = self.episode_data.observations[100]
+        line_flows = self.episode_analytics.line_flows
+        np.testing.assert_array_equal(
+            line_flows.values[100, 0, 0], obs.p_or
+        )
+        np.testing.assert_array_equal(
+            line_flows.series("ex", "voltage", obs.name_line[3]),
+            self.episode_analytics.flow_and_voltage_line["ex"]["voltage"][obs.name_line[3]],
+        )
+        for kind in ["load", "production", "rho"]:
+            matrix = getattr(self.episode_analytics, kind + "_matrix")
+            long_frame = getattr(self.episode_analytics, kind)
+            self.assertEqual(len(long_frame), matrix.size)
+            # the long format rho only has the ids of the lines
+            wide = wide_format(long_frame, kind).set_axis(matrix.columns, axis=1)
+            pd.testing.assert_frame_equal(wide, matrix)
+
+    def test_derived_frames(self):
+        episode = self.episode_analytics
+        rho = episode.rho
+        self.assertIs(episode.rho, rho)
+        self.assertIs(episode.total_overflow_ts, episode.total_overflow_ts)
+        self.assertNotIn("rho", episode.__getstate__())
+        self.assertNotIn("_derived_frames", episode.__getstate__())
+        # rebuilt from the optimized matrix
+        episode.optimize_memory_footprint()
+        self.assertIsNot(episode.rho, rho)
+        self.assertEqual(len(episode.rho), len(rho))
+
+    def test_action_data_table_cache(self):
+        episode = self.episode_analytics
+        table = episode.action_data_table
+        self.assertIs(episode.action_data_table, table)
+        # rebuilt when one of its sources is replaced
+        episode.action_lists = dict(episode.action_lists)
+        self.assertIsNot(episode.action_data_table, table)
+        pd.testing.assert_frame_equal(episode.action_data_table, table)
+
+    def test_storage_policy(self):
+        episode = self.episode_analytics
+        rho_matrix = episode.rho_matrix
+        voltages = episode.line_flows.series("or", "voltage", "0_1_0").copy()
+        episode.optimize_memory_footprint(
+            storage_policy=parse_storage_policy(
+                "rho:uint16:1e-4,load:float32,flows:int32:1e-2"
+            )
+        )
+        errors = episode.quantization_errors
+        self.assertEqual(errors["rho"]["storage"], "uint16:0.0001")
+        self.assertLessEqual(errors["rho"]["max_abs_error"], 5e-5 + 1e-6)
+        self.assertEqual(errors["load"]["max_abs_error"], 0)
+        self.assertEqual(errors["production"]["storage"], "float16")
+        self.assertLessEqual(errors["flows"]["max_abs_error"], 5e-3 + 1e-3)
+
+        np.testing.assert_allclose(
+            get_equipment_matrix(episode, "rho"), rho_matrix, atol=1e-4
+        )
+        self.assertEqual(len(episode.rho), rho_matrix.size)
+        np.testing.assert_allclose(
+            episode.line_flows.series("or", "voltage", "0_1_0"), voltages, atol=1e-2
+        )
+
     def test_action_repartition(self):
         nb_actions = self.episode_analytics.action_data_table[
             ["action_line", "action_subs"]
@@ -91,15 +289,63 @@ class TestEpisodeAnalytics(unittest.TestCase):
         self.assertListEqual(action_per_sub[0].y.tolist(), [19, 19])
         self.assertListEqual(action_per_line[0].x.tolist(), ["3_6_15", "9_10_12"])
         self.assertListEqual(action_per_line[0].y.tolist(), [13, 12])
+        self.assertListEqual(
+            timesteps_modifying(self.episode_analytics, "subs_modified", "sub_3")[
+                :5
+            ].tolist(),
+            [1, 2, 3, 4, 7],
+        )
+        self.assertListEqual(
+            self.episode_analytics.action_data_table.subs_modified[1], ["sub_3"]
+        )
 
         self.assertListEqual(
             self.episode_analytics.action_data_table.action_id[:5].tolist(),
             [0, 1, 1, 2, 3],
         )
+        # line 3_6_15 is disconnected after the first action and reconnected by
+        # the second one setting its bus: the observed distance sees it, the
+        # replay of the actions misses it. This is the only difference between
+        # both, the lines disconnected by the environment being left out of
+        # the observed distance as they are out of the replayed one.
         self.assertListEqual(
             self.episode_analytics.action_data_table.distance[:5].tolist(),
-            [1, 2, 2, 0, 3],
+            [1, 1, 1, 0, 3],
         )
+        replay = EpisodeAnalytics(
+            self.episode_data, self.scenario_name, self.agent_name, distance="replay"
+        )
+        self.assertListEqual(
+            replay.action_data_table.distance[:5].tolist(), [1, 2, 2, 0, 3]
+        )
+
+    def test_observed_distance_without_env_disconnections(self):
+        reader = EpisodeReader(
+            os.path.join(self.agents_path, "do-nothing-baseline"), self.scenario_name
+        )
+        line_status = reader.observation_matrix("line_status").copy()
+        # line 0 in maintenance after the action 3 until it is reconnected,
+        # line 1 disconnected after the actions 3 and 4 by something else
+        line_status[4:9, 0] = 0
+        line_status[4:6, 1] = 0
+        maintenance = np.zeros((len(reader.actions), reader.n_lines), dtype=bool)
+        maintenance[3, 0] = True
+        observation_matrix = reader.observation_matrix
+        with mock.patch.object(
+            reader,
+            "observation_matrix",
+            lambda attribute: line_status
+            if attribute == "line_status"
+            else observation_matrix(attribute),
+        ), mock.patch.object(
+            reader,
+            "env_modification_matrix",
+            lambda attribute: maintenance
+            if attribute == "_maintenance"
+            else np.zeros_like(maintenance),
+        ):
+            distances = self.episode_analytics.get_topology_distances(reader, 10)
+        self.assertListEqual(distances.tolist(), [0, 0, 0, 1, 1, 0, 0, 0, 0, 0])
 
     def test_alarm(self):
         self.agent_name = "alarm-baseline"
@@ -118,4 +364,36 @@ class TestEpisodeAnalytics(unittest.TestCase):
         action_data_table=self.episode_analytics.action_data_table
 
         assert(action_data_table.is_alarm[action_data_table.is_alarm==True].count()==2)
-        assert(action_data_table.alarm_zone[2][0]=="whole_grid")
\ No newline at end of file
+        assert(action_data_table.alarm_zone[2][0]=="whole_grid")
+
+    def test_ingestion_engines(self):
+        self.agent_name = "multiTopology-baseline"
+        self.episode_data = EpisodeData.from_disk(
+            os.path.join(self.agents_path, self.agent_name), self.scenario_name
+        )
+        columnar = EpisodeAnalytics(
+            self.episode_data, self.scenario_name, self.agent_name, engine="columnar"
+        )
+        loop = EpisodeAnalytics(
+            self.episode_data, self.scenario_name, self.agent_name, engine="loop"
+        )
+
+        np.testing.assert_array_equal(
+            columnar.line_flows.values, loop.line_flows.values
+        )
+        for attribute in ["load_matrix", "production_matrix", "rho_matrix",
+                          "load", "production", "rho", "flow_and_voltage_line",
+                          "target_redispatch", "actual_redispatch", "attacks_data_table"]:
+            pd.testing.assert_frame_equal(
+                getattr(columnar, attribute), getattr(loop, attribute), check_dtype=False
+            )
+        pd.testing.assert_frame_equal(
+            columnar.action_data_table,
+            loop.action_data_table,
+        )
+        self.assertListEqual(columnar.timestamps, loop.timestamps)
+
+        with self.assertRaises(ValueError):
+            EpisodeAnalytics(
+                self.episode_data, self.scenario_name, self.agent_name, engine="unknown"
+            )
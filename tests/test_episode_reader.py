@@ -0,0 +1,102 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# We need to make this below so that the manager.py finds the config.ini
+os.environ["GRID2VIZ_ROOT"] = os.path.join(
+    pathlib.Path(__file__).parent.absolute(), "data"
+)
+
+agents_path = os.path.join(pathlib.Path(__file__).parent.absolute(), "data", "agents")
+
+from grid2op.Episode.EpisodeData import EpisodeData
+from grid2viz.src.kpi import episode_reader
+from grid2viz.src.kpi.EpisodeAnalytics import EpisodeAnalytics
+from grid2viz.src.kpi.episode_reader import EpisodeReader, load_npz_array
+
+
+class TestEpisodeReader(unittest.TestCase):
+    def setUp(self):
+        self.agent_path = os.path.join(agents_path, "multiTopology-baseline")
+        self.scenario_name = "000"
+        self.episode_data = EpisodeData.from_disk(self.agent_path, self.scenario_name)
+        self.episode_reader = EpisodeReader(self.agent_path, self.scenario_name)
+
+    def test_same_content_as_episode_data(self):
+        self.assertEqual(
+            len(self.episode_reader.actions), len(self.episode_data.actions)
+        )
+        self.assertEqual(
+            len(self.episode_reader.observations), len(self.episode_data.observations)
+        )
+        self.assertListEqual(
+            list(self.episode_reader.line_names), list(self.episode_data.line_names)
+        )
+
+        for attribute in ["rho", "prod_p", "topo_vect", "line_status"]:
+            expected = np.array(
+                [getattr(obs, attribute) for obs in self.episode_data.observations]
+            )
+            np.testing.assert_array_equal(
+                self.episode_reader.observation_matrix(attribute), expected
+            )
+
+        self.assertEqual(self.episode_reader.actions[3], self.episode_data.actions[3])
+        np.testing.assert_array_equal(
+            self.episode_reader.env_modification_matrix("_maintenance"),
+            np.array([env_act._maintenance for env_act in self.episode_data.env_actions]),
+        )
+
+    def test_objects_not_kept(self):
+        observations = self.episode_reader.observations
+        for obs in observations:
+            pass
+        self.assertEqual(
+            len(observations._materialized), episode_reader.MATERIALIZED_CACHE_SIZE
+        )
+        # built again when accessed after being dropped
+        np.testing.assert_array_equal(
+            observations[0].rho, self.episode_data.observations[0].rho
+        )
+
+    def test_same_analytics_as_episode_data(self):
+        for agent_name in ["multiTopology-baseline", "alarm-baseline"]:
+            agent_path = os.path.join(agents_path, agent_name)
+            from_reader = EpisodeAnalytics(
+                EpisodeReader(agent_path, self.scenario_name),
+                self.scenario_name,
+                agent_name,
+            )
+            from_episode_data = EpisodeAnalytics(
+                EpisodeData.from_disk(agent_path, self.scenario_name),
+                self.scenario_name,
+                agent_name,
+            )
+            pd.testing.assert_frame_equal(
+                from_reader.action_data_table,
+                from_episode_data.action_data_table,
+            )
+            pd.testing.assert_frame_equal(
+                from_reader.attacks_data_table, from_episode_data.attacks_data_table
+            )
+
+    def test_memory_mapped_when_uncompressed(self):
+        data = np.arange(12, dtype=np.float32).reshape(3, 4)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stored = os.path.join(tmp_dir, "stored.npz")
+            np.savez(stored, data=data)
+            compressed = os.path.join(tmp_dir, "compressed.npz")
+            np.savez_compressed(compressed, data=data)
+
+            mapped = load_npz_array(stored)
+            self.assertIsInstance(mapped, np.memmap)
+            np.testing.assert_array_equal(mapped, data)
+            del mapped
+
+            loaded = load_npz_array(compressed)
+            self.assertNotIsInstance(loaded, np.memmap)
+            np.testing.assert_array_equal(loaded, data)
@@ -0,0 +1,86 @@
+import datetime as dt
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from grid2viz.src.kpi import env_actions as env_actions_module
+from grid2viz.src.kpi.env_actions import count_starts, env_actions
+from grid2viz.src.kpi.line_events import LineEvents
+
+
+class TestLineEvents(unittest.TestCase):
+    def setUp(self):
+        self.line_names = np.array(["line_b", "line_a", "line_c"])
+        self.mask = np.zeros((8, 3), dtype=bool)
+        self.mask[0:2, 0] = True
+        self.mask[5:8, 0] = True
+        self.mask[3, 2] = True
+        self.events = LineEvents.from_mask(self.mask, self.line_names)
+        self.timestamps = [
+            dt.datetime(2019, 1, 1) + dt.timedelta(minutes=5 * i) for i in range(8)
+        ]
+
+    def test_intervals(self):
+        self.assertEqual(len(self.events), 3)
+        intervals = self.events.intervals()
+        self.assertListEqual(intervals.line_name.tolist(), ["line_b", "line_b", "line_c"])
+        self.assertListEqual(intervals.start.tolist(), [0, 5, 3])
+        self.assertListEqual(intervals.end.tolist(), [2, 8, 4])
+        np.testing.assert_array_equal(self.events.mask(), self.mask)
+
+    def test_dense_views(self):
+        dense = self.events.dense(self.timestamps)
+        self.assertEqual(len(dense), 8 * 3)
+        self.assertListEqual(
+            list(dense.columns), ["value", "timestep", "timestamp", "line_name", "line_id"]
+        )
+        np.testing.assert_array_equal(dense.value.values, self.mask.ravel())
+
+        # the wide view is the pivot of the long format one
+        pivoted = pd.pivot_table(
+            dense.astype({"value": int, "line_name": str, "timestamp": "datetime64[ns]"}),
+            index="timestamp",
+            columns="line_name",
+            values="value",
+        )
+        wide = self.events.wide(self.timestamps)
+        np.testing.assert_array_equal(wide.values, pivoted.values)
+        self.assertListEqual(list(wide.columns), list(pivoted.columns))
+
+    def test_counts(self):
+        episode = Episode(self.events, self.timestamps)
+        self.assertEqual(env_actions(episode, which="maintenances", kind="nb"), 3)
+        self.assertListEqual(
+            env_actions(episode, which="maintenances", kind="nb", aggr=False).tolist(),
+            [0, 2, 1],
+        )
+        self.assertEqual(env_actions(episode, which="maintenances", kind="dur").sum(), 6)
+        self.assertIn(
+            ("maintenances", "nb", True), env_actions_module._results[episode]
+        )
+
+        # computed again once the events are replaced
+        mask = self.mask.copy()
+        mask[6, 1] = True
+        episode.maintenance_events = LineEvents.from_mask(mask, self.line_names)
+        self.assertEqual(env_actions(episode, which="maintenances", kind="nb"), 4)
+        self.assertEqual(env_actions(episode, which="maintenances", kind="dur").sum(), 7)
+
+        # same counts as going through the timesteps one by one
+        wide = self.events.wide(self.timestamps)
+        expected = [
+            sum(
+                1
+                for i in range(len(wide))
+                if wide[line].iloc[i] == 1 and (i == 0 or wide[line].iloc[i - 1] == 0)
+            )
+            for line in wide.columns
+        ]
+        self.assertListEqual(count_starts(wide).tolist(), expected)
+
+
+class Episode:
+    def __init__(self, maintenance_events, timestamps):
+        self.maintenance_events = maintenance_events
+        self.timestamps = timestamps
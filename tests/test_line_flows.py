@@ -0,0 +1,66 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from grid2viz.src.kpi.line_flows import OBS_ATTRIBUTES, LineFlows, line_flows
+from grid2viz.src.kpi.quantization import QuantizedArray, Storage
+
+
+class TestLineFlows(unittest.TestCase):
+    def setUp(self):
+        self.line_names = np.array(["line_a", "line_b", "line_c"])
+        # a different value for each attribute, timestep and line
+        self.stacked = {
+            attribute: 100 * i + np.arange(12, dtype=np.float32).reshape(4, 3)
+            for i, attribute in enumerate(sorted(set(OBS_ATTRIBUTES.values())))
+        }
+        self.flows = LineFlows.from_stacked(self.stacked, self.line_names)
+
+    def test_series(self):
+        self.assertEqual(self.flows.values.shape, (4, 2, 4, 3))
+        self.assertEqual(self.flows.values.dtype, np.float32)
+        np.testing.assert_array_equal(
+            self.flows.series("or", "active", "line_b"), self.stacked["p_or"][:, 1]
+        )
+        np.testing.assert_array_equal(
+            self.flows.series("ex", "voltage", "line_c"), self.stacked["v_ex"][:, 2]
+        )
+        self.assertTrue(
+            np.shares_memory(self.flows.series("ex", "current", "line_a"), self.flows.values)
+        )
+
+    def test_frame(self):
+        frame = self.flows.to_frame()
+        self.assertEqual(frame.shape, (4, 2 * 4 * 3))
+        np.testing.assert_array_equal(
+            frame["or"]["reactive"]["line_a"], self.stacked["q_or"][:, 0]
+        )
+
+        class Episode:
+            flow_and_voltage_line = frame
+
+        # episodes cached with the dataframe only
+        flows = line_flows(Episode())
+        np.testing.assert_array_equal(flows.values, self.flows.values)
+        self.assertListEqual(list(flows.line_names), list(self.line_names))
+
+    def test_quantized(self):
+        flows = self.flows.stored_as(Storage.parse("int32:0.5"))
+        self.assertIsInstance(flows.values, QuantizedArray)
+        np.testing.assert_array_equal(
+            flows.series("ex", "voltage", "line_c"), self.stacked["v_ex"][:, 2]
+        )
+        np.testing.assert_array_equal(flows.to_frame(), self.flows.to_frame())
+        self.assertIs(self.flows.stored_as(Storage.parse("float32")), self.flows)
+
+    def test_pickle(self):
+        flows = pickle.loads(pickle.dumps(self.flows))
+        np.testing.assert_array_equal(
+            flows.series("ex", "active", "line_b"),
+            self.flows.series("ex", "active", "line_b"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,24 @@
+import gc
+import gzip
+import json
 import os
 import pathlib
+import pickle
 import shutil
 import subprocess
+import tempfile
+import threading
 import unittest
-from grid2viz.src.manager import make_cache,scenarios,agents,n_cores,cache_dir,get_from_fs_cache
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from grid2op.Episode.EpisodeData import EpisodeData
+from grid2viz.src.cache import columnar, manifest, scheduling
+from grid2viz.src.kpi.EpisodeAnalytics import EpisodeAnalytics
+from grid2viz.src import manager
+from grid2viz.src.manager import make_cache,scenarios,agents,n_cores,cache_dir,get_from_fs_cache,migrate_fs_cache,is_fs_cache_fresh
 
 
 # We need to make this below so that the manager.py finds the config.ini
@@ -19,22 +34,33 @@ class TestMakeCache(unittest.TestCase):
     def setUp(self):
         self.agent_path = agents_path
         self.agent="greedy-baseline"
-        for scenario in ["000","001"]:
-            cache_file_path=os.path.join(self.agent_path, "_cache", scenario,self.agent+".dill")
-            if os.path.exists(cache_file_path):
-                os.remove(cache_file_path)
-            if os.path.exists(cache_file_path+".bz"):
-                os.remove(cache_file_path+".bz")
-        #if os.path.isdir(os.path.join(self.agent_path, "_cache")):
-        #    shutil.rmtree(os.path.join(self.agent_path, "_cache"))
 
     def test_make_cache(self):
-        print(self.agent_path)
-        try:
-            make_cache(scenarios,agents,n_cores,cache_dir,agent_selection=[self.agent])#to run the test quicker
-        except Exception as e:
-            print(e)
-            assert(False)
+        # built from a copy of the agent logs, in a temporary cache, so that
+        # the cache fixtures of tests/data are left untouched
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_agents_dir = os.path.join(tmp_dir, "agents")
+            shutil.copytree(
+                os.path.join(self.agent_path, self.agent),
+                os.path.join(tmp_agents_dir, self.agent),
+            )
+            tmp_cache_dir = os.path.join(tmp_agents_dir, "_cache")
+            with mock.patch.object(
+                manager, "agents_dir", tmp_agents_dir
+            ), mock.patch.object(manager, "cache_dir", tmp_cache_dir):
+                failures = make_cache(
+                    scenarios, agents, n_cores, tmp_cache_dir,
+                    agent_selection=[self.agent],  # to run the test quicker
+                )
+                self.assertListEqual(failures, [])
+
+                for scenario in ["000","001"]:
+                    self.assertTrue(is_fs_cache_fresh(scenario, self.agent))
+
+                # entries are saved with the compact dtypes
+                episode = get_from_fs_cache("000", self.agent)
+                self.assertEqual(episode.rho.value.dtype, np.float16)
+                self.assertEqual(episode.observations.matrix("rho").dtype, np.float16)
 
         #try to load one then
         #don't try it on circleci as we might not have had the rights to write the dill.file
@@ -53,3 +79,209 @@ class TestMakeCache(unittest.TestCase):
         #self.assertEqual(rv.returncode, 0)
         #self.assertEqual(rv, 0)
 
+    def test_migrate_to_columnar_cache(self):
+        agent = "multiTopology-baseline"
+        with tempfile.TemporaryDirectory() as tmp_cache_dir:
+            os.makedirs(os.path.join(tmp_cache_dir, "000"))
+            pickle_path = os.path.join(tmp_cache_dir, "000", agent + ".dill.bz")
+            shutil.copy(
+                os.path.join(self.agent_path, "_cache", "000", agent + ".dill.bz"),
+                pickle_path,
+            )
+            with gzip.open(pickle_path, "rb") as f:
+                expected = pickle.load(f)
+
+            migrate_fs_cache(tmp_cache_dir)
+
+            self.assertFalse(os.path.exists(pickle_path))
+            entry_dir = os.path.join(tmp_cache_dir, "000", agent)
+            episode = columnar.load_episode(entry_dir, EpisodeAnalytics)
+            self.assertSetEqual(set(vars(episode)), set(vars(expected)))
+            for name, value in vars(expected).items():
+                if isinstance(value, pd.DataFrame):
+                    pd.testing.assert_frame_equal(getattr(episode, name), value)
+            self.assertEqual(len(episode.observations), len(expected.observations))
+
+            rho = columnar.load_attribute(entry_dir, "rho", mmap_mode="r")
+            np.testing.assert_array_equal(rho.value.values, expected.rho.value.values)
+
+            lazy_episode = columnar.load_episode(entry_dir, EpisodeAnalytics, lazy=True)
+            self.assertListEqual(lazy_episode.loaded_attributes(), [])
+            pd.testing.assert_frame_equal(lazy_episode.rho, expected.rho)
+            self.assertListEqual(lazy_episode.loaded_attributes(), ["rho"])
+            self.assertListEqual(lazy_episode.release_attributes(), ["rho"])
+            self.assertNotIn("rho", vars(lazy_episode))
+            self.assertIn("rho", dir(lazy_episode))
+
+    def migrated_entry(self, tmp_cache_dir, agent="multiTopology-baseline"):
+        """Columnar entry of the cached episode of agent in tmp_cache_dir"""
+        os.makedirs(os.path.join(tmp_cache_dir, "000"))
+        shutil.copy(
+            os.path.join(self.agent_path, "_cache", "000", agent + ".dill.bz"),
+            os.path.join(tmp_cache_dir, "000"),
+        )
+        migrate_fs_cache(tmp_cache_dir)
+        return os.path.join(tmp_cache_dir, "000", agent)
+
+    def test_stale_entry(self):
+        with tempfile.TemporaryDirectory() as tmp_cache_dir:
+            entry_dir = self.migrated_entry(tmp_cache_dir)
+            lazy_episode = columnar.load_episode(entry_dir, EpisodeAnalytics, lazy=True)
+            rho = lazy_episode.rho
+            self.assertFalse(lazy_episode.is_stale_entry())
+
+            # rebuilt by another process
+            columnar.save_episode(
+                entry_dir, columnar.load_episode(entry_dir, EpisodeAnalytics)
+            )
+            self.assertTrue(lazy_episode.is_stale_entry())
+            self.assertIs(lazy_episode.rho, rho)
+            with self.assertRaises(columnar.StaleEntryError):
+                lazy_episode.production
+
+            shutil.rmtree(entry_dir)
+            with self.assertRaises(columnar.StaleEntryError):
+                lazy_episode.production
+
+    def test_stale_entry_left_out_of_ram_cache(self):
+        agent = "multiTopology-baseline"
+        with tempfile.TemporaryDirectory() as tmp_cache_dir, mock.patch.object(
+            manager, "cache_dir", tmp_cache_dir
+        ), mock.patch.object(manager, "store", manager.ram.LRUCache()):
+            entry_dir = self.migrated_entry(tmp_cache_dir, agent)
+            episode = manager.get_from_fs_cache("000", agent)
+            manager.save_in_ram_cache("000", agent, episode)
+            self.assertIs(manager.get_from_ram_cache("000", agent), episode)
+
+            columnar.save_episode(
+                entry_dir, columnar.load_episode(entry_dir, EpisodeAnalytics)
+            )
+            self.assertIsNone(manager.get_from_ram_cache("000", agent))
+            self.assertFalse(manager.is_in_ram_cache("000", agent))
+
+    def test_save_lazily_loaded_episode(self):
+        agent = "multiTopology-baseline"
+        with tempfile.TemporaryDirectory() as tmp_cache_dir, mock.patch.object(
+            manager, "cache_dir", tmp_cache_dir
+        ):
+            episode_data = EpisodeData.from_disk(os.path.join(self.agent_path, agent), "000")
+            episode = EpisodeAnalytics(episode_data, "000", agent)
+            episode.decorate_light_without_reboot(episode_data)
+            manager.save_in_fs_cache("000", agent, episode)
+            episode = manager.get_from_fs_cache("000", agent)
+            expected = episode.rho.copy()
+
+            # would wait for the shared lock of the entry under its exclusive one
+            saving = threading.Thread(
+                target=manager.save_in_fs_cache, args=("000", agent, episode),
+                daemon=True,
+            )
+            saving.start()
+            saving.join(timeout=120)
+            self.assertFalse(saving.is_alive())
+
+            self.assertTrue(is_fs_cache_fresh("000", agent))
+            saved = manager.get_from_fs_cache("000", agent)
+            pd.testing.assert_frame_equal(saved.rho, expected)
+
+    def test_manifest_detects_changed_logs(self):
+        agent = "multiTopology-baseline"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            agent_path = os.path.join(tmp_dir, agent)
+            shutil.copytree(os.path.join(self.agent_path, agent), agent_path)
+            manifest_path = os.path.join(tmp_dir, "000" + manifest.MANIFEST_SUFFIX)
+            manifest.write_manifest(
+                manifest_path, manifest.make_manifest(agent_path, "000", "columnar")
+            )
+            self.assertTrue(manifest.is_fresh(manifest_path, agent_path, "000"))
+
+            # same content with another modification time is still fresh
+            meta_path = os.path.join(agent_path, "000", "episode_meta.json")
+            os.utime(meta_path, ns=(0, 0))
+            self.assertTrue(manifest.is_fresh(manifest_path, agent_path, "000"))
+            self.assertEqual(
+                manifest.read_manifest(manifest_path)["sources"][
+                    os.path.join("000", "episode_meta.json")
+                ]["mtime"],
+                0,
+            )
+
+            with open(meta_path, "a") as f:
+                f.write(" ")
+            self.assertFalse(manifest.is_fresh(manifest_path, agent_path, "000"))
+            self.assertTrue(
+                manifest.is_fresh(
+                    os.path.join(tmp_dir, "missing" + manifest.MANIFEST_SUFFIX),
+                    agent_path,
+                    "000",
+                    require_manifest=False,
+                )
+            )
+
+    def test_scheduling(self):
+        agent_path = os.path.join(self.agent_path, "multiTopology-baseline")
+        self.assertEqual(scheduling.episode_nb_timesteps(agent_path, "000"), 30)
+        self.assertGreater(scheduling.estimate_build_memory(agent_path, "000"), 0)
+
+        self.assertEqual(scheduling.max_workers(4, [10, 10, 10], None), 4)
+        self.assertEqual(scheduling.max_workers(4, [30, 10, 20, 10], 55), 2)
+        self.assertEqual(scheduling.max_workers(4, [100], 55), 1)
+
+    def test_make_cache_isolates_failures(self):
+        def build(agent, episode_name):
+            if episode_name == "001":
+                raise ValueError("truncated episode")
+
+        with tempfile.TemporaryDirectory() as tmp_cache_dir, mock.patch.object(
+            manager, "cache_dir", tmp_cache_dir
+        ), mock.patch.object(manager, "build_fs_cache_entry", side_effect=build) as built:
+            failures = make_cache(
+                ["000", "001"], [self.agent], 1, tmp_cache_dir, retries=2
+            )
+            self.assertEqual(built.call_count, 4)
+            self.assertEqual(len(failures), 1)
+            self.assertEqual(failures[0]["scenario"], "001")
+            self.assertEqual(failures[0]["attempts"], 3)
+            self.assertIn("truncated episode", failures[0]["traceback"])
+            with open(os.path.join(tmp_cache_dir, manager.MAKE_CACHE_REPORT_FILE)) as f:
+                report = json.load(f)
+            self.assertEqual(report["built"], 1)
+            self.assertEqual(report["failed"][0]["agent"], self.agent)
+
+    def test_shared_values_are_weakly_referenced(self):
+        shared_values = columnar.SharedValues()
+        key = ("profile_traces", "hash", False)
+        traces = shared_values.put(key, [{"x": [0, 1]}])
+        self.assertIsInstance(traces, list)
+        self.assertIs(shared_values.get(key), traces)
+        self.assertIs(type(pickle.loads(pickle.dumps(traces))), list)
+        # freed with the last episode using it
+        del traces
+        gc.collect()
+        self.assertIsNone(shared_values.get(key))
+
+    def test_scenario_tables_are_shared(self):
+        with tempfile.TemporaryDirectory() as tmp_cache_dir:
+            os.makedirs(os.path.join(tmp_cache_dir, "000"))
+            agents_sharing = ["alarm-baseline", "redispatching-baseline"]
+            for agent in agents_sharing:
+                shutil.copy(
+                    os.path.join(self.agent_path, "_cache", "000", agent + ".dill.bz"),
+                    os.path.join(tmp_cache_dir, "000"),
+                )
+            migrate_fs_cache(tmp_cache_dir)
+
+            shared_dir = os.path.join(tmp_cache_dir, "000", columnar.SHARED_DIR)
+            self.assertEqual(
+                len([file for file in os.listdir(shared_dir) if file.startswith("load-")]),
+                2,  # with its lock file
+            )
+            episodes = [
+                columnar.load_episode(
+                    os.path.join(tmp_cache_dir, "000", agent), EpisodeAnalytics, lazy=True
+                )
+                for agent in agents_sharing
+            ]
+            self.assertIs(episodes[0].load, episodes[1].load)
+            self.assertIs(episodes[0].profile_traces, episodes[1].profile_traces)
+            self.assertIsNot(episodes[0].production, episodes[1].production)
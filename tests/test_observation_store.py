@@ -0,0 +1,51 @@
+import os
+import pathlib
+import pickle
+import unittest
+
+import numpy as np
+
+# We need to make this below so that the manager.py finds the config.ini
+os.environ["GRID2VIZ_ROOT"] = os.path.join(
+    pathlib.Path(__file__).parent.absolute(), "data"
+)
+
+agents_path = os.path.join(pathlib.Path(__file__).parent.absolute(), "data", "agents")
+
+from grid2op.Episode.EpisodeData import EpisodeData
+from grid2viz.src.kpi.episode_reader import EpisodeReader
+from grid2viz.src.kpi.observation_store import ObservationStore, observation_matrix
+
+
+class TestObservationStore(unittest.TestCase):
+    def setUp(self):
+        agent_path = os.path.join(agents_path, "multiTopology-baseline")
+        self.episode_data = EpisodeData.from_disk(agent_path, "000")
+        self.store = ObservationStore.from_episode_data(
+            EpisodeReader(agent_path, "000")
+        )
+
+    def test_arrays(self):
+        self.assertEqual(len(self.store), len(self.episode_data.observations))
+        expected_rho = np.array([obs.rho for obs in self.episode_data.observations])
+        self.assertEqual(self.store.matrix("rho").dtype, np.float16)
+        np.testing.assert_allclose(self.store.matrix("rho"), expected_rho, atol=1e-3)
+        np.testing.assert_array_equal(
+            observation_matrix(self.store, "topo_vect"),
+            observation_matrix(self.episode_data.observations, "topo_vect"),
+        )
+        self.assertTupleEqual(
+            self.store.matrix("prod_p").shape, self.store.matrix("gen_p").shape
+        )
+
+    def test_observations_built_when_indexed(self):
+        obs = self.store[3]
+        expected = self.episode_data.observations[3]
+        np.testing.assert_array_equal(obs.topo_vect, expected.topo_vect)
+        np.testing.assert_allclose(obs.a_or, expected.a_or, rtol=1e-3)
+        self.assertIs(self.store[3], obs)
+        self.assertEqual(len(self.store[:5]), 5)
+
+        # the space is found again from its json file after pickling
+        store = pickle.loads(pickle.dumps(self.store))
+        np.testing.assert_array_equal(store[-1].topo_vect, self.store[-1].topo_vect)
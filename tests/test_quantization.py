@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from grid2viz.src.kpi.quantization import (
+    QuantizedArray,
+    QuantizedFrame,
+    Storage,
+    dequantize,
+    error_report,
+    format_storage_policy,
+    max_abs_error,
+    parse_storage_policy,
+    quantize,
+)
+
+
+class TestQuantization(unittest.TestCase):
+    def test_parse_storage_policy(self):
+        policy = parse_storage_policy("rho:uint16:1e-4, load:float32")
+        self.assertEqual(policy["rho"], Storage("uint16", 1e-4))
+        self.assertEqual(policy["load"], Storage("float32"))
+        # tables not given keep float16
+        self.assertEqual(policy["flows"], Storage("float16"))
+        self.assertEqual(
+            format_storage_policy(policy),
+            "rho:uint16:0.0001,load:float32,production:float16,flows:float16",
+        )
+        self.assertEqual(parse_storage_policy(format_storage_policy(policy)), policy)
+        for text in ["rho:int64:1", "rho:uint16", "rho:float16:1e-4", "voltage:float32"]:
+            with self.assertRaises(ValueError):
+                parse_storage_policy(text)
+
+    def test_quantized_array(self):
+        values = np.array([[0.12346, np.nan], [7.0, -1.0]])
+        stored = QuantizedArray.encode(values, "uint16", 1e-4)
+        self.assertEqual(stored.codes.dtype, np.uint16)
+        decoded = stored.decode()
+        self.assertTrue(np.isnan(decoded[0, 1]))
+        self.assertAlmostEqual(decoded[0, 0], 0.1235, places=6)
+        # out of range values are clipped
+        self.assertAlmostEqual(decoded[1, 0], 6.5534, places=4)
+        self.assertEqual(decoded[1, 1], 0)
+        np.testing.assert_array_equal(stored[:, 0], decoded[:, 0])
+
+    def test_max_abs_error(self):
+        frame = pd.DataFrame(
+            np.random.default_rng(0).uniform(0, 2, (50, 4)), columns=list("abcd")
+        )
+        stored = quantize(frame, Storage.parse("uint16:1e-4"))
+        self.assertIsInstance(stored, QuantizedFrame)
+        pd.testing.assert_index_equal(dequantize(stored).columns, frame.columns)
+        self.assertLessEqual(max_abs_error(frame, stored), 5e-5 + 1e-7)
+        self.assertIs(quantize(stored, Storage.parse("uint16:1e-4")), stored)
+
+        mw = pd.DataFrame({"gen": [2049.0, 3001.0]})
+        self.assertEqual(max_abs_error(mw, quantize(mw, Storage("float32"))), 0)
+        self.assertGreaterEqual(max_abs_error(mw, quantize(mw, Storage("float16"))), 1)
+
+        report = error_report({"rho": {"storage": "uint16:0.0001", "max_abs_error": 5e-5}})
+        self.assertListEqual(list(report.columns), ["storage", "max_abs_error"])
+        self.assertEqual(report.loc["rho", "storage"], "uint16:0.0001")
+
+
+if __name__ == "__main__":
+    unittest.main()
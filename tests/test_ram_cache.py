@@ -0,0 +1,44 @@
+import unittest
+
+import numpy as np
+
+from grid2viz.src.cache.ram import LRUCache, estimate_size, parse_size
+
+
+class TestRamCache(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(parse_size(1024), 1024)
+        self.assertEqual(parse_size("512MB"), 512 * 1024 ** 2)
+        self.assertEqual(parse_size("4 GB"), 4 * 1024 ** 3)
+        self.assertEqual(parse_size("0"), 0)
+        with self.assertRaises(ValueError):
+            parse_size("a lot")
+
+    def test_lru_eviction(self):
+        cache = LRUCache(max_bytes=250, size_of=lambda value: value.nbytes)
+        cache["a"] = np.zeros(10)  # 80 bytes
+        cache["b"] = np.zeros(10)
+        cache["c"] = np.zeros(10)
+        self.assertIsNotNone(cache.get("a"))
+        cache["d"] = np.zeros(10)
+
+        self.assertNotIn("b", cache)
+        self.assertIn("a", cache)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.size, 240)
+        self.assertDictEqual(
+            cache.stats(),
+            {
+                "hits": 1,
+                "misses": 1,
+                "evictions": 1,
+                "entries": 3,
+                "size": 240,
+                "max_bytes": 250,
+            },
+        )
+
+    def test_estimate_size(self):
+        array = np.zeros(1000)
+        self.assertGreaterEqual(estimate_size([array, array]), 2 * array.nbytes)
+        self.assertGreaterEqual(estimate_size({"array": array}), array.nbytes)
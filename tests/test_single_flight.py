@@ -0,0 +1,61 @@
+import threading
+import time
+import unittest
+
+from grid2viz.src.cache.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_are_coalesced(self):
+        flights = SingleFlight()
+        calls = []
+
+        def load(key):
+            calls.append(key)
+            time.sleep(0.2)
+            return object()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flights.do("a", load, "a")))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertListEqual(calls, ["a"])
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(flights.shared, 4)
+
+        # the key is released once the call is done
+        flights.do("a", load, "a")
+        self.assertListEqual(calls, ["a", "a"])
+
+    def test_error_is_raised_to_all_callers(self):
+        flights = SingleFlight()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.2)
+            raise ValueError("cannot load")
+
+        errors = []
+
+        def call():
+            try:
+                flights.do("a", fail)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
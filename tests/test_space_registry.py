@@ -0,0 +1,48 @@
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from grid2viz.src.cache.spaces import SpaceRegistry
+
+agents_path = os.path.join(pathlib.Path(__file__).parent.absolute(), "data", "agents")
+
+
+class TestSpaceRegistry(unittest.TestCase):
+    def test_spaces_are_shared(self):
+        registry = SpaceRegistry()
+        greedy_space = registry.observation_space(
+            os.path.join(agents_path, "greedy-baseline", "dict_observation_space.json")
+        )
+        self.assertEqual(greedy_space.n_line, 20)
+        self.assertIs(
+            registry.observation_space(
+                os.path.join(agents_path, "greedy-baseline", "dict_observation_space.json")
+            ),
+            greedy_space,
+        )
+        # another agent with the same space definition
+        self.assertIs(
+            registry.observation_space(
+                os.path.join(agents_path, "do-nothing-baseline", "dict_observation_space.json")
+            ),
+            greedy_space,
+        )
+        action_space = registry.action_space(
+            os.path.join(agents_path, "greedy-baseline", "dict_action_space.json")
+        )
+        self.assertIsNot(action_space, greedy_space)
+
+    def test_changed_file_is_read_again(self):
+        registry = SpaceRegistry()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "dict_observation_space.json")
+            shutil.copy(
+                os.path.join(agents_path, "greedy-baseline", "dict_observation_space.json"),
+                path,
+            )
+            space = registry.observation_space(path)
+            with open(path, "a") as f:
+                f.write("\n")
+            self.assertIsNot(registry.observation_space(path), space)
@@ -0,0 +1,86 @@
+import pickle
+import types
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from grid2viz.src.kpi.time_pyramid import TimeSeriesPyramid, get_level, range_slice
+
+
+class TestTimeSeriesPyramid(unittest.TestCase):
+    def setUp(self):
+        # three days at a 5 minutes resolution
+        self.timestamps = pd.date_range("2019-01-01", periods=3 * 288, freq="5min")
+        rng = np.random.default_rng(0)
+        self.values = rng.normal(size=(len(self.timestamps), 2))
+        self.values[7, 1] = np.nan
+        self.pyramid = TimeSeriesPyramid.build(
+            self.timestamps, self.values, ["a", "b"]
+        )
+
+    def test_levels(self):
+        # the 5 minutes level would not aggregate anything
+        self.assertListEqual(
+            [level.resolution for level in self.pyramid.levels], ["hour", "day"]
+        )
+        frame = pd.DataFrame(self.values, index=self.timestamps, columns=["a", "b"])
+        for level, period in zip(self.pyramid.levels, ["60min", "1D"]):
+            resampled = frame.resample(period)
+            np.testing.assert_array_equal(level.x, resampled.mean().index.values)
+            for aggregate in ["min", "mean", "max"]:
+                np.testing.assert_allclose(
+                    getattr(level, aggregate),
+                    getattr(resampled, aggregate)().to_numpy(),
+                    rtol=1e-6,
+                )
+
+    def test_level_for(self):
+        hour, day = self.pyramid.levels
+        self.assertIs(self.pyramid.level_for(min_points=3), day)
+        self.assertIs(self.pyramid.level_for(min_points=4), hour)
+        self.assertIsNone(self.pyramid.level_for(min_points=100))
+        x_range = ("2019-01-01 10:00:00", "2019-01-01 20:30:00")
+        self.assertIs(self.pyramid.level_for(x_range, min_points=12), hour)
+        self.assertIsNone(self.pyramid.level_for(x_range, min_points=14))
+
+    def test_get_level(self):
+        # two months at a 5 minutes resolution, plotted hourly as a whole
+        timestamps = pd.date_range("2019-01-01", periods=60 * 288, freq="5min")
+        pyramid = TimeSeriesPyramid.build(timestamps, np.zeros(len(timestamps)), ["a"])
+        episode = types.SimpleNamespace(pyramid=pyramid)
+        hour = pyramid.levels[0]
+        week = ("2019-01-01", "2019-01-08")
+        self.assertIs(get_level(episode, "pyramid")[1], hour)
+        self.assertIsNone(get_level(episode, "pyramid", week)[1])
+        # the level range picks the level in place of the x range
+        self.assertIsNone(get_level(episode, "pyramid", level_range=week)[1])
+        self.assertIs(
+            get_level(episode, "pyramid", week, (timestamps[0], timestamps[-1]))[1],
+            hour,
+        )
+
+    def test_range_slice(self):
+        x = self.pyramid.levels[0].x
+        index = range_slice(x, ("2019-01-01 10:30:00", "2019-01-01 12:00:00"))
+        # with the periods on both sides of the range
+        self.assertEqual(x[index][0], np.datetime64("2019-01-01T10:00"))
+        self.assertEqual(x[index][-1], np.datetime64("2019-01-01T12:00"))
+        self.assertEqual(range_slice(x), slice(0, len(x)))
+        self.assertEqual(range_slice(x, ("2018-01-01", "2018-01-02")), slice(0, 1))
+
+    def test_until(self):
+        hour = self.pyramid.levels[0].until("2019-01-01 10:30:00")
+        self.assertEqual(len(hour), 11)
+        self.assertEqual(hour.x[-1], np.datetime64("2019-01-01T10:00"))
+        np.testing.assert_array_equal(hour.max, self.pyramid.levels[0].max[:11])
+
+    def test_pickle(self):
+        pyramid = pickle.loads(pickle.dumps(self.pyramid))
+        self.assertEqual(pyramid.column_index["b"], 1)
+        x, values = pyramid.levels[1].values("max", 1)
+        np.testing.assert_array_equal(values, self.pyramid.levels[1].max[:, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()